@@ -2,6 +2,143 @@ from ipv8.attestation.trustchain.block import TrustChainBlock
 
 from anydex.core import MAX_ORDER_TIMEOUT
 
+_MISSING = object()
+_HEX_DIGITS = '0123456789abcdefABCDEF'
+
+
+class DictSchema(object):
+    """
+    Validates a dictionary against a list of fields, each with a required type and an optional check of its value.
+
+    The schema is compiled once into the source of a single function, in which the checks of nested schemas are
+    inlined, so a dictionary and its nested dictionaries are validated in a single pass without creating temporary
+    objects.
+    """
+
+    def __init__(self, name, fields, exact=False):
+        """
+        :param name: The name of the generated validation function
+        :param fields: A list of (key, required type, check) tuples, where check is a function that returns whether
+                       the value of the field is valid, a DictSchema for nested dictionaries, or None
+        :param exact: Whether the dictionary may only contain the given fields
+        :type name: str
+        :type fields: list
+        :type exact: bool
+        """
+        self.name = name
+        self.fields = tuple(fields)
+        self.exact = exact
+
+        namespace = {'MISSING': _MISSING}
+        lines = []
+        self.compile_checks(lines, namespace, 'container', True)
+        self.source = "def %s(container):\n    %s\n    return True\n" % (name, "\n    ".join(lines))
+        exec(compile(self.source, "<schema %s>" % name, "exec"), namespace)  # pylint: disable=exec-used
+        self.validate = namespace[name]
+
+    def compile_checks(self, lines, namespace, variable, check_type):
+        """
+        Append the statements that return False if the dictionary in the given variable does not match this schema.
+        """
+        if check_type:
+            lines.append("if not isinstance(%s, dict): return False" % variable)
+        if self.exact:
+            lines.append("if len(%s) != %d: return False" % (variable, len(self.fields)))
+        for key, required_type, check in self.fields:
+            value = "value_%d" % len(lines)
+            conditions = ["%s is MISSING" % value]
+            if required_type is not object:
+                namespace[required_type.__name__] = required_type
+                conditions.append("not isinstance(%s, %s)" % (value, required_type.__name__))
+            if check is not None and not isinstance(check, DictSchema):
+                namespace[check.__name__] = check
+                conditions.append("not %s(%s)" % (check.__name__, value))
+            lines.append("%s = %s.get(%r, MISSING)" % (value, variable, key))
+            lines.append("if %s: return False" % " or ".join(conditions))
+            if isinstance(check, DictSchema):
+                check.compile_checks(lines, namespace, value, required_type is not dict)
+
+    def __call__(self, container):
+        """
+        Return whether the given dictionary matches this schema.
+
+        :rtype: bool
+        """
+        return self.validate(container)
+
+
+def _is_valid_trader_id(trader_id):
+    return len(trader_id) == 40 and not trader_id.strip(_HEX_DIGITS)
+
+
+def _is_valid_amount(amount):
+    return amount.bit_length() <= 63
+
+
+def _is_valid_positive_amount(amount):
+    return amount > 0 and amount.bit_length() <= 63
+
+
+def _is_valid_timeout(timeout):
+    return 0 <= timeout <= MAX_ORDER_TIMEOUT
+
+
+_ASSET_SCHEMA = DictSchema("is_valid_asset", [('amount', int, _is_valid_amount), ('type', str, None)])
+_POSITIVE_ASSET_SCHEMA = DictSchema("is_valid_positive_asset", [('amount', int, _is_valid_positive_amount),
+                                                                 ('type', str, None)])
+
+ASSET_PAIR_SCHEMA = DictSchema("is_valid_asset_pair", [('first', dict, _ASSET_SCHEMA),
+                                                       ('second', dict, _ASSET_SCHEMA)])
+POSITIVE_ASSET_PAIR_SCHEMA = DictSchema("is_valid_positive_asset_pair", [('first', dict, _POSITIVE_ASSET_SCHEMA),
+                                                                         ('second', dict, _POSITIVE_ASSET_SCHEMA)])
+
+TICK_SCHEMA = DictSchema("is_valid_tick", [
+    ('trader_id', str, _is_valid_trader_id),
+    ('order_number', int, None),
+    ('assets', dict, POSITIVE_ASSET_PAIR_SCHEMA),
+    ('timeout', int, _is_valid_timeout),
+    ('timestamp', int, None),
+    ('traded', object, None),
+])
+
+TX_INIT_SCHEMA = DictSchema("is_valid_tx_init", [
+    ('trader_id', str, _is_valid_trader_id),
+    ('order_number', int, None),
+    ('partner_trader_id', str, _is_valid_trader_id),
+    ('partner_order_number', int, None),
+    ('assets', dict, POSITIVE_ASSET_PAIR_SCHEMA),
+    ('timestamp', int, None),
+], exact=True)
+
+TX_SCHEMA = DictSchema("is_valid_tx", [
+    ('trader_id', str, _is_valid_trader_id),
+    ('order_number', int, None),
+    ('partner_trader_id', str, _is_valid_trader_id),
+    ('partner_order_number', int, None),
+    ('transaction_id', str, None),
+    ('assets', dict, POSITIVE_ASSET_PAIR_SCHEMA),
+    ('transferred', dict, ASSET_PAIR_SCHEMA),
+    ('timestamp', int, None),
+], exact=True)
+
+PAYMENT_SCHEMA = DictSchema("is_valid_payment", [
+    ('trader_id', str, _is_valid_trader_id),
+    ('transaction_id', str, None),
+    ('transferred', dict, None),
+    ('payment_id', str, None),
+    ('address_from', str, None),
+    ('address_to', str, None),
+    ('timestamp', int, None),
+], exact=True)
+
+CANCEL_SCHEMA = DictSchema("is_valid_cancel", [('trader_id', str, None), ('order_number', int, None)])
+
+TICK_BLOCK_SCHEMA = DictSchema("is_valid_tick_block", [('tick', dict, TICK_SCHEMA)])
+TX_INIT_BLOCK_SCHEMA = DictSchema("is_valid_tx_init_block", [('tx', dict, TX_INIT_SCHEMA)])
+TX_DONE_BLOCK_SCHEMA = DictSchema("is_valid_tx_done_block", [('tx', dict, TX_SCHEMA), ('ask', dict, TICK_SCHEMA),
+                                                             ('bid', dict, TICK_SCHEMA)])
+PAYMENT_BLOCK_SCHEMA = DictSchema("is_valid_payment_block", [('payment', dict, PAYMENT_SCHEMA)])
+
 
 class MarketBlock(TrustChainBlock):
     """
@@ -25,135 +162,41 @@ class MarketBlock(TrustChainBlock):
 
     @staticmethod
     def is_valid_asset_pair(assets_dict, amount_positive=True):
-        if 'first' not in assets_dict or 'second' not in assets_dict:
-            return False
-        if 'amount' not in assets_dict['first'] or 'type' not in assets_dict['first']:
-            return False
-        if 'amount' not in assets_dict['second'] or 'type' not in assets_dict['second']:
-            return False
-
-        if not MarketBlock.has_required_types([('amount', int), ('type', str)],
-                                              assets_dict['first']):
-            return False
-        if not MarketBlock.has_required_types([('amount', int), ('type', str)],
-                                              assets_dict['second']):
-            return False
-
-        if assets_dict['first']['amount'].bit_length() > 63 or assets_dict['second']['amount'].bit_length() > 63:
-            return False
-
-        if amount_positive and (assets_dict['first']['amount'] <= 0 or assets_dict['second']['amount'] <= 0):
-            return False
-
-        return True
+        if amount_positive:
+            return POSITIVE_ASSET_PAIR_SCHEMA.validate(assets_dict)
+        return ASSET_PAIR_SCHEMA.validate(assets_dict)
 
     @staticmethod
     def is_valid_trader_id(trader_id):
-        if len(trader_id) != 40:
-            return False
-
-        try:
-            int(trader_id, 16)
-        except ValueError:  # Not a hexadecimal
-            return False
-        return True
+        return isinstance(trader_id, str) and _is_valid_trader_id(trader_id)
 
     @staticmethod
     def is_valid_tick(tick):
         """
         Verify whether a dictionary that contains a tick, is valid.
         """
-        required_fields = ['trader_id', 'order_number', 'assets', 'timeout', 'timestamp', 'traded']
-        if not MarketBlock.has_fields(required_fields, tick):
-            return False
-
-        required_types = [('trader_id', str), ('order_number', int), ('assets', dict), ('timestamp', int),
-                          ('timeout', int)]
-
-        if not MarketBlock.is_valid_trader_id(tick['trader_id']):
-            return False
-        if not MarketBlock.is_valid_asset_pair(tick['assets']):
-            return False
-        if not MarketBlock.has_required_types(required_types, tick):
-            return False
-        if tick['timeout'] < 0 or tick['timeout'] > MAX_ORDER_TIMEOUT:
-            return False
-
-        return True
+        return TICK_SCHEMA.validate(tick)
 
     @staticmethod
     def is_valid_tx_init(tx):
         """
         Verify whether a tx_init that contains a tx transaction, is valid.
         """
-        required_fields = ['trader_id', 'order_number', 'partner_trader_id', 'partner_order_number',
-                           'assets', 'timestamp']
-        if not MarketBlock.has_fields(required_fields, tx):
-            return False
-        if len(tx) != len(required_fields):
-            return False
-
-        required_types = [('trader_id', str), ('order_number', int), ('partner_trader_id', str),
-                          ('partner_order_number', int), ('assets', dict), ('timestamp', int)]
-
-        if not MarketBlock.is_valid_trader_id(tx['trader_id']) or not \
-                MarketBlock.is_valid_trader_id(tx['partner_trader_id']):
-            return False
-        if not MarketBlock.is_valid_asset_pair(tx['assets']):
-            return False
-        if not MarketBlock.has_required_types(required_types, tx):
-            return False
-
-        return True
+        return TX_INIT_SCHEMA.validate(tx)
 
     @staticmethod
     def is_valid_tx(tx):
         """
         Verify whether a dictionary that contains a transaction, is valid.
         """
-        required_fields = ['trader_id', 'order_number', 'partner_trader_id', 'partner_order_number', 'transaction_id',
-                           'assets', 'transferred', 'timestamp']
-        if not MarketBlock.has_fields(required_fields, tx):
-            return False
-        if len(tx) != len(required_fields):
-            return False
-
-        required_types = [('trader_id', str), ('order_number', int), ('partner_trader_id', str),
-                          ('partner_order_number', int), ('transaction_id', str), ('assets', dict),
-                          ('transferred', dict), ('timestamp', int)]
-
-        if not MarketBlock.is_valid_trader_id(tx['trader_id']) or not \
-                MarketBlock.is_valid_trader_id(tx['partner_trader_id']):
-            return False
-        if not MarketBlock.is_valid_asset_pair(tx['assets']):
-            return False
-        if not MarketBlock.is_valid_asset_pair(tx['transferred'], amount_positive=False):
-            return False
-        if not MarketBlock.has_required_types(required_types, tx):
-            return False
-
-        return True
+        return TX_SCHEMA.validate(tx)
 
     @staticmethod
     def is_valid_payment(payment):
         """
         Verify whether a dictionary that contains a payment, is valid.
         """
-        required_fields = ['trader_id', 'transaction_id', 'transferred', 'payment_id', 'address_from',
-                           'address_to', 'timestamp']
-        if not MarketBlock.has_fields(required_fields, payment):
-            return False
-        if len(payment) != len(required_fields):
-            return False
-
-        required_types = [('trader_id', str), ('transaction_id', str), ('transferred', dict),
-                          ('payment_id', str), ('address_from', str), ('address_to', str), ('timestamp', int)]
-        if not MarketBlock.is_valid_trader_id(payment['trader_id']):
-            return False
-        if not MarketBlock.has_required_types(required_types, payment):
-            return False
-
-        return True
+        return PAYMENT_SCHEMA.validate(payment)
 
     def is_valid_tick_block(self):
         """
@@ -161,12 +204,7 @@ class MarketBlock(TrustChainBlock):
         """
         if self.type != b"ask" and self.type != b"bid":
             return False
-        if not MarketBlock.has_fields(['tick'], self.transaction):
-            return False
-        if not MarketBlock.is_valid_tick(self.transaction['tick']):
-            return False
-
-        return True
+        return TICK_BLOCK_SCHEMA.validate(self.transaction)
 
     def is_valid_cancel_block(self):
         """
@@ -174,40 +212,17 @@ class MarketBlock(TrustChainBlock):
         """
         if self.type != b"cancel_order":
             return False
-
-        if not MarketBlock.has_fields(['trader_id', 'order_number'], self.transaction):
-            return False
-
-        required_types = [('trader_id', str), ('order_number', int)]
-        if not MarketBlock.has_required_types(required_types, self.transaction):
-            return False
-
-        return True
+        return CANCEL_SCHEMA.validate(self.transaction)
 
     def is_valid_tx_init_done_block(self):
         """
         Verify whether an incoming block with tx_init/tx_done type is valid.
         """
-        if self.type != b"tx_init" and self.type != b"tx_done":
-            return False
-
-        if not MarketBlock.has_fields(['tx'], self.transaction):
-            return False
-
-        if self.type == b"tx_done" and not MarketBlock.has_fields(['ask', 'bid'], self.transaction):
-            return False
-
-        if self.type == b"tx_done" and not MarketBlock.is_valid_tick(self.transaction['ask']):
-            return False
-        if self.type == b"tx_done" and not MarketBlock.is_valid_tick(self.transaction['bid']):
-            return False
-
-        if self.type == b"tx_init" and not MarketBlock.is_valid_tx_init(self.transaction['tx']):
-            return False
-        elif self.type == b"tx_done" and not MarketBlock.is_valid_tx(self.transaction['tx']):
-            return False
-
-        return True
+        if self.type == b"tx_init":
+            return TX_INIT_BLOCK_SCHEMA.validate(self.transaction)
+        if self.type == b"tx_done":
+            return TX_DONE_BLOCK_SCHEMA.validate(self.transaction)
+        return False
 
     def is_valid_tx_payment_block(self):
         """
@@ -215,10 +230,4 @@ class MarketBlock(TrustChainBlock):
         """
         if self.type != b"tx_payment":
             return False
-
-        if not MarketBlock.has_fields(['payment'], self.transaction):
-            return False
-        if not MarketBlock.is_valid_payment(self.transaction['payment']):
-            return False
-
-        return True
+        return PAYMENT_BLOCK_SCHEMA.validate(self.transaction)
@@ -17,12 +17,14 @@ larger the probability of false positives.
 Initial Bloomfilter implementation based on pybloom by Jay Baird <jay@mochimedia.com> and Bob
 Ippolito <bob@redivi.com>.  Simplified, and optimized to use just python code.
 
+The bits of the filter are stored in a bytearray, where bit i is bit (i % 8) of byte (i // 8).  This is the layout in
+which the filter is serialised, so a filter is (de)serialised by copying its bytes.
+
 @author: Boudewijn Schoon
 @organization: Technical University Delft
 @contact: dispersy@frayja.com
 """
 import logging
-from binascii import hexlify, unhexlify
 from hashlib import md5, sha1, sha256, sha384, sha512
 from math import ceil, log
 from struct import Struct
@@ -83,7 +85,7 @@ class BloomFilter(object):
             prefix = kargs.get("prefix", args[2] if len(args) >= 3 else b"")
             assert 0 < len(bytes_), len(bytes_)
             logger.debug("bloom filter based on %d bytes and k_functions %d", len(bytes_), k_functions)
-            filter_ = int(hexlify(bytes_[::-1]), 16)
+            filter_ = bytearray(bytes_)
 
         # matches: BloomFilter(int:m_size, float:f_error_rate, str:prefix="")
         elif len(args) >= 2 and isinstance(args[0], int) and isinstance(args[1], float):
@@ -95,7 +97,7 @@ class BloomFilter(object):
             assert 0.0 < f_error_rate < 1.0, f_error_rate
             logger.debug("constructing bloom filter based on m_size %d bits and f_error_rate %f", m_size, f_error_rate)
             k_functions = cls._get_k_functions(m_size, cls._get_n_capacity(m_size, f_error_rate))
-            filter_ = 0
+            filter_ = bytearray(m_size // 8)
 
         # matches: BloomFilter(float:f_error_rate, int:n_capacity, str:prefix="")
         elif len(args) >= 2 and isinstance(args[0], float) and isinstance(args[1], int):
@@ -108,7 +110,7 @@ class BloomFilter(object):
                          n_capacity)
             m_size = int(ceil(abs((n_capacity * log(f_error_rate)) // (log(2) ** 2)) // 8.0) * 8)
             k_functions = cls._get_k_functions(m_size, n_capacity)
-            filter_ = 0
+            filter_ = bytearray(m_size // 8)
 
         else:
             raise RuntimeError("Unknown combination of argument types %s" % str([type(arg) for arg in args]))
@@ -128,7 +130,8 @@ class BloomFilter(object):
         assert 0 < self._k_functions <= self._m_size, [self._k_functions, self._m_size]
         assert isinstance(self._prefix, bytes), type(self._prefix)
         assert 0 <= len(self._prefix) < 256, len(self._prefix)
-        assert isinstance(self._filter, int), type(self._filter)
+        assert isinstance(self._filter, bytearray), type(self._filter)
+        assert len(self._filter) * 8 == self._m_size, [len(self._filter), self._m_size]
 
         # determine hash function
         if self._m_size >= (1 << 31):
@@ -164,11 +167,12 @@ class BloomFilter(object):
         Add KEY to the BloomFilter.
         """
         filter_ = self._filter
+        m_size = self._m_size
         hash_ = self._salt.copy()
         hash_.update(key)
         for pos in self._fmt_unpack(hash_.digest()):
-            filter_ |= 1 << (pos % self._m_size)
-        self._filter = filter_
+            pos %= m_size
+            filter_[pos >> 3] |= 1 << (pos & 7)
 
     def add_keys(self, keys):
         """
@@ -188,25 +192,25 @@ class BloomFilter(object):
             # while generators are more memory efficient, this list will be relatively short.
             # 07/05/12 Niels: using no list at all is even more efficient/faster
             for pos in fmt_unpack(hash_.digest()):
-                filter_ |= 1 << (pos % m_size)
-
-        self._filter = filter_
+                pos %= m_size
+                filter_[pos >> 3] |= 1 << (pos & 7)
 
     def clear(self):
         """
         Set all bits in the filter to zero.
         """
-        self._filter = 0
+        self._filter = bytearray(self._m_size // 8)
 
     def __contains__(self, key):
         filter_ = self._filter
-        m_size_ = self._m_size
+        m_size = self._m_size
 
         hash_ = self._salt.copy()
         hash_.update(key)
 
         for pos in self._fmt_unpack(hash_.digest()):
-            if not filter_ & (1 << (pos % m_size_)):
+            pos %= m_size
+            if not filter_[pos >> 3] & (1 << (pos & 7)):
                 return False
         return True
 
@@ -231,7 +235,8 @@ class BloomFilter(object):
             # while generators are more memory efficient, this list will be relatively short.
             # 07/05/12 Niels: using no list at all is even more efficient/faster
             for pos in fmt_unpack(hash_.digest()):
-                if not filter_ & (1 << (pos % m_size)):
+                pos %= m_size
+                if not filter_[pos >> 3] & (1 << (pos & 7)):
                     yield tup
                     break
 
@@ -259,7 +264,7 @@ class BloomFilter(object):
         The number of bits in the bloom filter that are set.
         @rtype: int
         """
-        return sum(1 if self._filter & (1 << i) else 0 for i in range(self._m_size))
+        return bin(int.from_bytes(self._filter, "little")).count("1")
 
     @property
     def size(self):
@@ -291,7 +296,4 @@ class BloomFilter(object):
         bytes as well as the number of functions are required.
         @rtype: string
         """
-        # hex should be m_size/4, hex is 16 instead of 8 -> hence half the number of "hexes" in m_size
-        hex_ = '%x' % self._filter
-        padding = '0' * (self._m_size // 4 - len(hex_))
-        return unhexlify(padding + hex_)[::-1]
\ No newline at end of file
+        return bytes(self._filter)
\ No newline at end of file
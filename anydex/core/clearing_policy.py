@@ -1,9 +1,14 @@
 import abc
 import logging
+from asyncio import ensure_future, shield
 from binascii import hexlify, unhexlify
+from collections import OrderedDict
 
+from ipv8.attestation.trustchain.listener import BlockListener
 from ipv8.peer import Peer
 
+from anydex.core.block import MarketBlock
+
 
 class ClearingPolicy(metaclass=abc.ABCMeta):
     """
@@ -28,15 +33,183 @@ class ClearingPolicy(metaclass=abc.ABCMeta):
         return True
 
 
-class SingleTradeClearingPolicy(ClearingPolicy):
+class SingleTradeClearingPolicy(ClearingPolicy, BlockListener):
     """
     This policy limits a trading partner to a single outstanding trade at once.
     This is achieved by a crawl/inspection of the TrustChain records of a counterparty.
+
+    The status of the transactions of each counterparty is kept in an index that is updated with every tx_init,
+    tx_payment and tx_done block we receive, so a proposal only requires crawling the blocks of the counterparty we do
+    not know yet. Only the most recently used counterparties are kept in the index. The index of a counterparty that
+    is evicted is rebuilt from its stored blocks when it makes its next proposal.
     """
 
+    BLOCK_CLASS = MarketBlock
+    TX_BLOCK_TYPES = [b'tx_init', b'tx_payment', b'tx_done']
+    TX_INIT_BLOCKS_LIMIT = 1000  # The number of stored blocks of a counterparty that is indexed when we first see it
+    MAX_INDEXED_PUBLIC_KEYS = 1000  # The number of counterparties of which the transaction status is kept
+    MAX_PARKED_BLOCKS = 1000  # The number of transactions of which blocks wait for their tx_init block
+
     def __init__(self, community):
         ClearingPolicy.__init__(self, community)
-        self.currently_crawling = set()
+        # Public key -> {transaction id: (sequence number, whether the trader may trade)}, from least to most recently
+        # used public key
+        self.tx_status = OrderedDict()
+        self.open_transactions = {}  # Public key -> ids of the transactions for which the trader holds the token
+        self.unlinked_blocks = OrderedDict()  # (Public key, sequence number) of a tx_init proposal -> agreement blocks
+        self.orphan_blocks = OrderedDict()  # (Public key, transaction id) -> tx_payment and tx_done blocks
+        self.indexed_public_keys = set()  # The public keys of which the stored blocks have been indexed
+        self.crawls = {}  # Public key -> Task of the crawl in progress
+        self.community.trustchain.add_listener(self, self.TX_BLOCK_TYPES)
+
+    def should_sign(self, block):
+        """
+        The market community decides whether to sign transaction blocks, this policy only inspects them.
+        """
+        return False
+
+    def received_block(self, block):
+        self.index_block(block)
+
+    def index_block(self, block):
+        """
+        Update the status of the transaction in the chain of the block creator that the block belongs to.
+        """
+        if block.type == b'tx_init':
+            if block.link_sequence_number == 0:
+                # The counter-signatures of this proposal might have been received before the proposal itself
+                for agreement_block in self.unlinked_blocks.pop((block.public_key, block.sequence_number), []):
+                    self.update_init_status(agreement_block, block.hash, True)
+                self.update_init_status(block, block.hash, False)
+                return
+
+            # Get the original block
+            tx_init_block = self.community.trustchain.persistence.get_linked(block)
+            if not tx_init_block:
+                self.park_block(self.unlinked_blocks, (block.link_public_key, block.link_sequence_number), block)
+                return
+
+            # We allow trading with this partner if it counter-signed the tx_init block, which means that
+            # it should not go first during asset exchange.
+            self.update_init_status(block, tx_init_block.hash, True)
+            return
+
+        if block.type == b'tx_payment':
+            txid = unhexlify(block.transaction["payment"]["transaction_id"])
+        elif block.type == b'tx_done':
+            txid = unhexlify(block.transaction["tx"]["transaction_id"])
+        else:
+            return
+
+        if txid not in self.tx_status.get(block.public_key, {}):
+            # Wait for the tx_init block of the transaction in the same chain, since a transaction without one would
+            # otherwise stay open forever
+            self.logger.debug("Found %s block without having tx_init block for transaction %s",
+                              block.type.decode(), hexlify(txid).decode())
+            self.park_block(self.orphan_blocks, (block.public_key, txid), block)
+            return
+
+        self.update_status(block, txid, block.type == b'tx_done' or block.link_sequence_number == 0)
+
+    def update_init_status(self, block, txid, status):
+        """
+        Set the status of a transaction from a tx_init block, and index the blocks of the transaction in the same chain
+        that were waiting for it.
+        """
+        self.update_status(block, txid, status)
+        for orphan_block in self.orphan_blocks.pop((block.public_key, txid), []):
+            self.index_block(orphan_block)
+
+    def park_block(self, parked_blocks, key, block):
+        """
+        Keep a block until the block it depends on is indexed. When too many blocks are waiting, the oldest ones are
+        dropped, and the chains they belong to are evicted from the index so that they are indexed again later.
+        """
+        parked_blocks.setdefault(key, []).append(block)
+        parked_blocks.move_to_end(key)
+        while len(parked_blocks) > self.MAX_PARKED_BLOCKS:
+            _, dropped_blocks = parked_blocks.popitem(last=False)
+            for dropped_block in dropped_blocks:
+                self.evict(dropped_block.public_key)
+
+    def get_transactions(self, public_key):
+        """
+        Return the status of the transactions of a counterparty, and mark the counterparty as most recently used.
+        The least recently used counterparty is evicted when the index is full.
+        """
+        transactions = self.tx_status.setdefault(public_key, {})
+        self.tx_status.move_to_end(public_key)
+        while len(self.tx_status) > self.MAX_INDEXED_PUBLIC_KEYS:
+            self.evict(next(iter(self.tx_status)))
+        return transactions
+
+    def evict(self, public_key):
+        """
+        Remove a counterparty from the index.
+        """
+        self.tx_status.pop(public_key, None)
+        self.open_transactions.pop(public_key, None)
+        self.indexed_public_keys.discard(public_key)
+
+    def update_status(self, block, txid, status):
+        """
+        Set the status of a transaction, unless it has already been set by a later block in the same chain. Since
+        blocks can be received in any order, this yields the same status as processing the chain from start to end.
+        """
+        transactions = self.get_transactions(block.public_key)
+        if txid in transactions and transactions[txid][0] >= block.sequence_number:
+            return
+
+        transactions[txid] = (block.sequence_number, status)
+        open_transactions = self.open_transactions.setdefault(block.public_key, set())
+        if status:
+            open_transactions.discard(txid)
+        else:
+            open_transactions.add(txid)
+
+    def index_stored_blocks(self, public_key):
+        """
+        Index the blocks of a counterparty that we stored before this policy received blocks.
+        """
+        self.get_transactions(public_key)
+        if public_key in self.indexed_public_keys:
+            return
+
+        self.indexed_public_keys.add(public_key)
+        blocks = self.community.trustchain.persistence.get_latest_blocks(public_key, limit=self.TX_INIT_BLOCKS_LIMIT)
+        for block in blocks:
+            if block.type in self.TX_BLOCK_TYPES:
+                self.index_block(block)
+
+    async def crawl_chain(self, peer):
+        """
+        Crawl the blocks of a peer, starting from the lowest sequence number of its chain that we do not know yet.
+        The blocks are indexed when they are received.
+        """
+        trustchain = self.community.trustchain
+        public_key = peer.public_key.key_to_bin()
+        batch_size = trustchain.settings.max_crawl_batch
+        while True:
+            start_seq_num = trustchain.persistence.get_lowest_sequence_number_unknown(public_key)
+            blocks = await trustchain.send_crawl_request(peer, public_key, start_seq_num,
+                                                         start_seq_num + batch_size - 1)
+            num_chain_blocks = len([block for block in blocks if block.public_key == public_key])
+            if num_chain_blocks < batch_size or \
+                    trustchain.persistence.get_lowest_sequence_number_unknown(public_key) <= start_seq_num:
+                return
+
+    def get_crawl(self, peer):
+        """
+        Return an awaitable of the crawl of a peer. If a crawl of the peer is already in progress, for instance for a
+        proposal for another order of the same trader, its completion is awaited instead of starting another crawl.
+        """
+        public_key = peer.public_key.key_to_bin()
+        if public_key not in self.crawls:
+            crawl = ensure_future(self.crawl_chain(peer))
+            crawl.add_done_callback(lambda _: self.crawls.pop(public_key, None))
+            self.crawls[public_key] = crawl
+        # Shield the shared crawl, so cancelling one proposal does not cancel the crawl for the others
+        return shield(self.crawls[public_key])
 
     async def should_trade(self, trader_id):
         """
@@ -49,62 +222,20 @@ class SingleTradeClearingPolicy(ClearingPolicy):
 
         # Get the public key of the peer
         peer_pk = await self.community.send_trader_pk_request(trader_id)
-        peer = Peer(peer_pk, address=address)
-
-        # If we are currently crawling this peer already, it means we got another propose trade for another of the
-        # traders orders. Refuse to trade for this one then.
-        if trader_id in self.currently_crawling:
-            self.logger.info("Clearing policy not accepting trade with trader %s - we are already crawling this peer",
-                             trader_id.as_hex())
+        if not peer_pk:
+            self.logger.info("Clearing policy is unable to determine public key of trader %s", trader_id.as_hex())
             return False
+        peer = Peer(peer_pk, address=address)
+        public_key = peer.public_key.key_to_bin()
 
-        # Crawl the chain and validate the blocks
+        # Crawl the blocks we do not know yet
         self.logger.info("Starting crawl of chain of trader %s" % trader_id.as_hex())
-        self.currently_crawling.add(trader_id)
-        await self.community.trustchain.crawl_chain(peer)
-
+        self.index_stored_blocks(public_key)
+        await self.get_crawl(peer)
         self.logger.debug("Crawl of trader %s done - validating trade status", trader_id.as_hex())
-        self.currently_crawling.remove(trader_id)
-
-        blocks = self.community.trustchain.persistence.get_latest_blocks(peer.public_key.key_to_bin(), limit=1000)
-        blocks.sort(key=lambda block: block.sequence_number)
 
-        tx_status = {}  # Keep track of the status of each transaction
-
-        for block in blocks:
-            if block.type == b'tx_init':
-                if block.link_sequence_number != 0:
-                    # Get the original block
-                    tx_init_block = self.community.trustchain.persistence.get_linked(block)
-                else:
-                    tx_init_block = block
-
-                if not tx_init_block:
-                    continue
-
-                txid = tx_init_block.hash
-                # We allow trading with this partner if it counter-signed the tx_init block, which means that
-                # it should not go first during asset exchange.
-                tx_status[txid] = block.link_sequence_number != 0
-            elif block.type == b'tx_payment':
-                txid = unhexlify(block.transaction["payment"]["transaction_id"])
-                if txid not in tx_status:
-                    self.logger.warning("Found payment block without having tx_init block for transaction %s!",
-                                        hexlify(txid))
-                    continue
-
-                if block.link_sequence_number != 0:
-                    tx_status[txid] = False
-                else:
-                    tx_status[txid] = True
-            elif block.type == b'tx_done':
-                txid = unhexlify(block.transaction["tx"]["transaction_id"])
-                if txid not in tx_status:
-                    self.logger.warning("Found tx_done block without having tx_init block for transaction %s!",
-                                        hexlify(txid))
-                    continue
-
-                tx_status[txid] = True
+        # The counterparty might have been evicted from the index during the crawl
+        self.index_stored_blocks(public_key)
 
         # If there is any transaction for which this party currently holds the token, do not trade
-        return all(tx_status.values())
+        return not self.open_transactions.get(public_key)
@@ -2,24 +2,29 @@ import random
 from asyncio import Future, ensure_future, gather, get_event_loop
 from base64 import b64decode
 from binascii import hexlify, unhexlify
+from collections import deque
 from functools import wraps
+from struct import calcsize, pack
 
+from ipv8.attestation.trustchain.block import ValidationResult
 from ipv8.attestation.trustchain.listener import BlockListener
 from ipv8.attestation.trustchain.payload import HalfBlockBroadcastPayload, HalfBlockPairBroadcastPayload,\
-    HalfBlockPairPayload
+    HalfBlockPairPayload, HalfBlockPayload
 from ipv8.community import Community, lazy_wrapper
 from ipv8.dht import DHTError
 from ipv8.messaging.payload_headers import BinMemberAuthenticationPayload
 from ipv8.messaging.payload_headers import GlobalTimeDistributionPayload
+from ipv8.messaging.serialization import PackError
 from ipv8.peer import Peer
-from ipv8.requestcache import NumberCache, RandomNumberCache, RequestCache
-from ipv8.util import succeed
+from ipv8.requestcache import NumberCache, RandomNumberCache
 
 from anydex.core import DeclineMatchReason, DeclinedTradeReason, MAX_ORDER_TIMEOUT
 from anydex.core.block import MarketBlock
-from anydex.core.bloomfilter import BloomFilter
 from anydex.core.clearing_policy import SingleTradeClearingPolicy
-from anydex.core.database import MarketDB
+from anydex.core.database import MarketDB, get_blocks_with_hashes
+from anydex.core.expiring_set import ExpiringSet
+from anydex.core.iblt import IBLT, StrataEstimator
+from anydex.core.lookup_cache import LookupCache
 from anydex.core.match_queue import MatchPriorityQueue
 from anydex.core.matching_engine import MatchingEngine, PriceTimeStrategy
 from anydex.core.message import TraderId
@@ -27,11 +32,16 @@ from anydex.core.order import OrderId, OrderNumber
 from anydex.core.order_manager import OrderManager
 from anydex.core.order_repository import DatabaseOrderRepository, MemoryOrderRepository
 from anydex.core.orderbook import DatabaseOrderBook, OrderBook
-from anydex.core.payload import DeclineMatchPayload, DeclineTradePayload, InfoPayload, MatchPayload,\
-    OrderStatusRequestPayload, OrderStatusResponsePayload, OrderbookSyncPayload, PingPongPayload, PublicKeyPayload,\
-    TradePayload, WalletInfoPayload
+from anydex.core.payload import DeclineMatchPayload, DeclineTradePayload, InfoPayload, MatchBatchPayload,\
+    MatchPayload, OrderStatusRequestPayload, OrderStatusResponsePayload, OrderbookReconcilePayload,\
+    OrderbookReconcileResponsePayload, OrderbookSnapshotPayload, OrderbookSnapshotRequestPayload,\
+    OrderbookSyncPayload, PingPongPayload, PublicKeyPayload, TradePayload, WalletInfoPayload
 from anydex.core.payment import Payment
 from anydex.core.payment_id import PaymentId
+from anydex.core.rate_limiter import InboundRateLimiter
+from anydex.core.request_cache import MarketRequestCache
+from anydex.core.send_scheduler import PRIORITY_BROADCAST, PRIORITY_MATCH, PRIORITY_SYNC, PRIORITY_TRADE,\
+    SendScheduler
 from anydex.core.settings import MarketSettings
 from anydex.core.tick import Ask, Bid, Tick
 from anydex.core.timeout import Timeout
@@ -62,6 +72,35 @@ MSG_PONG = 21
 MSG_MATCH_DONE = 22
 MSG_PK_QUERY = 23
 MSG_PK_RESPONSE = 24
+MSG_BOOK_RECONCILE = 25
+MSG_BOOK_RECONCILE_RESPONSE = 26
+MSG_BOOK_SNAPSHOT_REQUEST = 27
+MSG_BOOK_SNAPSHOT = 28
+MSG_MATCH_BATCH = 29
+
+# The priority classes of the messages we receive, which determine the order in which they are shed under overload
+MESSAGE_PRIORITIES = {
+    MSG_MATCH: PRIORITY_MATCH,
+    MSG_MATCH_DECLINE: PRIORITY_MATCH,
+    MSG_PROPOSED_TRADE: PRIORITY_TRADE,
+    MSG_DECLINED_TRADE: PRIORITY_TRADE,
+    MSG_COUNTER_TRADE: PRIORITY_TRADE,
+    MSG_ACCEPT_TRADE: PRIORITY_TRADE,
+    MSG_WALLET_INFO: PRIORITY_TRADE,
+    MSG_ORDER_QUERY: PRIORITY_TRADE,
+    MSG_ORDER_RESPONSE: PRIORITY_TRADE,
+    MSG_BOOK_SYNC: PRIORITY_SYNC,
+    MSG_PING: PRIORITY_MATCH,
+    MSG_PONG: PRIORITY_MATCH,
+    MSG_MATCH_DONE: PRIORITY_BROADCAST,
+    MSG_PK_QUERY: PRIORITY_TRADE,
+    MSG_PK_RESPONSE: PRIORITY_TRADE,
+    MSG_BOOK_RECONCILE: PRIORITY_SYNC,
+    MSG_BOOK_RECONCILE_RESPONSE: PRIORITY_SYNC,
+    MSG_BOOK_SNAPSHOT_REQUEST: PRIORITY_SYNC,
+    MSG_BOOK_SNAPSHOT: PRIORITY_SYNC,
+    MSG_MATCH_BATCH: PRIORITY_MATCH
+}
 
 
 def synchronized(f):
@@ -219,13 +258,7 @@ class MatchCache(NumberCache):
         """
         Remove all entries from the queue that match the passed order id.
         """
-        to_remove = []
-        for item in self.queue.queue:
-            if item[2] == order_id:
-                to_remove.append(item)
-
-        for item in to_remove:
-            self.queue.queue.remove(item)
+        self.queue.remove_order(order_id)
 
     def did_trade(self, transaction, block):
         """
@@ -247,7 +280,7 @@ class MatchCache(NumberCache):
             dist = GlobalTimeDistributionPayload(global_time).to_pack_list()
             payload = HalfBlockPairPayload.from_half_blocks(block, linked_block).to_pack_list()
             packet = self.community._ez_pack(self.community._prefix, MSG_MATCH_DONE, [dist, payload], False)
-            self.community.endpoint.send(self.community.lookup_ip(match_payload.matchmaker_trader_id), packet)
+            self.community.send_to_trader(match_payload.matchmaker_trader_id, packet, PRIORITY_MATCH)
 
         if self.order.status == "open":
             self.process_match()
@@ -304,6 +337,8 @@ class PublicKeyRequestCache(RandomNumberCache):
 
     def on_timeout(self):
         self._logger.warning("No response in time from remote peer when requesting public key")
+        if not self.request_future.done():
+            self.request_future.set_result(None)
 
 
 class PingRequestCache(RandomNumberCache):
@@ -324,6 +359,28 @@ class PingRequestCache(RandomNumberCache):
         self.request_future.set_result(False)
 
 
+class OrderbookSnapshotDownload(object):
+    """
+    This class keeps track of the download of the order book snapshot of another matchmaker.
+    """
+
+    def __init__(self, peer, identifier):
+        self.peer = peer
+        self.identifier = identifier
+        self.next_offset = 0  # All snapshot entries before this offset have been received
+        self.received_ranges = {}  # Offset -> next offset of the messages received after next_offset
+        self.window_end = 0
+        self.total = None
+        self.progressed = False  # Whether a message has been received since the last check for progress
+        self.retries = 0
+        self.num_ticks = 0
+        self.future = Future()
+
+    @property
+    def is_complete(self):
+        return self.total is not None and self.next_offset >= self.total
+
+
 class MarketCommunity(Community, BlockListener):
     """
     Community for general asset trading.
@@ -333,6 +390,21 @@ class MarketCommunity(Community, BlockListener):
     PROTOCOL_VERSION = 4
     BLOCK_CLASS = MarketBlock
     DB_NAME = 'market'
+    RECONCILIATION_INITIAL_TABLE_SIZE = 4  # The size of the subtables of the first table sent when reconciling
+    SNAPSHOT_PACKET_SIZE = 1200  # The maximum number of bytes of tick blocks in a snapshot message
+    SNAPSHOT_WINDOW = 16  # The number of snapshot messages sent in response to a single snapshot request
+    SNAPSHOT_TIMEOUT = 2.0  # A snapshot is requested again if no message has been received for this many seconds
+    SNAPSHOT_RETRIES = 3  # How often a snapshot is requested again before the download is given up
+    SNAPSHOT_LIFETIME = 60  # How long (in seconds) a matchmaker keeps the snapshot it serves to another matchmaker
+    SNAPSHOT_MAX_SERVED = 16  # The maximum number of snapshots that a matchmaker serves at the same time
+    SNAPSHOT_QUERY_SIZE = 64  # The number of tick blocks of a snapshot that are fetched from the database at once
+    LOOKUP_CACHE_SIZE = 10000  # The maximum number of trader addresses and of trader public keys that are cached
+    ADDRESS_TTL = 3600  # How long (in seconds) the address of a trader is cached
+    PUBLIC_KEY_TTL = MAX_ORDER_TIMEOUT  # How long (in seconds) the public key of a trader is cached
+    LOOKUP_NEGATIVE_TTL = 30  # How long (in seconds) a failed lookup of an address or public key is remembered
+    MATCH_BATCH_SIZE = 1200  # The maximum number of bytes of matches in a match batch message
+    BROADCAST_DUPLICATE_WINDOW = 60  # How long (in seconds) the processed blocks of broadcasts are remembered
+    SEEN_BLOCKS_SIZE = 10000  # The number of hashes of processed market blocks that are remembered
 
     def __init__(self, *args, **kwargs):
         self.is_matchmaker = kwargs.pop('is_matchmaker', True)
@@ -342,6 +414,17 @@ class MarketCommunity(Community, BlockListener):
         market_block_types = [b'ask', b'bid', b'cancel_order', b'tx_init', b'tx_payment', b'tx_done']
         self.trustchain.settings.block_types_bc_disabled |= set(market_block_types)
         self.trustchain.add_listener(self, market_block_types)
+        if not isinstance(self.trustchain.relayed_broadcasts, ExpiringSet):
+            # The market community adds the ids of the blocks it broadcasts to this set, which TrustChain does not bound
+            relayed_broadcasts = ExpiringSet(MAX_ORDER_TIMEOUT)
+            for block_id in self.trustchain.relayed_broadcasts:
+                relayed_broadcasts.add(block_id)
+            self.trustchain.relayed_broadcasts = relayed_broadcasts
+            # TrustChain only trims the order of the relayed broadcasts while the set is larger than the broadcast
+            # history, which expired items keep it from being, so the order is bounded by the history size itself.
+            self.trustchain.relayed_broadcasts_order = deque(
+                self.trustchain.relayed_broadcasts_order,
+                maxlen=max(1, self.trustchain.settings.broadcast_history_size))
         self.dht = kwargs.pop('dht', None)
         self.use_database = kwargs.pop('use_database', True)
         self.settings = MarketSettings()
@@ -354,8 +437,17 @@ class MarketCommunity(Community, BlockListener):
 
         self._use_main_thread = True  # Market community is unable to deal with thread pool message processing yet
         self.mid = self.my_peer.mid
-        self.mid_register = {}
-        self.pk_register = {}
+        self.mid_register = LookupCache(self.LOOKUP_CACHE_SIZE, self.ADDRESS_TTL, self.LOOKUP_NEGATIVE_TTL)
+        self.peers_by_mid = {}
+        self.pk_register = LookupCache(self.LOOKUP_CACHE_SIZE, self.PUBLIC_KEY_TTL, self.LOOKUP_NEGATIVE_TTL)
+        self.send_scheduler = SendScheduler(self.endpoint, self.settings.send_rate, self.settings.send_burst,
+                                            self.settings.send_queue_size)
+        self.rate_limiter = InboundRateLimiter(self.settings.receive_rate, self.settings.receive_burst,
+                                               self.settings.overload_rate, self.settings.overload_burst,
+                                               self.settings.receive_limits)
+        self.received_broadcasts = ExpiringSet(self.BROADCAST_DUPLICATE_WINDOW)
+        # The hashes of the market blocks we processed recently. No block is valid after MAX_ORDER_TIMEOUT.
+        self.seen_blocks = LookupCache(self.SEEN_BLOCKS_SIZE, MAX_ORDER_TIMEOUT, 0)
         self.order_book = None
         self.market_database = MarketDB(db_working_dir, self.DB_NAME)
         self.matching_engine = None
@@ -364,9 +456,17 @@ class MarketCommunity(Community, BlockListener):
         self.matching_enabled = True
         self.use_incremental_payments = False
         self.matchmakers = set()
-        self.request_cache = RequestCache()
-        self.cancelled_orders = set()  # Keep track of cancelled orders so we don't add them again to the orderbook.
-        self.sent_matches = set()
+        self.request_cache = MarketRequestCache()
+        # Keep track of cancelled orders so we don't add them again to the orderbook, and of the matches we have sent.
+        # No tick of an order is valid after MAX_ORDER_TIMEOUT, so these can be forgotten after that time.
+        self.cancelled_orders = ExpiringSet(MAX_ORDER_TIMEOUT)
+        self.sent_matches = ExpiringSet(MAX_ORDER_TIMEOUT)
+        self.match_send_queue = {}  # Trader id -> packed match payloads that are about to be sent to the trader
+        self.received_ticks_to_match = {}  # Ticks that have been inserted in the order book but not matched yet
+        self.orderbook_bootstrapped = False  # Whether the order book has been bootstrapped from a snapshot
+        self.snapshot_downloads = {}  # Identifier -> OrderbookSnapshotDownload
+        self.served_snapshots = {}  # Peer mid -> (identifier, list of the order ids in the snapshot)
+        self.sync_cursors = {}  # Peer mid -> sync key of the last tick sent in response to an order book sync
         self.clearing_policies = []
 
         if self.settings.single_trade:
@@ -401,24 +501,56 @@ class MarketCommunity(Community, BlockListener):
             chr(MSG_PONG): self.received_pong,
             chr(MSG_MATCH_DONE): self.received_matched_tx_complete,
             chr(MSG_PK_QUERY): self.received_trader_pk_request,
-            chr(MSG_PK_RESPONSE): self.received_trader_pk_response
+            chr(MSG_PK_RESPONSE): self.received_trader_pk_response,
+            chr(MSG_BOOK_RECONCILE): self.received_orderbook_reconcile,
+            chr(MSG_BOOK_RECONCILE_RESPONSE): self.received_orderbook_reconcile_response,
+            chr(MSG_BOOK_SNAPSHOT_REQUEST): self.received_orderbook_snapshot_request,
+            chr(MSG_BOOK_SNAPSHOT): self.received_orderbook_snapshot,
+            chr(MSG_MATCH_BATCH): self.received_match_batch
         })
 
+        # Only handle the messages that the rate limiter admits, including the market blocks broadcast over TrustChain
+        for message_id, priority in MESSAGE_PRIORITIES.items():
+            self.decode_map[chr(message_id)] = self.rate_limiter.wrap(self.decode_map[chr(message_id)], priority)
+        self.trustchain_broadcast_handlers = {}  # Message id -> original handler of a TrustChain broadcast
+        for handler in [self.trustchain.received_half_block_broadcast,
+                        self.trustchain.received_half_block_pair_broadcast]:
+            message_id = chr(self.get_trustchain_message_id(handler))
+            self.trustchain_broadcast_handlers[message_id] = handler
+            self.trustchain.decode_map[message_id] = self.rate_limiter.wrap(handler, self.get_broadcast_priority)
+        # A broadcast is identified by the public key and sequence number of its (first) block, which follow the
+        # prefix, the message id and the global time of the message
+        self.broadcast_key_format = '>' + ''.join(HalfBlockPayload.format_list[:2])
+        broadcast_key_offset = len(self.trustchain._prefix) + 1 + \
+            calcsize('>' + ''.join(GlobalTimeDistributionPayload.format_list))
+        self.broadcast_key_slice = slice(broadcast_key_offset,
+                                         broadcast_key_offset + calcsize(self.broadcast_key_format))
+
         self.logger.info("Market community initialized with mid %s", hexlify(self.mid))
 
+    def get_trustchain_message_id(self, handler):
+        """
+        Return the id of the TrustChain message that is handled by the given method of the TrustChain community.
+        """
+        return next(ord(message_id) for message_id, message_handler in self.trustchain.decode_map.items()
+                    if message_handler == handler)
+
     async def get_address_for_trader(self, trader_id):
         """
         Fetch the address for a trader.
         If not available in the local storage, perform a DHT request to fetch the address of the peer with a
-        specified trader ID.
+        specified trader ID. Concurrent calls for the same trader share a single DHT request, and a trader that could
+        not be found is not looked up again for LOOKUP_NEGATIVE_TTL seconds.
         Return a Deferred that fires either with the address or None if the peer could not be found in the DHT.
         """
         if bytes(trader_id) == self.mid:
             return self.get_ipv8_address()
-        address = self.lookup_ip(trader_id)
-        if address:
-            return address
+        return await self.mid_register.lookup(trader_id, lambda: self.lookup_address_in_dht(trader_id))
 
+    async def lookup_address_in_dht(self, trader_id):
+        """
+        Perform a DHT request to fetch the address of the peer with a specified trader ID.
+        """
         self.logger.info("Address for trader %s not found locally, doing DHT request", trader_id.as_hex())
 
         if not self.dht:
@@ -431,16 +563,21 @@ class MarketCommunity(Community, BlockListener):
             return
 
         if peers:
-            self.update_ip(trader_id, peers[0].address)
+            self.logger.debug("Found address of trader %s in the DHT", trader_id.as_hex())
             return peers[0].address
 
     def get_peer_from_mid(self, peer_mid):
         """
-        Find a peer by mid.
+        Find a peer by mid. The peers are indexed on mid, and the index is rebuilt from the verified peers when it does
+        not contain a verified peer with the given mid.
         """
         peers = self.network.verified_peers
-        matches = [p for p in peers if p.mid == peer_mid]
-        return matches[0] if matches else None
+        peer = self.peers_by_mid.get(peer_mid)
+        if peer is not None and peer in peers:
+            return peer
+
+        self.peers_by_mid = {p.mid: p for p in peers}
+        return self.peers_by_mid.get(peer_mid)
 
     async def should_sign(self, block):
         """
@@ -487,8 +624,11 @@ class MarketCommunity(Community, BlockListener):
             # Create a transaction, based on the information in the block
             if not self.transaction_manager.find_by_id(TransactionId(block.hash)):
                 transaction = Transaction.from_tx_init_block(block)
-                transaction.trading_peer = Peer(block.public_key,
-                                                address=self.lookup_ip(transaction.partner_order_id.trader_id))
+                try:
+                    address = await self.get_address_for_trader(transaction.partner_order_id.trader_id)
+                except RuntimeError:
+                    address = None
+                transaction.trading_peer = Peer(block.public_key, address=address)
                 self.transaction_manager.transaction_repository.add(transaction)
 
             return True
@@ -510,11 +650,14 @@ class MarketCommunity(Community, BlockListener):
             self.order_book = OrderBook()
         self.matching_engine = MatchingEngine(PriceTimeStrategy(self.order_book))
         self.is_matchmaker = True
+        self.orderbook_bootstrapped = False
 
     def disable_matchmaker(self):
         """
         Disable the matchmaker status of this node
         """
+        if self.order_book:
+            self.order_book.cancel_all_pending_tasks()
         self.order_book = None
         self.matching_engine = None
         self.is_matchmaker = False
@@ -543,14 +686,23 @@ class MarketCommunity(Community, BlockListener):
 
     def introduction_request_callback(self, peer, dist, payload):
         if self.is_matchmaker and peer.address not in self.network.blacklist:
-            self.send_orderbook_sync(peer)
+            self.start_orderbook_sync(peer)
         self.parse_extra_bytes(payload.extra_bytes, peer)
 
     def introduction_response_callback(self, peer, dist, payload):
         if self.is_matchmaker and peer.address not in self.network.blacklist:
-            self.send_orderbook_sync(peer)
+            self.start_orderbook_sync(peer)
         self.parse_extra_bytes(payload.extra_bytes, peer)
 
+    def start_orderbook_sync(self, peer):
+        """
+        Start synchronizing the order book with a specific peer, either by reconciliation or with a Bloom filter.
+        """
+        if self.settings.reconcile_orderbook:
+            self.send_orderbook_reconcile(peer, self.RECONCILIATION_INITIAL_TABLE_SIZE, include_estimator=True)
+        else:
+            self.send_orderbook_sync(peer)
+
     def send_orderbook_sync(self, peer):
         """
         Send an orderbook sync message to a specific peer.
@@ -561,14 +713,59 @@ class MarketCommunity(Community, BlockListener):
         payload = OrderbookSyncPayload(TraderId(self.mid), Timestamp.now(), bloomfilter).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_BOOK_SYNC, [auth, payload])
-        self.endpoint.send(peer.address, packet)
+        self.send_scheduler.send(peer.address, packet, PRIORITY_SYNC)
 
     def get_orders_bloomfilter(self):
-        order_ids = [bytes(order_id) for order_id in self.order_book.get_order_ids()]
-        orders_bloom_filter = BloomFilter(0.005, max(len(order_ids), 1), prefix=b' ')
-        if order_ids:
-            orders_bloom_filter.add_keys(order_ids)
-        return orders_bloom_filter
+        return self.order_book.get_bloomfilter()
+
+    def send_orderbook_reconcile(self, peer, table_size, partition=0, partition_count=1, include_estimator=False):
+        """
+        Send an invertible Bloom lookup table of our orders in a partition of the key space to a specific peer, so
+        that the peer can determine which orders only one of us has. The first table of a reconciliation is sent
+        together with a strata estimator of our orders, with which the peer can estimate the difference if it is too
+        large for the table.
+        """
+        self.logger.debug("Sending orderbook reconciliation with table size %d (partition %d of %d) to peer %s",
+                          table_size, partition, partition_count, peer)
+        table = self.order_book.get_reconciliation_table(table_size, partition, partition_count)
+        estimator = self.order_book.get_reconciliation_estimator().to_bytes() if include_estimator else b''
+        auth = BinMemberAuthenticationPayload(self.my_peer.public_key.key_to_bin()).to_pack_list()
+        payload = OrderbookReconcilePayload(TraderId(self.mid), Timestamp.now(), table_size, partition,
+                                            partition_count, table.to_bytes(), estimator).to_pack_list()
+
+        packet = self._ez_pack(self._prefix, MSG_BOOK_RECONCILE, [auth, payload])
+        self.send_scheduler.send(peer.address, packet, PRIORITY_SYNC)
+
+    def get_blocks_with_hashes(self, block_hashes):
+        """
+        Fetch the blocks with the given hashes from the TrustChain database.
+
+        :return: A dictionary of block hash -> block, of the blocks that have been found
+        """
+        return get_blocks_with_hashes(self.trustchain.persistence, block_hashes)
+
+    def send_tick_blocks(self, tick_entries, peer):
+        """
+        Send the blocks that created the given ticks to a specific peer, in the order of the ticks.
+        """
+        blocks = self.get_blocks_with_hashes([entry.tick.block_hash for entry in tick_entries])
+        # These are the same messages as TrustChainCommunity.send_block sends, but they go through our send scheduler
+        message_id = self.get_trustchain_message_id(self.trustchain.received_half_block)
+        for entry in tick_entries:
+            tick_block = blocks.get(entry.tick.block_hash)
+            if tick_block:
+                dist = GlobalTimeDistributionPayload(self.trustchain.claim_global_time()).to_pack_list()
+                payload = HalfBlockPayload.from_half_block(tick_block).to_pack_list()
+                packet = self._ez_pack(self.trustchain._prefix, message_id, [dist, payload], False)
+                self.send_scheduler.send(peer.address, packet, PRIORITY_SYNC)
+
+    def get_tick_entries_for_keys(self, keys):
+        """
+        Return the tick entries of the orders with the given reconciliation keys that are in the order book.
+        """
+        order_ids = [self.order_book.get_order_id_for_key(key) for key in keys]
+        return [self.order_book.get_tick(order_id) for order_id in order_ids
+                if order_id and self.order_book.tick_exists(order_id)]
 
     async def unload(self):
         # Clear match caches
@@ -580,14 +777,97 @@ class MarketCommunity(Community, BlockListener):
 
         self.request_cache.clear()
 
+        for download in self.snapshot_downloads.values():
+            download.future.cancel()
+        self.snapshot_downloads.clear()
+
         # Save the ticks to the database
         if self.is_matchmaker:
             if self.use_database:
                 self.order_book.save_to_database()
             await self.order_book.shutdown_task_manager()
+        self.order_manager.order_repository.flush()
         self.market_database.close()
+        await self.send_scheduler.shutdown_task_manager()
+        self.trustchain.decode_map.update(self.trustchain_broadcast_handlers)
         await super(MarketCommunity, self).unload()
 
+    def get_tracking_stats(self):
+        """
+        Return statistics about the memory use of the sets that keep track of the orders and blocks we have seen.
+
+        :return: A dictionary with the statistics of every set, as returned by ExpiringSet.get_stats
+        :rtype: dict
+        """
+        stats = {
+            "cancelled_orders": self.cancelled_orders.get_stats(),
+            "sent_matches": self.sent_matches.get_stats(),
+            "relayed_broadcasts": self.trustchain.relayed_broadcasts.get_stats()
+        }
+        if self.is_matchmaker:
+            stats["completed_orders"] = self.order_book.completed_orders.get_stats()
+        return stats
+
+    def get_lookup_cache_stats(self):
+        """
+        Return the size and the hit and miss counts of the caches of trader addresses and public keys.
+
+        :rtype: dict
+        """
+        return {
+            "addresses": self.mid_register.get_stats(),
+            "public_keys": self.pk_register.get_stats()
+        }
+
+    def get_broadcast_priority(self, data):
+        """
+        Return the priority class of a received TrustChain broadcast. Broadcasts of a block that we have processed
+        before are the first to be shed under overload.
+        """
+        if data[self.broadcast_key_slice] in self.received_broadcasts:
+            return PRIORITY_SYNC
+        return PRIORITY_BROADCAST
+
+    def add_received_broadcast(self, block):
+        """
+        Remember that we processed a block, so later broadcasts of it are classified as duplicates. Since this is only
+        done for blocks that TrustChain has validated, a forged broadcast cannot mark a block as a duplicate.
+        """
+        self.received_broadcasts.add(pack(self.broadcast_key_format, block.public_key, block.sequence_number))
+
+    def get_rate_limiter_stats(self):
+        """
+        Return the number of admitted messages, and the numbers of messages that were dropped because a peer exceeded
+        its rate or because we were overloaded, per message type.
+
+        :rtype: dict
+        """
+        return self.rate_limiter.get_stats()
+
+    def get_seen_blocks_stats(self):
+        """
+        Return the size of the cache of processed blocks, and how often it prevented processing a block again.
+
+        :rtype: dict
+        """
+        stats = self.seen_blocks.get_stats()
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "size": stats["size"],
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "evictions": stats["evictions"],
+            "hit_rate": stats["hits"] / lookups if lookups else 0.0
+        }
+
+    def get_send_scheduler_stats(self):
+        """
+        Return the queue depths and the numbers of sent, delayed and dropped packets of every priority class.
+
+        :rtype: dict
+        """
+        return self.send_scheduler.get_stats()
+
     def get_ipv8_address(self):
         """
         Returns the address of the IPV8 instance. This method is here to make the experiments on the DAS5 succeed;
@@ -635,14 +915,41 @@ class MarketCommunity(Community, BlockListener):
 
     def lookup_ip(self, trader_id):
         """
-        Lookup the ip for the public key to send a message to a specific node
+        Lookup the ip for the public key to send a message to a specific node. The address stays cached for another
+        ADDRESS_TTL seconds, since we are still communicating with the node.
 
         :param trader_id: The public key of the node to send to
         :type trader_id: TraderId
         :return: The ip and port tuple: (<ip>, <port>)
         :rtype: tuple
         """
-        return self.mid_register.get(trader_id)
+        return self.mid_register.get(trader_id, refresh=True)
+
+    def send_to_trader(self, trader_id, packet, priority):
+        """
+        Send a packet to a trader. If the address of the trader is no longer cached, it is looked up first.
+
+        :param trader_id: The trader id of the node to send to
+        :param packet: The packet to send
+        :param priority: The priority class of the packet, one of the PRIORITY_ constants of the send scheduler
+        :type trader_id: TraderId
+        """
+        address = self.lookup_ip(trader_id)
+        if address:
+            self.send_scheduler.send(address, packet, priority)
+        else:
+            self.register_anonymous_task("send_to_trader", self.lookup_and_send_to_trader, trader_id, packet, priority)
+
+    async def lookup_and_send_to_trader(self, trader_id, packet, priority):
+        try:
+            address = await self.get_address_for_trader(trader_id)
+        except RuntimeError:
+            address = None
+
+        if address:
+            self.send_scheduler.send(address, packet, priority)
+        else:
+            self.logger.warning("Not sending packet to trader %s, its address could not be found", trader_id.as_hex())
 
     def update_ip(self, trader_id, ip):
         """
@@ -760,27 +1067,310 @@ class MarketCommunity(Community, BlockListener):
 
         order_id = OrderId(TraderId(unhexlify(block.transaction["trader_id"])),
                            OrderNumber(block.transaction["order_number"]))
-        if self.is_matchmaker and self.order_book.tick_exists(order_id):
-            self.order_book.remove_tick(order_id)
+        if self.is_matchmaker:
+            # The cancellation is also kept if the tick has not been received yet, so it is not inserted later on
             self.cancelled_orders.add(order_id)
+            if self.order_book.tick_exists(order_id):
+                self.order_book.remove_tick(order_id)
 
     @lazy_wrapper(OrderbookSyncPayload)
     def received_orderbook_sync(self, peer, payload):
+        """
+        We received the Bloom filter of the orders of another matchmaker. We send it at most num_order_sync of the
+        ticks that are not in the filter, in order of their distance from the best price, so the ticks that are most
+        likely to be matched are synced first. The sync key of the last tick sent is kept as a cursor, so the next sync
+        with this peer continues deeper in the order book instead of sending the same ticks again while they are in
+        transit. Once the end of the order book is reached, we start again from the top.
+        """
         if not self.is_matchmaker:
             return
 
+        num_order_sync = self.settings.num_order_sync
+        cursor = self.sync_cursors.pop(peer.mid, None)
+        ticks_after_cursor = []
+        ticks_before_cursor = []
+        for sync_key, entry in self.order_book.get_ticks_by_distance():
+            if len(ticks_after_cursor) >= num_order_sync:
+                break
+            if bytes(entry.order_id) in payload.bloomfilter:
+                continue
+            if cursor is None or sync_key > cursor:
+                ticks_after_cursor.append((sync_key, entry))
+            elif len(ticks_before_cursor) < num_order_sync:
+                ticks_before_cursor.append((sync_key, entry))
+
+        ticks = (ticks_after_cursor + ticks_before_cursor)[:num_order_sync]
+        if ticks:
+            self.sync_cursors[peer.mid] = ticks[-1][0]
+            self.send_tick_blocks([entry for _, entry in ticks], peer)
+
+    @lazy_wrapper(OrderbookReconcilePayload)
+    def received_orderbook_reconcile(self, peer, payload):
+        """
+        We received the reconciliation table of the orders of another matchmaker in a partition of the key space. We
+        subtract it from the table of our own orders in that partition, which leaves the orders that only one of us has.
+        We send the blocks of the orders that only we have, and ask for the orders that only the other matchmaker has.
+        If the difference is too large to be determined with this table, we send back our own tables with more cells.
+        """
+        if not self.is_matchmaker or not self.settings.reconcile_orderbook:
+            return
+
+        table_size, partition, partition_count = payload.table_size, payload.partition, payload.partition_count
+        if table_size > self.order_book.RECONCILIATION_TABLE_SIZE or partition >= partition_count or \
+                partition_count > self.order_book.RECONCILIATION_PARTITIONS or partition_count & (partition_count - 1):
+            self.logger.warning("Ignoring orderbook reconciliation with table size %d (partition %d of %d)",
+                                table_size, partition, partition_count)
+            return
+
+        try:
+            other_table = IBLT.from_bytes(table_size, payload.table)
+            other_estimator = StrataEstimator.from_bytes(payload.estimator) if payload.estimator else None
+        except ValueError as exc:
+            self.logger.warning("Ignoring invalid orderbook reconciliation: %s", exc)
+            return
+
+        own_table = self.order_book.get_reconciliation_table(table_size, partition, partition_count)
+        difference = own_table.subtract(other_table).decode()
+        if difference is None:
+            self.send_larger_orderbook_reconcile(peer, table_size, partition, partition_count, other_estimator)
+            return
+
+        own_keys, other_keys = difference
+        self.logger.debug("Reconciled orderbook with peer %s: %d own and %d other orders", peer, len(own_keys),
+                          len(other_keys))
+        self.send_tick_blocks(self.get_tick_entries_for_keys(own_keys), peer)
+
+        if other_keys:
+            auth = BinMemberAuthenticationPayload(self.my_peer.public_key.key_to_bin()).to_pack_list()
+            payload = OrderbookReconcileResponsePayload(TraderId(self.mid), Timestamp.now(),
+                                                        list(other_keys)).to_pack_list()
+            packet = self._ez_pack(self._prefix, MSG_BOOK_RECONCILE_RESPONSE, [auth, payload])
+            self.send_scheduler.send(peer.address, packet, PRIORITY_SYNC)
+
+    def send_larger_orderbook_reconcile(self, peer, table_size, partition, partition_count, other_estimator):
+        """
+        Reply to a reconciliation table that is too small for the difference with our own tables with more cells.
+
+        If the table is the first of a reconciliation, we estimate the difference with the strata estimator of the
+        other matchmaker, and split our tables over as many partitions as needed for that difference. Otherwise, we send
+        our table of the same partition with twice the size, or our tables of both halves of the partition once the
+        table is as large as fits in a packet. If the difference is too large to be listed, we fall back to the Bloom
+        filter sync.
+        """
+        partitions = []
+        if other_estimator is not None:
+            estimate = self.order_book.get_reconciliation_estimator().estimate_difference(other_estimator)
+            self.logger.debug("Estimated orderbook difference with peer %s at %s orders", peer, estimate)
+            # A table that cannot be decoded holds more keys than about twice the size of its subtables
+            layout = estimate is not None and \
+                self.order_book.get_reconciliation_layout(max(estimate, 2 * table_size))
+            if layout:
+                partition_count, table_size = layout
+                partitions = range(partition_count)
+        elif table_size * 2 <= self.order_book.RECONCILIATION_TABLE_SIZE:
+            table_size *= 2
+            partitions = [partition]
+        elif partition_count * 2 <= self.order_book.RECONCILIATION_PARTITIONS:
+            partition_count *= 2
+            partitions = [partition * 2, partition * 2 + 1]
+
+        if not partitions:
+            self.logger.info("Orderbooks differ too much to reconcile, falling back to Bloom filter sync")
+            self.send_orderbook_sync(peer)
+            return
+
+        for next_partition in partitions:
+            self.send_orderbook_reconcile(peer, table_size, next_partition, partition_count)
+
+    @lazy_wrapper(OrderbookReconcileResponsePayload)
+    def received_orderbook_reconcile_response(self, peer, payload):
+        """
+        Another matchmaker asks for the orders that it found to be missing after reconciling its order book with ours.
+        """
+        if not self.is_matchmaker or not self.settings.reconcile_orderbook:
+            return
+
+        self.send_tick_blocks(self.get_tick_entries_for_keys(payload.keys), peer)
+
+    def request_orderbook_snapshot(self, peer):
+        """
+        Download the order book snapshot of another matchmaker and insert its ticks in our order book. Once the download
+        is complete, or has been given up, we switch to the regular order book sync with this matchmaker.
+        :return A Future that fires with the number of ticks that have been inserted from the snapshot
+        """
+        identifier = random.randint(0, 2 ** 32 - 1)
+        download = OrderbookSnapshotDownload(peer, identifier)
+        self.snapshot_downloads[identifier] = download
+        self.send_orderbook_snapshot_request(download)
+        self.register_task("orderbook_snapshot_%d" % identifier, self.check_orderbook_snapshot, download,
+                           interval=self.SNAPSHOT_TIMEOUT)
+        return download.future
+
+    def send_orderbook_snapshot_request(self, download):
+        """
+        Request the next window of an order book snapshot, starting at the first entry that we have not received yet.
+        """
+        self.logger.debug("Requesting orderbook snapshot from peer %s at offset %d", download.peer,
+                          download.next_offset)
+        auth = BinMemberAuthenticationPayload(self.my_peer.public_key.key_to_bin()).to_pack_list()
+        payload = OrderbookSnapshotRequestPayload(TraderId(self.mid), Timestamp.now(), download.identifier,
+                                                  download.next_offset).to_pack_list()
+
+        packet = self._ez_pack(self._prefix, MSG_BOOK_SNAPSHOT_REQUEST, [auth, payload])
+        self.send_scheduler.send(download.peer.address, packet, PRIORITY_SYNC)
+
+    def check_orderbook_snapshot(self, download):
+        """
+        Check whether an order book snapshot download is still making progress. If not, request the missing part of
+        the snapshot again, or give up the download after SNAPSHOT_RETRIES attempts.
+        """
+        if download.progressed:
+            download.progressed = False
+            download.retries = 0
+        elif download.retries < self.SNAPSHOT_RETRIES:
+            download.retries += 1
+            self.send_orderbook_snapshot_request(download)
+        else:
+            self.logger.warning("Giving up orderbook snapshot download from peer %s", download.peer)
+            self.orderbook_bootstrapped = False
+            self.finish_orderbook_snapshot(download)
+
+    def finish_orderbook_snapshot(self, download):
+        """
+        Stop an order book snapshot download and continue with the regular order book sync.
+        """
+        self.snapshot_downloads.pop(download.identifier, None)
+        self.cancel_pending_task("orderbook_snapshot_%d" % download.identifier)
+        if self.is_matchmaker:
+            self.start_orderbook_sync(download.peer)
+        if not download.future.done():
+            download.future.set_result(download.num_ticks)
+
+    def iter_packed_tick_blocks(self, order_ids, offset):
+        """
+        Yield the packed blocks that created the ticks with the given order ids from a given offset, or an empty string
+        for ticks that are no longer in the order book. The blocks are fetched with one query per SNAPSHOT_QUERY_SIZE
+        order ids.
+        """
+        for start in range(offset, len(order_ids), self.SNAPSHOT_QUERY_SIZE):
+            entries = [self.order_book.get_tick(order_id)
+                       for order_id in order_ids[start:start + self.SNAPSHOT_QUERY_SIZE]]
+            blocks = self.get_blocks_with_hashes([entry.tick.block_hash for entry in entries if entry])
+            for entry in entries:
+                tick_block = blocks.get(entry.tick.block_hash) if entry else None
+                yield tick_block.pack() if tick_block else b''
+
+    @lazy_wrapper(OrderbookSnapshotRequestPayload)
+    def received_orderbook_snapshot_request(self, peer, payload):
+        """
+        Another matchmaker requests a window of our order book snapshot. The snapshot is a list of the order ids in our
+        order book at the time of the first request. It is kept for a while, so the other matchmaker can download it in
+        multiple windows, and request parts of it again. We keep a single snapshot per matchmaker, and at most
+        SNAPSHOT_MAX_SERVED snapshots in total.
+        """
+        if not self.is_matchmaker or not self.settings.bootstrap_from_snapshot:
+            return
+
+        served_snapshot = self.served_snapshots.get(peer.mid)
+        if served_snapshot and served_snapshot[0] == payload.identifier:
+            snapshot = served_snapshot[1]
+        else:
+            if not served_snapshot and len(self.served_snapshots) >= self.SNAPSHOT_MAX_SERVED:
+                self.logger.info("Ignoring orderbook snapshot request from peer %s, serving too many snapshots", peer)
+                return
+            # A new snapshot of a matchmaker replaces the snapshot that it downloaded before
+            snapshot = self.order_book.get_order_ids()
+            self.served_snapshots[peer.mid] = (payload.identifier, snapshot)
+            self.replace_task("served_snapshot_%s" % hexlify(peer.mid).decode(), self.served_snapshots.pop,
+                              peer.mid, None, delay=self.SNAPSHOT_LIFETIME)
+
+        self.send_orderbook_snapshot(peer, payload.identifier, snapshot, payload.offset)
+
+    def send_orderbook_snapshot(self, peer, identifier, snapshot, offset):
+        """
+        Send a window of at most SNAPSHOT_WINDOW messages of an order book snapshot, starting at a given offset. Every
+        message contains the packed tick blocks of consecutive snapshot entries, up to SNAPSHOT_PACKET_SIZE bytes.
+        Entries of ticks that have left the order book since the snapshot was taken are skipped.
+        """
+        offset = min(offset, len(snapshot))
+        messages = [[offset, offset, []]]  # Lists of offset, next offset and packed blocks
+        size = 0
+        for index, packed_block in enumerate(self.iter_packed_tick_blocks(snapshot, offset), offset):
+            if messages[-1][2] and size + len(packed_block) > self.SNAPSHOT_PACKET_SIZE:
+                if len(messages) == self.SNAPSHOT_WINDOW:
+                    break
+                messages.append([index, index, []])
+                size = 0
+            if packed_block:
+                messages[-1][2].append(packed_block)
+                size += len(packed_block)
+            messages[-1][1] = index + 1
+
+        window_end = messages[-1][1]
+        auth = BinMemberAuthenticationPayload(self.my_peer.public_key.key_to_bin()).to_pack_list()
+        for message_offset, next_offset, packed_blocks in messages:
+            payload = OrderbookSnapshotPayload(TraderId(self.mid), Timestamp.now(), identifier, message_offset,
+                                               next_offset, window_end, len(snapshot), len(packed_blocks),
+                                               b''.join(packed_blocks)).to_pack_list()
+            packet = self._ez_pack(self._prefix, MSG_BOOK_SNAPSHOT, [auth, payload])
+            self.send_scheduler.send(peer.address, packet, PRIORITY_SYNC)
+
+    @lazy_wrapper(OrderbookSnapshotPayload)
+    def received_orderbook_snapshot(self, peer, payload):
+        """
+        We received a part of the order book snapshot that we requested from another matchmaker. We insert the ticks in
+        it, and request the next window of the snapshot once we have received the current one.
+        """
+        download = self.snapshot_downloads.get(payload.identifier)
+        if not download or download.peer != peer or not self.is_matchmaker:
+            return
+        if payload.offset < download.next_offset or payload.offset in download.received_ranges \
+                or payload.next_offset < payload.offset:
+            return
+
+        try:
+            block_payloads = self.serializer.unpack_to_serializables([HalfBlockPayload] * payload.num_blocks,
+                                                                     payload.blocks)[:-1]
+        except PackError as exc:
+            self.logger.warning("Ignoring invalid orderbook snapshot message: %s", exc)
+            return
+
+        blocks = [self.BLOCK_CLASS.from_payload(block_payload, self.serializer) for block_payload in block_payloads]
+        download.num_ticks += self.process_tick_blocks(blocks)
+        download.progressed = True
+        download.total = payload.total
+        download.window_end = max(download.window_end, payload.window_end)
+        download.received_ranges[payload.offset] = payload.next_offset
+        while download.next_offset in download.received_ranges:
+            download.next_offset = download.received_ranges.pop(download.next_offset)
+
+        if download.is_complete:
+            self.logger.info("Received orderbook snapshot with %d ticks from peer %s", download.num_ticks, peer)
+            self.finish_orderbook_snapshot(download)
+        elif download.next_offset >= download.window_end:
+            self.send_orderbook_snapshot_request(download)
+
+    def process_tick_blocks(self, blocks):
+        """
+        Verify and store a batch of tick blocks in a single database transaction, and insert their ticks in the order
+        book. Unlike blocks that are received one by one, these blocks are not passed to the block listeners.
+        :return The number of ticks that have been inserted in the order book
+        """
         ticks = []
-        for order_id in self.order_book.get_order_ids():
-            if bytes(order_id) not in payload.bloomfilter:
-                is_ask = self.order_book.ask_exists(order_id)
-                entry = self.order_book.get_ask(order_id) if is_ask else self.order_book.get_bid(order_id)
-                ticks.append(entry)
-
-        for entry in random.sample(ticks, min(len(ticks), self.settings.num_order_sync)):
-            # Send the block pair associated with this tick
-            tick_block = self.trustchain.persistence.get_block_with_hash(entry.tick.block_hash)
-            if tick_block:
-                self.trustchain.send_block(tick_block, address=peer.address)
+        persistence = self.trustchain.persistence
+        with persistence:
+            for block in blocks:
+                if block.type not in (b'ask', b'bid') or block.transaction.get("version") != self.PROTOCOL_VERSION \
+                        or not block.is_valid_tick_block():
+                    self._logger.warning("Invalid tick block received in orderbook snapshot!")
+                    continue
+                if block.validate(persistence)[0] == ValidationResult.invalid:
+                    continue
+                if not persistence.contains(block):
+                    persistence.add_block(block)
+                ticks.append(Ask.from_block(block) if block.type == b'ask' else Bid.from_block(block))
+
+        return sum(self.insert_received_tick(tick) for tick in ticks)
 
     def ping_peer(self, peer):
         """
@@ -800,7 +1390,7 @@ class MarketCommunity(Community, BlockListener):
         payload = PingPongPayload(TraderId(self.mid), Timestamp.now(), identifier).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_PING, [auth, payload])
-        self.endpoint.send(peer.address, packet)
+        self.send_scheduler.send(peer.address, packet, PRIORITY_MATCH)
 
     @lazy_wrapper(PingPongPayload)
     def received_ping(self, peer, payload):
@@ -814,7 +1404,7 @@ class MarketCommunity(Community, BlockListener):
         payload = PingPongPayload(TraderId(self.mid), Timestamp.now(), identifier).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_PONG, [auth, payload])
-        self.endpoint.send(peer.address, packet)
+        self.send_scheduler.send(peer.address, packet, PRIORITY_MATCH)
 
     @lazy_wrapper(PingPongPayload)
     def received_pong(self, _, payload):
@@ -934,7 +1524,7 @@ class MarketCommunity(Community, BlockListener):
             broadcast_peers = random.sample(self.matchmakers, min(len(self.matchmakers), self.settings.fanout))
 
         for peer in broadcast_peers:
-            self.endpoint.send(peer.address, packet)
+            self.send_scheduler.send(peer.address, packet, PRIORITY_BROADCAST)
         self.trustchain.relayed_broadcasts.add(block.block_id)
 
         return broadcast_peers
@@ -956,7 +1546,7 @@ class MarketCommunity(Community, BlockListener):
             broadcast_peers = random.sample(self.matchmakers, min(len(self.matchmakers), self.settings.fanout))
 
         for peer in broadcast_peers:
-            self.endpoint.send(peer.address, packet)
+            self.send_scheduler.send(peer.address, packet, PRIORITY_BROADCAST)
         self.trustchain.relayed_broadcasts.add(block1.block_id)
 
         return broadcast_peers
@@ -964,8 +1554,13 @@ class MarketCommunity(Community, BlockListener):
     def received_block(self, block):
         """
         We received a block for the market community.
-        Process it accordingly, after checking the version number first.
+        Process it accordingly, after checking that we did not process it before and the version number first.
+        The block is only remembered as processed once it has been processed without errors.
         """
+        self.add_received_broadcast(block)
+        if self.seen_blocks.get(block.hash):
+            return
+
         if block.transaction.get("version") != self.PROTOCOL_VERSION:
             return
 
@@ -979,6 +1574,10 @@ class MarketCommunity(Community, BlockListener):
             self.process_tx_done_block(block)
         elif block.type == b"cancel_order":
             self.process_cancel_order_block(block)
+        else:
+            return
+
+        self.seen_blocks.put(block.hash, True)
 
     def add_matchmaker(self, matchmaker):
         """
@@ -989,6 +1588,10 @@ class MarketCommunity(Community, BlockListener):
 
         self.matchmakers.add(matchmaker)
 
+        if self.is_matchmaker and self.settings.bootstrap_from_snapshot and not self.orderbook_bootstrapped:
+            self.orderbook_bootstrapped = True
+            self.request_orderbook_snapshot(matchmaker)
+
     @synchronized
     def create_new_tick_block(self, tick):
         """
@@ -1116,23 +1719,58 @@ class MarketCommunity(Community, BlockListener):
                           tick.order_id.trader_id.as_hex(), tick.assets)
 
         if self.is_matchmaker:
-            insert_method = self.order_book.insert_ask if isinstance(tick, Ask) else self.order_book.insert_bid
+            self.insert_received_tick(tick)
 
-            if not self.order_book.tick_exists(tick.order_id) and tick.order_id not in self.cancelled_orders:
-                self.logger.info("Inserting tick %s from %s, asset pair: %s", tick, tick.order_id, tick.assets)
-                insert_method(tick)
+    def insert_received_tick(self, tick):
+        """
+        Insert a received tick in the order book, if it is not in the order book yet, and schedule matching it.
+        :param tick: the received tick to insert
+        :return True if the tick has been inserted, False otherwise
+        """
+        insert_method = self.order_book.insert_ask if isinstance(tick, Ask) else self.order_book.insert_bid
 
-                if self.order_book.tick_exists(tick.order_id):
-                    # Check for new matches against the orders of this node
-                    for order in self.order_manager.order_repository.find_all():
-                        order_tick_entry = self.order_book.get_tick(order.order_id)
-                        if not order.is_valid() or not order_tick_entry:
-                            continue
+        if not self.order_book.tick_exists(tick.order_id) and tick.order_id not in self.cancelled_orders:
+            self.logger.info("Inserting tick %s from %s, asset pair: %s", tick, tick.order_id, tick.assets)
+            insert_method(tick)
 
-                        self.match(order_tick_entry.tick)
+            if self.order_book.tick_exists(tick.order_id):
+                # The matching is done once for all ticks that are received in this iteration of the event loop
+                self.received_ticks_to_match[tick.order_id] = tick
+                if not self.is_pending_task_active("match_received_ticks"):
+                    self.register_task("match_received_ticks", self.match_received_ticks)
+                return True
+        return False
 
-                    # Only after we have matched our own orders, do the matching with other ticks if necessary
-                    self.match(tick)
+    def match_received_ticks(self):
+        """
+        Try to find matches for the ticks that have been received since the last call to this method, and for the orders
+        of this node that these ticks can cross, and send proposed trade messages for all matches found.
+        :return The number of matches found
+        """
+        received_order_ids = list(self.received_ticks_to_match.keys())
+        self.received_ticks_to_match.clear()
+        if not self.is_matchmaker or not self.matching_enabled:
+            return 0
+
+        received_tick_entries = [self.order_book.get_tick(order_id) for order_id in received_order_ids
+                                 if self.order_book.tick_exists(order_id)]
+
+        # Check for new matches against the orders of this node that can be crossed by the received ticks
+        open_orders = self.order_manager.order_repository.open_orders
+        order_tick_entries = {}
+        for tick_entry in received_tick_entries:
+            for order in open_orders.find_crossing(tick_entry.price, tick_entry.tick.is_ask()):
+                order_tick_entry = self.order_book.get_tick(order.order_id)
+                if order_tick_entry:
+                    order_tick_entries[order.order_id] = order_tick_entry
+        matches = self.matching_engine.match_batch(list(order_tick_entries.values()))
+
+        # Only after we have matched our own orders, do the matching with other ticks if necessary
+        matches += self.matching_engine.match_batch(received_tick_entries)
+
+        for tick_entry, matched_ticks in matches:
+            self.send_match_messages(matched_ticks, tick_entry.order_id)
+        return sum(len(matched_ticks) for _, matched_ticks in matches)
 
     def send_match_messages(self, matching_ticks, order_id):
         for tick_entry in matching_ticks:
@@ -1140,7 +1778,8 @@ class MarketCommunity(Community, BlockListener):
 
     def send_match_message(self, tick, recipient_order_id):
         """
-        Send a match message to a specific node
+        Queue a match message for a specific node. All matches queued for the same trader within
+        match_send_interval seconds are sent together in match batch messages.
         :param tick: The matched tick
         :param recipient_order_id: The order id of the recipient, matching the tick
         """
@@ -1153,27 +1792,48 @@ class MarketCommunity(Community, BlockListener):
         # Add recipient order number, matched quantity, trader ID of the matched person, our own trader ID and match ID
         my_id = TraderId(self.mid)
         payload_tup += (recipient_order_id.order_number, tick.order_id.trader_id, my_id)
+        packed_match = self.serializer.pack_multiple(MatchPayload(*payload_tup).to_pack_list())[0]
 
-        async def get_address():
-            try:
-                address = await self.get_address_for_trader(recipient_order_id.trader_id)
-            except RuntimeError:
-                address = None
-
-            if not address:
-                return
+        self.logger.info("Queueing match message for order id %s and tick order id %s to trader %s",
+                         str(recipient_order_id), str(tick.order_id), recipient_order_id.trader_id.as_hex())
 
-            self.logger.info("Sending match message for order id %s and tick order id %s to trader %s",
-                             str(recipient_order_id), str(tick.order_id), recipient_order_id.trader_id.as_hex())
+        trader_id = recipient_order_id.trader_id
+        if trader_id not in self.match_send_queue:
+            self.match_send_queue[trader_id] = []
+            self.register_task('send_match_batch_%s' % trader_id.as_hex(), self.send_match_batches, trader_id,
+                               delay=random.uniform(0, self.settings.match_send_interval))
+        self.match_send_queue[trader_id].append(packed_match)
 
-            auth = BinMemberAuthenticationPayload(self.my_peer.public_key.key_to_bin()).to_pack_list()
-            payload = MatchPayload(*payload_tup).to_pack_list()
+    async def send_match_batches(self, trader_id):
+        """
+        Send the matches queued for a trader, in as few match batch messages as possible.
+        """
+        try:
+            address = await self.get_address_for_trader(trader_id)
+        except RuntimeError:
+            address = None
 
-            packet = self._ez_pack(self._prefix, MSG_MATCH, [auth, payload])
-            self.endpoint.send(address, packet)
+        # Matches queued while the address was looked up are sent as well
+        packed_matches = self.match_send_queue.pop(trader_id, [])
+        if not address:
+            return
 
-        self.register_task('get_address_for_trader_%s-%s' % (recipient_order_id, tick.order_id), get_address,
-                           delay=random.uniform(0, self.settings.match_send_interval))
+        auth = BinMemberAuthenticationPayload(self.my_peer.public_key.key_to_bin()).to_pack_list()
+        batches = [[]]
+        size = 0
+        for packed_match in packed_matches:
+            if batches[-1] and size + len(packed_match) > self.MATCH_BATCH_SIZE:
+                batches.append([])
+                size = 0
+            batches[-1].append(packed_match)
+            size += len(packed_match)
+
+        self.logger.info("Sending %d match(es) to trader %s in %d message(s)",
+                         len(packed_matches), trader_id.as_hex(), len(batches))
+        for batch in batches:
+            payload = MatchBatchPayload(TraderId(self.mid), Timestamp.now(), len(batch), b''.join(batch)).to_pack_list()
+            packet = self._ez_pack(self._prefix, MSG_MATCH_BATCH, [auth, payload])
+            self.send_scheduler.send(address, packet, PRIORITY_MATCH)
 
     @lazy_wrapper(MatchPayload)
     def received_match(self, peer, payload):
@@ -1190,6 +1850,26 @@ class MarketCommunity(Community, BlockListener):
 
         self.process_match_payload(payload)
 
+    @lazy_wrapper(MatchBatchPayload)
+    def received_match_batch(self, peer, payload):
+        """
+        We received a batch of match messages from a matchmaker.
+        """
+        try:
+            match_payloads = self.serializer.unpack_to_serializables([MatchPayload] * payload.num_matches,
+                                                                     payload.matches)[:-1]
+        except PackError as exc:
+            self.logger.warning("Ignoring invalid match batch message: %s", exc)
+            return
+
+        self.logger.info("We received a batch of %d match(es) from %s", len(match_payloads), payload.trader_id.as_hex())
+
+        self.update_ip(payload.trader_id, peer.address)
+        self.add_matchmaker(peer)
+
+        for match_payload in match_payloads:
+            self.process_match_payload(match_payload)
+
     def process_match_payload(self, payload):
         """
         Process a match payload.
@@ -1293,17 +1973,15 @@ class MarketCommunity(Community, BlockListener):
                 cache.received_decline_trade(other_order_id, DeclinedTradeReason.ADDRESS_LOOKUP_FAIL)
 
     def send_decline_match_message(self, order, other_order_id, matchmaker_trader_id, decline_reason):
-        address = self.lookup_ip(matchmaker_trader_id)
-
-        self.logger.info("Sending decline match message for order %s to trader %s (ip: %s, port: %s)",
-                         order.order_id, matchmaker_trader_id.as_hex(), *address)
+        self.logger.info("Sending decline match message for order %s to trader %s", order.order_id,
+                         matchmaker_trader_id.as_hex())
 
         auth = BinMemberAuthenticationPayload(self.my_peer.public_key.key_to_bin()).to_pack_list()
         payload = (TraderId(self.mid), Timestamp.now(), order.order_id.order_number, other_order_id, decline_reason)
         payload = DeclineMatchPayload(*payload).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_MATCH_DECLINE, [auth, payload])
-        self.endpoint.send(address, packet)
+        self.send_to_trader(matchmaker_trader_id, packet, PRIORITY_MATCH)
 
     @lazy_wrapper(DeclineMatchPayload)
     def received_decline_match(self, _, payload):
@@ -1318,8 +1996,8 @@ class MarketCommunity(Community, BlockListener):
         matched_tick_entry = self.order_book.get_tick(matched_order_id)
 
         if tick_entry and matched_tick_entry:
-            tick_entry.block_for_matching(matched_tick_entry.order_id)
-            matched_tick_entry.block_for_matching(tick_entry.order_id)
+            self.order_book.block_for_matching(tick_entry.order_id, matched_tick_entry.order_id)
+            self.order_book.block_for_matching(matched_tick_entry.order_id, tick_entry.order_id)
 
         if matched_tick_entry and (payload.decline_reason == DeclineMatchReason.OTHER_ORDER_COMPLETED or
                                    payload.decline_reason == DeclineMatchReason.OTHER_ORDER_CANCELLED):
@@ -1369,7 +2047,7 @@ class MarketCommunity(Community, BlockListener):
                           proposed_trade.assets)
 
         packet = self._ez_pack(self._prefix, MSG_PROPOSED_TRADE, [auth, payload])
-        self.endpoint.send(address, packet)
+        self.send_scheduler.send(address, packet, PRIORITY_TRADE)
 
     def check_trade_payload_validity(self, payload):
         if bytes(payload.recipient_order_id.trader_id) != self.mid:
@@ -1381,16 +2059,13 @@ class MarketCommunity(Community, BlockListener):
         return True, ''
 
     def get_outstanding_proposals(self, order_id, partner_order_id):
-        return [(proposal_id, cache) for proposal_id, cache in self.request_cache._identifiers.items()
-                if isinstance(cache, ProposedTradeRequestCache)
-                and cache.proposed_trade.order_id == order_id
-                and cache.proposed_trade.recipient_order_id == partner_order_id]
+        return self.request_cache.get_proposals(order_id, partner_order_id)
 
     def get_match_caches(self):
         """
         Return all match caches.
         """
-        return [cache for cache in self.request_cache._identifiers.values() if isinstance(cache, MatchCache)]
+        return self.request_cache.get_match_caches()
 
     @lazy_wrapper(TradePayload)
     async def received_proposed_trade(self, peer, payload):
@@ -1493,7 +2168,7 @@ class MarketCommunity(Community, BlockListener):
         payload = DeclineTradePayload(*payload).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_DECLINED_TRADE, [auth, payload])
-        self.endpoint.send(self.lookup_ip(declined_trade.recipient_order_id.trader_id), packet)
+        self.send_to_trader(declined_trade.recipient_order_id.trader_id, packet, PRIORITY_TRADE)
 
     @lazy_wrapper(DeclineTradePayload)
     def received_decline_trade(self, _, payload):
@@ -1542,7 +2217,7 @@ class MarketCommunity(Community, BlockListener):
         payload = TradePayload(*payload).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_COUNTER_TRADE, [auth, payload])
-        self.endpoint.send(self.lookup_ip(counter_trade.recipient_order_id.trader_id), packet)
+        self.send_to_trader(counter_trade.recipient_order_id.trader_id, packet, PRIORITY_TRADE)
 
     @lazy_wrapper(TradePayload)
     def received_counter_trade(self, _, payload):
@@ -1604,7 +2279,7 @@ class MarketCommunity(Community, BlockListener):
         payload = TradePayload(*payload).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_ACCEPT_TRADE, [auth, payload])
-        self.endpoint.send(self.lookup_ip(proposed_trade.order_id.trader_id), packet)
+        self.send_to_trader(proposed_trade.order_id.trader_id, packet, PRIORITY_TRADE)
 
     @lazy_wrapper(TradePayload)
     async def received_accept_trade(self, peer, payload):
@@ -1637,7 +2312,7 @@ class MarketCommunity(Community, BlockListener):
         payload = OrderStatusRequestPayload(TraderId(self.mid), Timestamp.now(), order_id, cache.number).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_ORDER_QUERY, [auth, payload])
-        self.endpoint.send(self.lookup_ip(order_id.trader_id), packet)
+        self.send_to_trader(order_id.trader_id, packet, PRIORITY_TRADE)
 
         return request_future
 
@@ -1652,7 +2327,7 @@ class MarketCommunity(Community, BlockListener):
         new_payload = OrderStatusResponsePayload(*order_payload).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_ORDER_RESPONSE, [auth, new_payload])
-        self.endpoint.send(peer.address, packet)
+        self.send_scheduler.send(peer.address, packet, PRIORITY_TRADE)
 
     @lazy_wrapper(OrderStatusResponsePayload)
     def received_order_status(self, _, payload):
@@ -1684,7 +2359,7 @@ class MarketCommunity(Community, BlockListener):
         new_payload = WalletInfoPayload(*payload).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_WALLET_INFO, [auth, new_payload])
-        self.endpoint.send(self.lookup_ip(transaction.partner_order_id.trader_id), packet)
+        self.send_to_trader(transaction.partner_order_id.trader_id, packet, PRIORITY_TRADE)
 
         transaction.sent_wallet_info = True
         self.transaction_manager.transaction_repository.update(transaction)
@@ -1725,8 +2400,11 @@ class MarketCommunity(Community, BlockListener):
         # While this conditional is not very pretty, the alternative is to move all this logic to the wallet which
         # requires the wallet to know about transactions, the market community and IPv8.
         if isinstance(wallet, TrustchainWallet):
-            peer = Peer(b64decode(str(transaction.partner_incoming_address)),
-                        address=self.lookup_ip(transaction.partner_order_id.trader_id))
+            try:
+                address = await self.get_address_for_trader(transaction.partner_order_id.trader_id)
+            except RuntimeError:
+                address = None
+            peer = Peer(b64decode(str(transaction.partner_incoming_address)), address=address)
             transfer_coro = wallet.transfer(transfer_amount.amount, peer)
         else:
             transfer_coro = wallet.transfer(transfer_amount.amount, str(transaction.partner_incoming_address))
@@ -1795,9 +2473,14 @@ class MarketCommunity(Community, BlockListener):
             self.match(tick_entry_sender.tick)
 
     def send_trader_pk_request(self, trader_id):
-        if trader_id in self.pk_register:
-            return succeed(self.pk_register[trader_id])
+        """
+        Fetch the public key of a trader, from the cache or by requesting it from the trader. Concurrent calls for the
+        same trader share a single request.
+        :return An awaitable that fires with the public key, or with None if the trader did not respond in time
+        """
+        return self.pk_register.lookup(trader_id, lambda: self.request_trader_pk(trader_id))
 
+    def request_trader_pk(self, trader_id):
         self.logger.debug("Sending public key status request to trader %s", trader_id.as_hex())
 
         request_future = Future()
@@ -1807,7 +2490,7 @@ class MarketCommunity(Community, BlockListener):
         payload = PublicKeyPayload(TraderId(self.mid), Timestamp.now(), cache.number).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_PK_QUERY, [auth, payload])
-        self.endpoint.send(self.lookup_ip(trader_id), packet)
+        self.send_to_trader(trader_id, packet, PRIORITY_TRADE)
 
         return request_future
 
@@ -1817,12 +2500,11 @@ class MarketCommunity(Community, BlockListener):
         new_payload = PublicKeyPayload(TraderId(self.mid), Timestamp.now(), payload.identifier).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_PK_RESPONSE, [auth, new_payload])
-        self.endpoint.send(peer.address, packet)
+        self.send_scheduler.send(peer.address, packet, PRIORITY_TRADE)
 
     @lazy_wrapper(PublicKeyPayload)
     def received_trader_pk_response(self, peer, payload):
         request = self.request_cache.pop("pk-request", payload.identifier)
-        self.pk_register[request.trader_id] = peer.public_key
         request.request_future.set_result(peer.public_key)
 
 
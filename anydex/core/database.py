@@ -1,6 +1,7 @@
 """
 This file contains everything related to persistence for the market community.
 """
+from collections import defaultdict
 from os import path
 
 from ipv8.attestation.trustchain.database import TrustChainDB
@@ -10,14 +11,14 @@ from anydex.core.message import TraderId
 from anydex.core.order import Order, OrderId, OrderNumber
 from anydex.core.payment import Payment
 from anydex.core.tick import Tick
-from anydex.core.transaction import Transaction, TransactionId
+from anydex.core.transaction import Transaction
 
 
 DATABASE_DIRECTORY = path.join(u"sqlite")
 # Path to the database location + dispersy._workingdirectory
 DATABASE_PATH = path.join(DATABASE_DIRECTORY, u"market.db")
 # Version to keep track if the db schema needs to be updated.
-LATEST_DB_VERSION = 5
+LATEST_DB_VERSION = 6
 # Schema for the Market DB.
 schema = u"""
 CREATE TABLE IF NOT EXISTS orders(
@@ -75,6 +76,8 @@ CREATE TABLE IF NOT EXISTS orders(
   PRIMARY KEY (trader_id, payment_id, transaction_id)
  );
 
+ CREATE INDEX IF NOT EXISTS payments_transaction_id ON payments(transaction_id);
+
  CREATE TABLE IF NOT EXISTS ticks(
   trader_id            TEXT NOT NULL,
   order_number         INTEGER NOT NULL,
@@ -106,11 +109,42 @@ INSERT OR REPLACE INTO option(key, value) VALUES('database_version', '""" + str(
 """
 
 
+MAX_QUERY_PARAMETERS = 500  # The maximum number of parameters in a single query, SQLite allows at most 999
+
+
+def get_blocks_with_hashes(persistence, block_hashes):
+    """
+    Fetch the blocks with the given hashes from a TrustChain database, with one query per MAX_QUERY_PARAMETERS hashes.
+
+    :param persistence: The TrustChain database
+    :param block_hashes: The hashes of the blocks to fetch
+    :type persistence: TrustChainDB
+    :type block_hashes: list
+    :return: A dictionary of block hash -> block, of the blocks that have been found
+    :rtype: dict
+    """
+    blocks = {}
+    for start in range(0, len(block_hashes), MAX_QUERY_PARAMETERS):
+        chunk = block_hashes[start:start + MAX_QUERY_PARAMETERS]
+        query = persistence.get_sql_header() + u"WHERE block_hash IN (%s)" % ",".join("?" * len(chunk))
+        for db_item in persistence.execute(query, tuple(database_blob(block_hash) for block_hash in chunk),
+                                           fetch_all=True):
+            block_type = db_item[0] if isinstance(db_item[0], bytes) else str(db_item[0]).encode('utf-8')
+            block = persistence.get_block_class(block_type)(db_item)
+            blocks[block.hash] = block
+    return blocks
+
+
 class MarketDB(TrustChainDB):
     """
     Persistence layer for the Market Community.
     Connection layer to SQLiteDB.
     Ensures a proper DB schema on startup.
+
+    The add methods insert a row or update the existing row with the same primary key, and commit afterwards. Writes
+    that belong together can be grouped in a single transaction by performing them in a `with database:` block, which
+    defers all commits to the end of the block. The database runs in WAL mode with synchronous set to NORMAL (as set up
+    by the IPv8 Database class), so commits do not wait for the disk until a checkpoint.
     """
 
     def get_schema(self):
@@ -123,9 +157,14 @@ class MarketDB(TrustChainDB):
         """
         Return all orders in the database.
         """
+        reserved_ticks = defaultdict(list)
+        for data in self.execute(u"SELECT * FROM orders_reserved_ticks"):
+            reserved_ticks[(bytes(data[0]), data[1])].append((OrderId(TraderId(bytes(data[2])),
+                                                                      OrderNumber(data[3])), data[4]))
+
         db_result = self.execute(u"SELECT * FROM orders")
-        return [Order.from_database(db_item, self.get_reserved_ticks(
-            OrderId(TraderId(bytes(db_item[0])), OrderNumber(db_item[1])))) for db_item in db_result]
+        return [Order.from_database(db_item, reserved_ticks.get((bytes(db_item[0]), db_item[1]), []))
+                for db_item in db_result]
 
     def get_order(self, order_id):
         """
@@ -141,18 +180,29 @@ class MarketDB(TrustChainDB):
 
     def add_order(self, order):
         """
-        Add a specific order to the database
+        Add a specific order to the database, or update it if it already exists
         """
         self.execute(
             u"INSERT INTO orders (trader_id, order_number, asset1_amount, asset1_type, asset2_amount, asset2_type,"
             u"traded_quantity, received_quantity, timeout, order_timestamp, completed_timestamp, is_ask, cancelled,"
-            u"verified) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            u"verified) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?) "
+            u"ON CONFLICT(trader_id, order_number) DO UPDATE SET asset1_amount = excluded.asset1_amount, "
+            u"asset1_type = excluded.asset1_type, asset2_amount = excluded.asset2_amount, "
+            u"asset2_type = excluded.asset2_type, traded_quantity = excluded.traded_quantity, "
+            u"received_quantity = excluded.received_quantity, timeout = excluded.timeout, "
+            u"order_timestamp = excluded.order_timestamp, completed_timestamp = excluded.completed_timestamp, "
+            u"is_ask = excluded.is_ask, cancelled = excluded.cancelled, verified = excluded.verified",
             order.to_database())
-        self.commit()
 
-        # Add reserved ticks
-        for reserved_order_id, quantity in order.reserved_ticks.items():
-            self.add_reserved_tick(order.order_id, reserved_order_id, quantity)
+        # Replace the reserved ticks
+        self.delete_reserved_ticks(order.order_id)
+        self.executemany(
+            u"INSERT INTO orders_reserved_ticks (trader_id, order_number, reserved_trader_id, reserved_order_number,"
+            u"quantity) VALUES(?,?,?,?,?)",
+            [(database_blob(bytes(order.order_id.trader_id)), str(order.order_id.order_number),
+              database_blob(bytes(reserved_order_id.trader_id)), str(reserved_order_id.order_number), quantity)
+             for reserved_order_id, quantity in order.reserved_ticks.items()])
+        self.commit()
 
     def delete_order(self, order_id):
         """
@@ -201,10 +251,12 @@ class MarketDB(TrustChainDB):
         """
         Return all transactions in the database.
         """
+        payments = defaultdict(list)
+        for db_item in self.execute(u"SELECT * FROM payments ORDER BY timestamp ASC"):
+            payments[bytes(db_item[1])].append(Payment.from_database(db_item))
+
         db_result = self.execute(u"SELECT * FROM transactions")
-        return [Transaction.from_database(db_item,
-                                          self.get_payments(TransactionId(db_item[1])))
-                for db_item in db_result]
+        return [Transaction.from_database(db_item, payments.get(bytes(db_item[1]), [])) for db_item in db_result]
 
     def get_transaction(self, transaction_id):
         """
@@ -219,44 +271,49 @@ class MarketDB(TrustChainDB):
 
     def add_transaction(self, transaction):
         """
-        Add a specific transaction to the database
+        Add a specific transaction to the database, or update it if it already exists
         """
         self.execute(
             u"INSERT INTO transactions (trader_id, transaction_id, order_number,"
             u"partner_trader_id, partner_order_number, asset1_amount, asset1_type, asset1_transferred, asset2_amount,"
             u"asset2_type, asset2_transferred, transaction_timestamp, sent_wallet_info, received_wallet_info,"
             u"incoming_address, outgoing_address, partner_incoming_address, partner_outgoing_address) "
-            u"VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", transaction.to_database())
+            u"VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?) "
+            u"ON CONFLICT(transaction_id) DO UPDATE SET trader_id = excluded.trader_id, "
+            u"order_number = excluded.order_number, partner_trader_id = excluded.partner_trader_id, "
+            u"partner_order_number = excluded.partner_order_number, asset1_amount = excluded.asset1_amount, "
+            u"asset1_type = excluded.asset1_type, asset1_transferred = excluded.asset1_transferred, "
+            u"asset2_amount = excluded.asset2_amount, asset2_type = excluded.asset2_type, "
+            u"asset2_transferred = excluded.asset2_transferred, "
+            u"transaction_timestamp = excluded.transaction_timestamp, sent_wallet_info = excluded.sent_wallet_info, "
+            u"received_wallet_info = excluded.received_wallet_info, incoming_address = excluded.incoming_address, "
+            u"outgoing_address = excluded.outgoing_address, "
+            u"partner_incoming_address = excluded.partner_incoming_address, "
+            u"partner_outgoing_address = excluded.partner_outgoing_address", transaction.to_database())
+
+        # Payments are never changed once they are made, so we only have to insert the new ones
+        self.executemany(
+            u"INSERT INTO payments (trader_id, transaction_id, payment_id,"
+            u"transferred_amount, transferred_type, address_from, address_to, timestamp) VALUES(?,?,?,?,?,?,?,?) "
+            u"ON CONFLICT DO NOTHING", [payment.to_database() for payment in transaction.payments])
         self.commit()
 
-        self.delete_payments(transaction.transaction_id)
-        for payment in transaction.payments:
-            self.add_payment(payment)
-
     def insert_or_update_transaction(self, transaction):
         """
         Inserts or updates a specific transaction in the database, according to the timestamp.
         Updates only if the timestamp is more recent than the one in the database.
         """
         self.execute(
-            u"INSERT OR IGNORE INTO transactions (trader_id, transaction_id, order_number,"
+            u"INSERT INTO transactions (trader_id, transaction_id, order_number,"
             u"partner_trader_id, partner_order_number, asset1_amount, asset1_type, asset1_transferred, asset2_amount,"
             u"asset2_type, asset2_transferred, transaction_timestamp, sent_wallet_info, received_wallet_info,"
             u"incoming_address, outgoing_address, partner_incoming_address, partner_outgoing_address) "
-            u"VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", transaction.to_database())
-
-        self.execute(
-            u"UPDATE transactions SET asset1_amount = ?, asset1_transferred = ?, asset2_amount = ?, "
-            u"asset2_transferred = ?, transaction_timestamp = ? WHERE transaction_id = ?"
-            u"AND transaction_timestamp < ?", (transaction.assets.first.amount,
-                                               transaction.transferred_assets.first.amount,
-                                               transaction.assets.second.amount,
-                                               transaction.transferred_assets.second.amount,
-                                               int(transaction.timestamp),
-                                               database_blob(bytes(transaction.transaction_id)),
-                                               int(transaction.timestamp))
-        )
-
+            u"VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?) "
+            u"ON CONFLICT(transaction_id) DO UPDATE SET asset1_amount = excluded.asset1_amount, "
+            u"asset1_transferred = excluded.asset1_transferred, asset2_amount = excluded.asset2_amount, "
+            u"asset2_transferred = excluded.asset2_transferred, "
+            u"transaction_timestamp = excluded.transaction_timestamp "
+            u"WHERE transactions.transaction_timestamp < excluded.transaction_timestamp", transaction.to_database())
         self.commit()
 
     def delete_transaction(self, transaction_id):
@@ -268,12 +325,12 @@ class MarketDB(TrustChainDB):
 
     def add_payment(self, payment):
         """
-        Add a specific transaction to the database
+        Add a specific payment to the database, if it does not exist yet
         """
         self.execute(
             u"INSERT INTO payments (trader_id, transaction_id, payment_id,"
-            u"transferred_amount, transferred_type, address_from, address_to, timestamp) VALUES(?,?,?,?,?,?,?,?)",
-            payment.to_database())
+            u"transferred_amount, transferred_type, address_from, address_to, timestamp) VALUES(?,?,?,?,?,?,?,?) "
+            u"ON CONFLICT DO NOTHING", payment.to_database())
         self.commit()
 
     def get_payments(self, transaction_id):
@@ -292,12 +349,20 @@ class MarketDB(TrustChainDB):
 
     def add_tick(self, tick):
         """
-        Add a specific tick to the database
+        Add a specific tick to the database, or update it if it already exists
         """
-        self.execute(
+        self.add_ticks([tick])
+
+    def add_ticks(self, ticks):
+        """
+        Add a batch of ticks to the database, or update them if they already exist
+        """
+        self.executemany(
             u"INSERT INTO ticks (trader_id, order_number, asset1_amount, asset1_type, asset2_amount,"
             u"asset2_type, timeout, timestamp, is_ask, traded, block_hash) "
-            u"VALUES(?,?,?,?,?,?,?,?,?,?,?)", tick.to_database())
+            u"VALUES(?,?,?,?,?,?,?,?,?,?,?) "
+            u"ON CONFLICT(trader_id, order_number) DO UPDATE SET traded = excluded.traded, "
+            u"block_hash = excluded.block_hash", (tick.to_database() for tick in ticks))
         self.commit()
 
     def delete_all_ticks(self):
@@ -308,9 +373,9 @@ class MarketDB(TrustChainDB):
 
     def get_ticks(self):
         """
-        Get all ticks present in the database.
+        Get all ticks present in the database, in the order in which they have been added.
         """
-        return [Tick.from_database(db_tick) for db_tick in self.execute(u"SELECT * FROM ticks")]
+        return [Tick.from_database(db_tick) for db_tick in self.execute(u"SELECT * FROM ticks ORDER BY rowid")]
 
     def open(self, initial_statements=True, prepare_visioning=True):
         return super(MarketDB, self).open(initial_statements, prepare_visioning)
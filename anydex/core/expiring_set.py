@@ -0,0 +1,107 @@
+"""
+This module provides a set of which the items expire some time after they have been added.
+"""
+import time
+from collections import deque
+
+
+class ExpiringSet(object):
+    """
+    A set of which the items are removed once they have been in the set for a given lifetime.
+
+    The items are kept in generations, where a generation contains the items added during a period of
+    lifetime / num_generations seconds. A generation is dropped as a whole once its newest item has been in the set for
+    the lifetime, so an item is kept for at least the lifetime and at most one generation longer. Expired generations
+    are dropped when the set is accessed, so this requires no periodic task.
+    """
+
+    def __init__(self, lifetime, num_generations=24, get_time=time.time):
+        """
+        :param lifetime: The minimum time (in seconds) an item is kept in the set after it has last been added
+        :param num_generations: The number of generations in which the items of one lifetime are kept
+        :param get_time: The function that returns the current time
+        :type lifetime: float
+        :type num_generations: int
+        """
+        self.lifetime = lifetime
+        self.num_generations = num_generations
+        self.generation_duration = lifetime / num_generations
+        self.get_time = get_time
+        self._items = {}  # Item -> number of the generation in which it has last been added
+        self._generations = deque()  # Tuples of generation number and the list of items added in it, oldest first
+        self.num_added = 0
+        self.num_expired = 0
+
+    def _get_generation(self):
+        """
+        Drop the generations that have expired, and return the number of the current generation.
+        """
+        generation = int(self.get_time() // self.generation_duration)
+        generations = self._generations
+        while generations and generations[0][0] < generation - self.num_generations:
+            expired_generation, items = generations.popleft()
+            for item in items:
+                if self._items.get(item) == expired_generation:
+                    del self._items[item]
+                    self.num_expired += 1
+        return generation
+
+    def add(self, item):
+        """
+        Add an item to the set, or extend the lifetime of an item that is already in the set.
+        """
+        generation = self._get_generation()
+        item_generation = self._items.get(item)
+        if item_generation == generation:
+            return
+        if item_generation is None:
+            self.num_added += 1
+
+        self._items[item] = generation
+        if not self._generations or self._generations[-1][0] != generation:
+            self._generations.append((generation, []))
+        self._generations[-1][1].append(item)
+
+    def discard(self, item):
+        """
+        Remove an item from the set, if it is in the set.
+        """
+        self._items.pop(item, None)
+
+    def remove(self, item):
+        """
+        Remove an item from the set. Unlike set.remove, this does not raise an error if the item is not in the set,
+        since it may have expired in the meantime.
+        """
+        self.discard(item)
+
+    def clear(self):
+        self._items.clear()
+        self._generations.clear()
+
+    def __contains__(self, item):
+        self._get_generation()
+        return item in self._items
+
+    def __len__(self):
+        self._get_generation()
+        return len(self._items)
+
+    def __iter__(self):
+        self._get_generation()
+        return iter(list(self._items))
+
+    def get_stats(self):
+        """
+        Return statistics about the memory use of this set.
+
+        :return: A dictionary with the number of items in the set, the number of generations, the number of items that
+                 have been added over the lifetime of the set and the number of those that have expired
+        :rtype: dict
+        """
+        return {
+            "size": len(self),
+            "generations": len(self._generations),
+            "added": self.num_added,
+            "expired": self.num_expired
+        }
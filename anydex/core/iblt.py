@@ -0,0 +1,279 @@
+"""
+This module provides an invertible Bloom lookup table (IBLT), which is used to reconcile the order books of two
+matchmakers.
+
+Every key is hashed to one cell in each of NUM_HASHES subtables, and every cell holds the number of keys hashed to it,
+the XOR of these keys and the XOR of their checksums. By subtracting the table of one set from the table of another
+set, the keys that are in both sets cancel out. The remaining keys, i.e., the symmetric difference of the two sets,
+can be listed as long as the difference is not much larger than the number of cells, independent of the size of the
+sets themselves.
+
+The keys are 64-bit fingerprints of order ids. Since both the cells and the positions of a key in the table only
+depend on the fingerprint, a table with subtables of size n can be folded into a table with subtables of size n / 2
+by adding the two halves of every subtable. This allows keeping a single large table up to date, and sending a smaller
+one when the expected difference is small. A difference that is too large for a table in a single packet is split
+over several tables, each of the keys in one partition of the key space, which can be decoded independently.
+
+The size of the difference is estimated with a strata estimator, which holds a small table for every stratum of the
+keys. Stratum i holds the keys with i leading zero bits, which is a fraction of 2 ** -(i + 1) of the keys, and the few
+keys with more leading zero bits than there are strata are left out. The strata of the difference are decoded from
+the smallest stratum on, and once a stratum cannot be decoded, the number of keys found so far, scaled to the fraction
+of the keys in these strata, estimates the difference.
+"""
+from hashlib import sha256
+from struct import Struct
+
+NUM_HASHES = 3
+CELL_STRUCT = Struct(">iQI")
+MAX_COUNT = 2 ** 20  # The largest count of a cell in a table of a set of keys that we accept from other peers
+NUM_STRATA = 11  # The number of strata of a strata estimator
+STRATUM_SIZE = 2  # The size of the subtables of the table of every stratum
+
+
+def get_key(item):
+    """
+    Return the 64-bit key of an item, e.g., of the bytes of an order id.
+
+    :type item: bytes
+    :rtype: int
+    """
+    return int.from_bytes(sha256(item).digest()[:8], "big")
+
+
+def get_key_hashes(key):
+    """
+    Return the checksum of a key and the hashes from which its position in every subtable is derived.
+
+    :type key: int
+    :return: A tuple with the checksum and a tuple with NUM_HASHES hashes
+    """
+    digest = sha256(key.to_bytes(8, "big")).digest()
+    return int.from_bytes(digest[:4], "big"), tuple(int.from_bytes(digest[4 * i + 4:4 * i + 8], "big")
+                                                    for i in range(NUM_HASHES))
+
+
+def get_partition(key, partition_count):
+    """
+    Return the partition of the key space that a key belongs to, when the key space is split into equal parts.
+
+    :type key: int
+    :type partition_count: int
+    :rtype: int
+    """
+    return (key * partition_count) >> 64
+
+
+def get_stratum(key):
+    """
+    Return the stratum of a key in a strata estimator, which is NUM_STRATA or larger for keys that are left out.
+
+    :type key: int
+    :rtype: int
+    """
+    return 64 - key.bit_length()
+
+
+class IBLT(object):
+    """
+    An invertible Bloom lookup table of 64-bit keys.
+    """
+
+    def __init__(self, size, cells=None):
+        """
+        :param size: The number of cells in each subtable, which should be a power of two
+        :param cells: The cells of the table, as (count, key sum, checksum sum) tuples
+        :type size: int
+        """
+        assert size > 0 and size & (size - 1) == 0, "size must be a power of two (%d)" % size
+        self.size = size
+        if cells is None:
+            self.counts = [0] * (size * NUM_HASHES)
+            self.key_sums = [0] * (size * NUM_HASHES)
+            self.check_sums = [0] * (size * NUM_HASHES)
+        else:
+            assert len(cells) == size * NUM_HASHES, len(cells)
+            self.counts = [cell[0] for cell in cells]
+            self.key_sums = [cell[1] for cell in cells]
+            self.check_sums = [cell[2] for cell in cells]
+
+    def _get_cells(self, hashes):
+        size = self.size
+        return [i * size + hashes[i] % size for i in range(NUM_HASHES)]
+
+    def update(self, key, sign, key_hashes=None):
+        """
+        Add a key to the table (sign 1), or remove it from the table (sign -1).
+
+        :param key_hashes: The result of get_key_hashes(key), if it is already known
+        :type key: int
+        :type sign: int
+        """
+        check, hashes = key_hashes or get_key_hashes(key)
+        for cell in self._get_cells(hashes):
+            self.counts[cell] += sign
+            self.key_sums[cell] ^= key
+            self.check_sums[cell] ^= check
+
+    def insert(self, key, key_hashes=None):
+        self.update(key, 1, key_hashes)
+
+    def remove(self, key, key_hashes=None):
+        self.update(key, -1, key_hashes)
+
+    def add(self, other):
+        """
+        Add the keys in another table of the same size to this table.
+
+        :type other: IBLT
+        """
+        assert self.size == other.size
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.key_sums = [key_sum ^ other_sum for key_sum, other_sum in zip(self.key_sums, other.key_sums)]
+        self.check_sums = [check_sum ^ other_sum for check_sum, other_sum in zip(self.check_sums, other.check_sums)]
+
+    def fold(self, size):
+        """
+        Return a copy of this table with smaller subtables.
+
+        :param size: The number of cells in each subtable of the copy, a power of two not larger than self.size
+        :rtype: IBLT
+        """
+        assert size <= self.size
+        folded = IBLT(size)
+        for index in range(self.size * NUM_HASHES):
+            subtable, offset = divmod(index, self.size)
+            cell = subtable * size + offset % size
+            folded.counts[cell] += self.counts[index]
+            folded.key_sums[cell] ^= self.key_sums[index]
+            folded.check_sums[cell] ^= self.check_sums[index]
+        return folded
+
+    def subtract(self, other):
+        """
+        Return the table of the keys in this table minus the keys in the other table.
+
+        :type other: IBLT
+        :rtype: IBLT
+        """
+        assert self.size == other.size
+        difference = IBLT(self.size)
+        difference.counts = [count - other_count for count, other_count in zip(self.counts, other.counts)]
+        difference.key_sums = [key_sum ^ other_sum for key_sum, other_sum in zip(self.key_sums, other.key_sums)]
+        difference.check_sums = [check_sum ^ other_sum
+                                 for check_sum, other_sum in zip(self.check_sums, other.check_sums)]
+        return difference
+
+    def decode(self):
+        """
+        List the keys in a table obtained with subtract. This empties the table.
+
+        :return: A tuple with the set of keys that were only in this table and the set of keys that were only in the
+                 other table, or None if the difference is too large to be listed with this table.
+        """
+        counts, key_sums, check_sums = self.counts, self.key_sums, self.check_sums
+        added, removed = set(), set()
+        pending = list(range(len(counts)))
+        # Every cell is visited once, and again for every key that is peeled from it. A table that is subtracted from
+        # a valid one cannot yield more keys than it has cells, so a crafted table cannot keep us peeling forever.
+        max_iterations = len(counts) * (NUM_HASHES + 1)
+        iterations = 0
+        while pending:
+            iterations += 1
+            if iterations > max_iterations:
+                return None
+            cell = pending.pop()
+            count = counts[cell]
+            if count not in (1, -1):
+                continue
+            key = key_sums[cell]
+            key_hashes = get_key_hashes(key)
+            if key_hashes[0] != check_sums[cell]:
+                continue
+            if key in added or key in removed:
+                return None
+
+            (added if count == 1 else removed).add(key)
+            self.update(key, -count, key_hashes)
+            pending += self._get_cells(key_hashes[1])
+
+        if any(counts) or any(key_sums) or any(check_sums):
+            return None
+        return added, removed
+
+    def to_bytes(self):
+        pack = CELL_STRUCT.pack
+        return b"".join(pack(*cell) for cell in zip(self.counts, self.key_sums, self.check_sums))
+
+    @classmethod
+    def from_bytes(cls, size, data, max_count=MAX_COUNT):
+        """
+        Restore a table of a set of keys that has been serialised with to_bytes.
+
+        :param max_count: The largest number of keys that may have been hashed to a single cell
+        :rtype: IBLT
+        """
+        if size <= 0 or size & (size - 1) or len(data) != size * NUM_HASHES * CELL_STRUCT.size:
+            raise ValueError("invalid table of size %d with %d bytes" % (size, len(data)))
+        cells = list(CELL_STRUCT.iter_unpack(data))
+        for count, key_sum, check_sum in cells:
+            # The cells of a set cannot have a negative count, and are empty if their count is zero
+            if count < 0 or count > max_count or (count == 0 and (key_sum or check_sum)):
+                raise ValueError("invalid cell with count %d" % count)
+        return IBLT(size, cells)
+
+
+class StrataEstimator(object):
+    """
+    Estimates the size of the symmetric difference of two sets of 64-bit keys.
+    """
+
+    def __init__(self, tables=None):
+        """
+        :param tables: The table of every stratum
+        :type tables: [IBLT]
+        """
+        self.tables = tables or [IBLT(STRATUM_SIZE) for _ in range(NUM_STRATA)]
+
+    def insert(self, key, key_hashes=None):
+        stratum = get_stratum(key)
+        if stratum < NUM_STRATA:
+            self.tables[stratum].insert(key, key_hashes)
+
+    def remove(self, key, key_hashes=None):
+        stratum = get_stratum(key)
+        if stratum < NUM_STRATA:
+            self.tables[stratum].remove(key, key_hashes)
+
+    def estimate_difference(self, other):
+        """
+        Estimate the size of the symmetric difference of the keys in this estimator and the keys in another one.
+
+        :type other: StrataEstimator
+        :return: The estimated size of the difference, or None if even the smallest stratum cannot be decoded
+        :rtype: int
+        """
+        found = 0
+        for stratum in reversed(range(NUM_STRATA)):
+            difference = self.tables[stratum].subtract(other.tables[stratum]).decode()
+            if difference is None:
+                if stratum == NUM_STRATA - 1:
+                    return None
+                return int(round(found / (2 ** -(stratum + 1) - 2 ** -NUM_STRATA)))
+            found += len(difference[0]) + len(difference[1])
+        return found
+
+    def to_bytes(self):
+        return b"".join(table.to_bytes() for table in self.tables)
+
+    @classmethod
+    def from_bytes(cls, data, max_count=MAX_COUNT):
+        """
+        Restore an estimator of a set of keys that has been serialised with to_bytes.
+
+        :rtype: StrataEstimator
+        """
+        table_length = len(data) // NUM_STRATA
+        if table_length * NUM_STRATA != len(data):
+            raise ValueError("invalid strata estimator with %d bytes" % len(data))
+        return StrataEstimator([IBLT.from_bytes(STRATUM_SIZE, data[index:index + table_length], max_count)
+                                for index in range(0, len(data), table_length)])
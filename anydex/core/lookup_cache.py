@@ -0,0 +1,150 @@
+"""
+This module provides a bounded cache for the results of lookups over the network, such as the address or public key
+of a trader.
+"""
+import time
+from asyncio import ensure_future, shield
+from collections import OrderedDict
+
+from ipv8.util import succeed
+
+
+class LookupCache(object):
+    """
+    A cache of lookup results with a time to live, of which the least recently used entry is evicted when it is full.
+
+    Failed lookups, i.e., lookups that resulted in None, are cached as well, with a shorter time to live. This prevents
+    looking up a trader that cannot be found again for every message that is sent to it. Concurrent lookups of the same
+    key are collapsed into a single lookup, of which the result is shared.
+    """
+
+    def __init__(self, capacity, ttl, negative_ttl, get_time=time.time):
+        """
+        :param capacity: The maximum number of entries in the cache
+        :param ttl: How long (in seconds) a lookup result is kept
+        :param negative_ttl: How long (in seconds) a failed lookup is remembered
+        :param get_time: The function that returns the current time
+        :type capacity: int
+        :type ttl: float
+        :type negative_ttl: float
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.get_time = get_time
+        self._entries = OrderedDict()  # Key -> (value, expiration time), from least to most recently used
+        self._pending = {}  # Key -> Task of the lookup in progress
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _get_entry(self, key):
+        """
+        Return the (value, expiration time) tuple of a key that has not expired, or None.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= self.get_time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key, default=None, refresh=False):
+        """
+        Return the cached value of a key, or the default value if it is not cached or if its lookup failed.
+
+        :param refresh: Whether the time to live of a cached value is restarted, for values that are still in use
+        """
+        entry = self._get_entry(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[0] is None:
+            self.negative_hits += 1
+            return default
+        self.hits += 1
+        if refresh:
+            self._entries[key] = (entry[0], self.get_time() + self.ttl)
+        return entry[0]
+
+    def put(self, key, value):
+        """
+        Cache the value of a key. A value of None marks the lookup of the key as failed.
+        """
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self._entries[key] = (value, self.get_time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def __contains__(self, key):
+        entry = self._get_entry(key)
+        return entry is not None and entry[0] is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None and entry[0] is not None else default
+
+    def clear(self):
+        self._entries.clear()
+
+    def lookup(self, key, lookup_func):
+        """
+        Return the cached value of a key, or look it up if it is not cached. If a lookup of the key is already in
+        progress, its result is awaited instead of starting another lookup.
+
+        :param lookup_func: A function that returns an awaitable of the value of the key, or of None if it was not found
+        :return: An awaitable of the value of the key, or of None if it could not be found
+        """
+        entry = self._get_entry(key)
+        if entry is not None:
+            if entry[0] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return succeed(entry[0])
+
+        if key in self._pending:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            self._pending[key] = ensure_future(self._lookup(key, lookup_func))
+        # Shield the shared lookup, so cancelling one caller does not cancel the lookup for the others
+        return shield(self._pending[key])
+
+    async def _lookup(self, key, lookup_func):
+        try:
+            value = await lookup_func()
+        finally:
+            self._pending.pop(key, None)
+        if value is not None or key not in self:  # The value may have been cached while the lookup was in progress
+            self.put(key, value)
+        return value
+
+    def get_stats(self):
+        """
+        Return the size and the hit and miss counts of this cache.
+
+        :rtype: dict
+        """
+        return {
+            "size": len(self._entries),
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions
+        }
@@ -1,50 +1,105 @@
-from functools import cmp_to_key
+from heapq import heapify, heappop, heappush
+from itertools import count
+
+
+class MatchEntry(object):
+    """
+    An entry in the match priority queue. Entries are ordered on the number of retries first, and on price second,
+    where the prices are compared by cross-multiplying their reduced numerators and denominators.
+    """
+    __slots__ = ('retries', 'price', 'sequence', 'order_id', 'prefer_high', 'removed')
+
+    def __init__(self, retries, price, sequence, order_id, prefer_high):
+        self.retries = retries
+        self.price = price
+        self.sequence = sequence
+        self.order_id = order_id
+        self.prefer_high = prefer_high
+        self.removed = False
+
+    def __lt__(self, other):
+        if self.retries != other.retries:
+            return self.retries < other.retries
+        left = self.price.num * other.price.denom
+        right = other.price.num * self.price.denom
+        if left != right:
+            return left > right if self.prefer_high else left < right
+        return self.sequence < other.sequence
 
 
 class MatchPriorityQueue(object):
     """
     This priority queue keeps track of incoming match message for a specific order.
+
+    Entries are prioritized on the number of retries first, and on price second: an ask order prefers the highest
+    price, a bid order the lowest one. Entries with the same priority are handed out in insertion order. The entries
+    are kept in a binary heap, and indexed on order id so that checking for and removing the entries of an order does
+    not require a scan of the queue. Removed entries are only marked as such and skipped when they reach the top.
     """
     def __init__(self, order):
         self.order = order
-        self.queue = []
+        self.queue = []  # Heap of MatchEntry objects
+        self._entries = {}  # Dict of OrderId -> list of entries of the order that may still be in the heap
+        self._num_entries = {}  # Dict of OrderId -> number of entries of the order in the heap that are not removed
+        self._num_removed = 0
+        self._sequence = count()
 
     def __str__(self):
-        return ' '.join([str(i) for i in self.queue])
+        return ' '.join([str(i) for i in self.items()])
+
+    def __len__(self):
+        return len(self.queue) - self._num_removed
+
+    def items(self):
+        """
+        Return the entries in the queue, in the order in which they are handed out.
+
+        :return: A list of (retries, price, order_id) tuples
+        """
+        return [(entry.retries, entry.price, entry.order_id) for entry in sorted(self.queue) if not entry.removed]
 
     def is_empty(self):
-        return len(self.queue) == []
+        return len(self) == 0
 
     def contains_order(self, order_id):
-        for _, _, other_order_id in self.queue:
-            if other_order_id == order_id:
-                return True
-        return False
+        return order_id in self._num_entries
 
     def insert(self, retries, price, order_id):
-        self.queue.append((retries, price, order_id))
+        entry = MatchEntry(retries, price, next(self._sequence), order_id, self.order.is_ask())
+        heappush(self.queue, entry)
+        self._entries.setdefault(order_id, []).append(entry)
+        self._num_entries[order_id] = self._num_entries.get(order_id, 0) + 1
 
-        def cmp_items(tup1, tup2):
-            if tup1[0] < tup2[0]:
-                return -1
-            elif tup1[0] > tup2[0]:
-                return 1
+    def delete(self):
+        while self.queue:
+            entry = heappop(self.queue)
+            if entry.removed:
+                self._num_removed -= 1
+                continue
+
+            # The entry stays in the index of its order until the order has no entries left, but is marked as removed
+            # so that remove_order does not count it again.
+            entry.removed = True
+            num_entries = self._num_entries[entry.order_id] - 1
+            if num_entries:
+                self._num_entries[entry.order_id] = num_entries
             else:
-                if self.order.is_ask():
-                    if tup1[1] < tup2[1]:
-                        return 1
-                    else:
-                        return -1
-                else:
-                    if tup1[1] < tup2[1]:
-                        return -1
-                    else:
-                        return 1
-
-        self.queue = sorted(self.queue, key=cmp_to_key(cmp_items))
+                del self._num_entries[entry.order_id]
+                del self._entries[entry.order_id]
+            return entry.retries, entry.price, entry.order_id
+        return None
 
-    def delete(self):
-        if not self.queue:
-            return None
+    def remove_order(self, order_id):
+        """
+        Remove all entries with the given order id from the queue.
+        """
+        self._num_entries.pop(order_id, None)
+        for entry in self._entries.pop(order_id, []):
+            if not entry.removed:
+                entry.removed = True
+                self._num_removed += 1
 
-        return self.queue.pop(0)
+        if self._num_removed > len(self.queue) // 2:
+            self.queue = [entry for entry in self.queue if not entry.removed]
+            heapify(self.queue)
+            self._num_removed = 0
@@ -18,16 +18,18 @@ class MatchingStrategy(object):
         self.order_book = order_book
 
     @abstractmethod
-    def match(self, order_id, price, quantity, is_ask):
+    def match(self, order_id, price, quantity, is_ask, exclude=None):
         """
         :param order_id: The order id of the tick to match
         :param price: The price to match against
         :param quantity: The quantity that should be matched
         :param is_ask: Whether the object we want to match is an ask
+        :param exclude: An optional function that returns whether a tick entry should be skipped
         :type order_id: OrderId
         :type price: Price
         :type quantity: Quantity
         :type is_ask: Bool
+        :type exclude: function
         :return: A list of tuples containing the ticks and the matched quantity
         :rtype: [(str, TickEntry)]
         """
@@ -37,16 +39,18 @@ class MatchingStrategy(object):
 class PriceTimeStrategy(MatchingStrategy):
     """Strategy that uses the price time method for picking ticks"""
 
-    def match(self, order_id, price, quantity, is_ask):
+    def match(self, order_id, price, quantity, is_ask, exclude=None):
         """
         :param order_id: The order id of the tick to match
         :param price: The price to match against
         :param quantity: The quantity that should be matched
         :param is_ask: Whether the object we want to match is an ask
+        :param exclude: An optional function that returns whether a tick entry should be skipped
         :type order_id: OrderId
         :type price: Price
         :type quantity: int
         :type is_ask: Bool
+        :type exclude: function
         :return: A list of tuples containing the ticks and the matched quantity
         :rtype: [(str, TickEntry, Quantity)]
         """
@@ -77,15 +81,14 @@ class PriceTimeStrategy(MatchingStrategy):
 
         # We now start to iterate through price levels and tick entries and match on the fly
         while cur_tick_entry and quantity_to_match > 0:
-            if cur_tick_entry.is_blocked_for_matching(order_id) or \
-                            order_id.trader_id == cur_tick_entry.order_id.trader_id:
-                cur_tick_entry = cur_tick_entry.next_tick
-                continue
-
-            quantity_matched = min(quantity_to_match, cur_tick_entry.available_for_matching)
-            if quantity_matched > 0:
-                matched_ticks.append(cur_tick_entry)
-                quantity_to_match -= quantity_matched
+            # Skipped tick entries do not stop the search at the end of their price level
+            if not cur_tick_entry.is_blocked_for_matching(order_id) and \
+                    order_id.trader_id != cur_tick_entry.order_id.trader_id and \
+                    not (exclude and exclude(cur_tick_entry)):
+                quantity_matched = min(quantity_to_match, cur_tick_entry.available_for_matching)
+                if quantity_matched > 0:
+                    matched_ticks.append(cur_tick_entry)
+                    quantity_to_match -= quantity_matched
 
             cur_tick_entry = cur_tick_entry.next_tick
             if not cur_tick_entry:
@@ -141,3 +144,41 @@ class MatchingEngine(object):
         diff = time() - now
         self._logger.debug("Matching engine completed in %.2f seconds", diff)
         return matched_ticks
+
+    def match_batch(self, tick_entries):
+        """
+        Match a batch of tick entries, for instance all ticks that have been received in one iteration of the event
+        loop. The tick entries are matched as if they were matched one after another while being inserted in the
+        order book: a tick entry is not matched with the tick entries that come after it in the batch, since these
+        will find it when it is their turn. These tick entries are skipped during the search, so they do not use up
+        the quantity of the tick entry that is matched. Duplicate tick entries are only matched once.
+
+        :param tick_entries: The TickEntries that should be matched, in the order in which they should be matched
+        :type tick_entries: [TickEntry]
+        :return: A list of tuples containing a tick entry and the ticks it matched with
+        :rtype: [(TickEntry, [TickEntry])]
+        """
+        now = time()
+
+        batch_positions = {}  # Dict of OrderId -> position of the tick entry in the batch
+        for position, tick_entry in enumerate(tick_entries):
+            batch_positions.setdefault(tick_entry.order_id, position)
+
+        matches = []
+
+        for position, tick_entry in enumerate(tick_entries):
+            if batch_positions[tick_entry.order_id] != position or tick_entry.available_for_matching <= 0:
+                continue
+
+            def comes_later(other_tick_entry, position=position):
+                return batch_positions.get(other_tick_entry.order_id, position) > position
+
+            matched_ticks = self.matching_strategy.match(tick_entry.order_id, tick_entry.price,
+                                                         tick_entry.available_for_matching, tick_entry.tick.is_ask(),
+                                                         comes_later)
+            if matched_ticks:
+                matches.append((tick_entry, matched_ticks))
+
+        diff = time() - now
+        self._logger.debug("Matching engine completed batch of %d ticks in %.2f seconds", len(tick_entries), diff)
+        return matches
@@ -0,0 +1,92 @@
+from bisect import bisect_left, bisect_right
+
+
+class OpenOrderIndex(object):
+    """
+    In-memory index of the open (valid) orders of this node.
+
+    The orders are indexed per asset pair and side, and ordered on price. This allows to quickly find the orders that
+    can be crossed by an incoming tick, without going through all orders in the order repository.
+    """
+
+    def __init__(self):
+        super(OpenOrderIndex, self).__init__()
+        self._prices = {}  # Dict of (price_type, asset_type, is_ask) -> sorted list of Price
+        self._orders = {}  # Dict of (price_type, asset_type, is_ask) -> list of Order, in the same order as _prices
+        self._keys = {}  # Dict of OrderId -> (price_type, asset_type, is_ask)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, order_id):
+        return order_id in self._keys
+
+    def update(self, order):
+        """
+        Add the order to the index if it is valid, and remove it otherwise.
+
+        :type order: Order
+        """
+        self.remove(order.order_id)
+        if not order.is_valid():
+            return
+
+        price = order.price
+        key = (price.num_type, price.denom_type, order.is_ask())
+        prices = self._prices.setdefault(key, [])
+        index = bisect_right(prices, price)
+        prices.insert(index, price)
+        self._orders.setdefault(key, []).insert(index, order)
+        self._keys[order.order_id] = key
+
+    def remove(self, order_id):
+        """
+        Remove the order with the given order id from the index, if it is indexed.
+
+        :type order_id: OrderId
+        """
+        key = self._keys.pop(order_id, None)
+        if key is None:
+            return
+
+        orders = self._orders[key]
+        for index, order in enumerate(orders):
+            if order.order_id == order_id:
+                del orders[index]
+                del self._prices[key][index]
+                break
+
+        if not orders:
+            del self._orders[key]
+            del self._prices[key]
+
+    def find_crossing(self, price, is_ask):
+        """
+        Return the valid orders that can be crossed by a tick with the given price and side, i.e., the bids with a
+        price that is at least the price of an ask, or the asks with a price that is at most the price of a bid.
+        Orders that have timed out since they were indexed are removed from the index.
+
+        :param price: The price of the tick
+        :param is_ask: Whether the tick is an ask
+        :type price: Price
+        :type is_ask: bool
+        :return: The orders that can be crossed by the tick
+        :rtype: [Order]
+        """
+        key = (price.num_type, price.denom_type, not is_ask)
+        prices = self._prices.get(key)
+        if not prices:
+            return []
+
+        if is_ask:
+            crossing_orders = self._orders[key][bisect_left(prices, price):]
+        else:
+            crossing_orders = self._orders[key][:bisect_right(prices, price)]
+
+        valid_orders = []
+        for order in crossing_orders:
+            if order.is_valid():
+                valid_orders.append(order)
+            else:
+                self.remove(order.order_id)
+        return valid_orders
@@ -2,7 +2,9 @@ import logging
 from abc import ABCMeta, abstractmethod
 
 from anydex.core.message import TraderId
+from anydex.core.open_order_index import OpenOrderIndex
 from anydex.core.order import OrderId, OrderNumber
+from anydex.util.asyncio import call_later
 
 
 class OrderRepository(object):
@@ -17,6 +19,7 @@ class OrderRepository(object):
         """
         super(OrderRepository, self).__init__()
         self._logger = logging.getLogger(self.__class__.__name__)
+        self.open_orders = OpenOrderIndex()  # Index of the valid orders in this repository, kept in memory
 
     @abstractmethod
     def find_all(self):
@@ -42,6 +45,12 @@ class OrderRepository(object):
     def next_identity(self):
         return
 
+    def flush(self):
+        """
+        Write all pending changes to the storage backend. Repositories that do not defer writes do not override this.
+        """
+        pass
+
 
 class MemoryOrderRepository(OrderRepository):
     """A repository for orders in the order manager stored in memory"""
@@ -82,6 +91,7 @@ class MemoryOrderRepository(OrderRepository):
         self._logger.debug("Order with the id: " + str(order.order_id) + " was added to the order repository")
 
         self._orders[order.order_id] = order
+        self.open_orders.update(order)
 
     def update(self, order):
         """
@@ -90,6 +100,7 @@ class MemoryOrderRepository(OrderRepository):
         self._logger.debug("Order with the id: " + str(order.order_id) + " was updated to the order repository")
 
         self._orders[order.order_id] = order
+        self.open_orders.update(order)
 
     def delete_by_id(self, order_id):
         """
@@ -98,6 +109,7 @@ class MemoryOrderRepository(OrderRepository):
         self._logger.debug("Order with the id: " + str(order_id) + " was deleted from the order repository")
 
         del self._orders[order_id]
+        self.open_orders.remove(order_id)
 
     def next_identity(self):
         """
@@ -108,7 +120,14 @@ class MemoryOrderRepository(OrderRepository):
 
 
 class DatabaseOrderRepository(OrderRepository):
-    """A repository that stores orders in the database"""
+    """
+    A repository that stores orders in the database.
+
+    All orders are kept in memory, so every order id maps to a single Order object. Changes are not written to the
+    database immediately: the changed orders are marked as dirty, and are written back in a single database transaction
+    after WRITE_BACK_DELAY seconds, or when flush is called.
+    """
+    WRITE_BACK_DELAY = 1  # How long (in seconds) changes are collected before writing them to the database
 
     def __init__(self, mid, persistence):
         """
@@ -117,16 +136,26 @@ class DatabaseOrderRepository(OrderRepository):
         """
         super(DatabaseOrderRepository, self).__init__()
 
-        self._logger.info("Memory order repository used")
+        self._logger.info("Database order repository used")
 
         self._mid = mid
         self.persistence = persistence
 
+        self._orders = {}
+        self._dirty_order_ids = set()
+        self._deleted_order_ids = set()
+        self._write_back_task = None
+
+        for order in self.persistence.get_all_orders():
+            self._orders[order.order_id] = order
+            self.open_orders.update(order)
+        self._next_order_number = self.persistence.get_next_order_number()
+
     def find_all(self):
         """
         :rtype: [Order]
         """
-        return self.persistence.get_all_orders()
+        return self._orders.values()
 
     def find_by_id(self, order_id):
         """
@@ -135,31 +164,73 @@ class DatabaseOrderRepository(OrderRepository):
         :return: The order or null if it cannot be found
         :rtype: Order
         """
-        return self.persistence.get_order(order_id)
+        return self._orders.get(order_id)
 
     def add(self, order):
         """
         :param order: The order to add to the database
         :type order: Order
         """
-        self.persistence.add_order(order)
+        self._orders[order.order_id] = order
+        self.open_orders.update(order)
+        self._deleted_order_ids.discard(order.order_id)
+        self._dirty_order_ids.add(order.order_id)
+        self.schedule_write_back()
 
     def update(self, order):
         """
         :param order: The order to update
         :type order: Order
         """
-        self.delete_by_id(order.order_id)
         self.add(order)
 
     def delete_by_id(self, order_id):
         """
         :param order_id: The id of the order to remove
         """
-        self.persistence.delete_order(order_id)
+        self._orders.pop(order_id, None)
+        self.open_orders.remove(order_id)
+        self._dirty_order_ids.discard(order_id)
+        self._deleted_order_ids.add(order_id)
+        self.schedule_write_back()
 
     def next_identity(self):
         """
         :rtype OrderId
         """
-        return OrderId(TraderId(self._mid), OrderNumber(self.persistence.get_next_order_number()))
+        order_number = self._next_order_number
+        self._next_order_number += 1
+        return OrderId(TraderId(self._mid), OrderNumber(order_number))
+
+    def schedule_write_back(self):
+        """
+        Schedule writing the pending changes to the database, if this is not scheduled yet.
+        """
+        if not self._write_back_task:
+            self._write_back_task = call_later(self.WRITE_BACK_DELAY, self.write_back, ignore_errors=True)
+
+    def write_back(self):
+        self._write_back_task = None
+        self.flush()
+
+    def flush(self):
+        """
+        Write all pending changes to the database, in a single transaction.
+        """
+        if self._write_back_task:
+            self._write_back_task.cancel()
+            self._write_back_task = None
+
+        if not self._dirty_order_ids and not self._deleted_order_ids:
+            return
+
+        self._logger.debug("Writing %d changed and %d deleted orders to the database",
+                           len(self._dirty_order_ids), len(self._deleted_order_ids))
+        with self.persistence:
+            for order_id in self._deleted_order_ids:
+                self.persistence.delete_order(order_id)
+            for order_id in self._dirty_order_ids:
+                self.persistence.add_order(self._orders[order_id])
+            self.persistence.commit()
+        self._dirty_order_ids.clear()
+        self._deleted_order_ids.clear()
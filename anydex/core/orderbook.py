@@ -1,11 +1,21 @@
+import gc
 import logging
 import time
 from binascii import unhexlify
+from contextlib import contextmanager
+from heapq import heapify, heappop, heappush, merge
+from itertools import count
+from math import exp
+from operator import itemgetter
 
 from ipv8.taskmanager import TaskManager
 from ipv8.util import fail
 
+from anydex.core import MAX_ORDER_TIMEOUT
 from anydex.core.assetpair import AssetPair
+from anydex.core.bloomfilter import BloomFilter
+from anydex.core.expiring_set import ExpiringSet
+from anydex.core.iblt import IBLT, StrataEstimator, get_key, get_key_hashes, get_partition
 from anydex.core.message import TraderId
 from anydex.core.order import OrderId, OrderNumber
 from anydex.core.price import Price
@@ -15,11 +25,32 @@ from anydex.core.timeout import Timeout
 from anydex.core.timestamp import Timestamp
 
 
+@contextmanager
+def paused_garbage_collection():
+    """
+    Disable the cyclic garbage collector for the duration of a bulk operation that creates many objects at once.
+    Otherwise, the collector is triggered many times during the operation and every time scans the whole order book.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
 class OrderBook(TaskManager):
     """
     OrderBook is used for searching through all the orders and giving an indication to the user of what other offers
     are out there.
     """
+    BLOCK_FOR_MATCHING_DURATION = 10  # How long (in seconds) an order id is blocked from matching with a tick
+    TIMEOUT_SWEEP_INTERVAL = 1  # How often (in seconds) the order book processes timeouts
+    BLOOMFILTER_ERROR_RATE = 0.005  # The false positive rate of a freshly built Bloom filter of the order ids
+    BLOOMFILTER_MAX_ERROR_RATE = 0.01  # The Bloom filter is rebuilt when its false positive rate exceeds this rate
+    RECONCILIATION_TABLE_SIZE = 16  # The size of the subtables of the largest reconciliation table (fits in a packet)
+    RECONCILIATION_PARTITIONS = 64  # The largest number of partitions over which the reconciliation tables are split
 
     def __init__(self):
         super(OrderBook, self).__init__()
@@ -27,7 +58,28 @@ class OrderBook(TaskManager):
         self._logger = logging.getLogger(self.__class__.__name__)
         self._bids = Side()
         self._asks = Side()
-        self.completed_orders = set()
+        # Order ids of completed orders. No tick of an order is valid after MAX_ORDER_TIMEOUT, so they can be forgotten
+        # after that time.
+        self.completed_orders = ExpiringSet(MAX_ORDER_TIMEOUT)
+
+        # Bloom filter of the order ids in the order book. Inserted ticks are added to it, while removed ticks are only
+        # counted, since they cannot be taken out of the filter.
+        self._bloomfilter = None
+        self._bloomfilter_keys = 0
+        self._bloomfilter_removed_keys = 0
+        # Invertible Bloom lookup tables of the order ids in every partition of the key space, a strata estimator of
+        # the order ids, and the order id of every key in them
+        self._reconciliation_tables = None
+        self._reconciliation_estimator = None
+        self._reconciliation_keys = {}
+
+        # Heap of (expiration time in milliseconds, sequence number, tick). Removed ticks are not deleted from this
+        # heap, but are skipped when they come up.
+        self._expiration_queue = []
+        # Heap of (unblock time, sequence number, tick entry, blocked order id)
+        self._unblock_queue = []
+        self._timeout_sequence = count()
+        self.register_task("process_timeouts", self.process_timeouts, interval=self.TIMEOUT_SWEEP_INTERVAL)
 
     def timeout_ask(self, order_id):
         ask = self.get_ask(order_id).tick
@@ -39,6 +91,203 @@ class OrderBook(TaskManager):
         self.remove_tick(order_id)
         return bid
 
+    def block_for_matching(self, order_id, blocked_order_id):
+        """
+        Temporarily block an order id from matching with the tick with a given order id.
+
+        :param order_id: The order id of the tick in the order book
+        :param blocked_order_id: The order id that should not be matched with this tick
+        :type order_id: OrderId
+        :type blocked_order_id: OrderId
+        """
+        tick_entry = self.get_tick(order_id)
+        if tick_entry and tick_entry.block_for_matching(blocked_order_id):
+            unblock_time = time.time() + self.BLOCK_FOR_MATCHING_DURATION
+            heappush(self._unblock_queue, (unblock_time, next(self._timeout_sequence), tick_entry, blocked_order_id))
+
+    def schedule_expiration(self, tick):
+        """
+        Schedule the removal of a tick from the order book once it times out.
+
+        :type tick: Tick
+        """
+        expiration_time = int(tick.timestamp) + int(tick.timeout) * 1000
+        heappush(self._expiration_queue, (expiration_time, next(self._timeout_sequence), tick))
+
+    def process_timeouts(self):
+        """
+        Process all timeouts that have passed.
+        """
+        now = time.time()
+        now_ms = int(now * 1000)
+        expiration_queue = self._expiration_queue
+        while expiration_queue and expiration_queue[0][0] <= now_ms:
+            _, _, tick = heappop(expiration_queue)
+            if self.contains_tick(tick):
+                self.remove_tick(tick.order_id)
+
+        # Cancelled ticks remain in the expiration queue until they time out, so we compact it if it mostly contains
+        # ticks that are no longer in the order book.
+        if len(expiration_queue) > 2 * (len(self._asks) + len(self._bids)) + 1000:
+            self._expiration_queue = [entry for entry in expiration_queue if self.contains_tick(entry[2])]
+            heapify(self._expiration_queue)
+
+        unblock_queue = self._unblock_queue
+        while unblock_queue and unblock_queue[0][0] <= now:
+            _, _, tick_entry, blocked_order_id = heappop(unblock_queue)
+            tick_entry.unblock_for_matching(blocked_order_id)
+
+    def contains_tick(self, tick):
+        """
+        :return: True if the given tick is (still) in the order book, False otherwise
+        :rtype: bool
+        """
+        tick_entry = self._asks.get_tick(tick.order_id) if tick.is_ask() else self._bids.get_tick(tick.order_id)
+        return tick_entry is not None and tick_entry.tick is tick
+
+    def on_tick_inserted(self, tick):
+        """
+        Add a tick that has just been inserted to the Bloom filter and reconciliation table of the order ids, if they
+        have been built.
+
+        :type tick: Tick
+        """
+        if self._bloomfilter is not None:
+            self._bloomfilter.add(bytes(tick.order_id))
+            self._bloomfilter_keys += 1
+        if self._reconciliation_tables is not None:
+            key = get_key(bytes(tick.order_id))
+            key_hashes = get_key_hashes(key)
+            self._reconciliation_tables[get_partition(key, self.RECONCILIATION_PARTITIONS)].insert(key, key_hashes)
+            self._reconciliation_estimator.insert(key, key_hashes)
+            self._reconciliation_keys[key] = tick.order_id
+
+    def on_tick_removed(self, order_id):
+        """
+        Remove a tick that has just been removed from the reconciliation table of the order ids, and keep track of it,
+        since its order id remains a stale key in the Bloom filter.
+
+        :type order_id: OrderId
+        """
+        if self._bloomfilter is not None:
+            self._bloomfilter_removed_keys += 1
+        if self._reconciliation_tables is not None:
+            key = get_key(bytes(order_id))
+            key_hashes = get_key_hashes(key)
+            self._reconciliation_tables[get_partition(key, self.RECONCILIATION_PARTITIONS)].remove(key, key_hashes)
+            self._reconciliation_estimator.remove(key, key_hashes)
+            del self._reconciliation_keys[key]
+
+    def get_bloomfilter(self):
+        """
+        Return a Bloom filter with the ids of the orders in the order book.
+
+        The filter is kept up to date while ticks are inserted, and is only rebuilt from all order ids when the keys in
+        it push its false positive rate past BLOOMFILTER_MAX_ERROR_RATE, or when more than a quarter of its keys belong
+        to removed ticks. The returned filter should not be modified.
+
+        :rtype: BloomFilter
+        """
+        if self._bloomfilter is None or self.get_bloomfilter_error_rate() > self.BLOOMFILTER_MAX_ERROR_RATE \
+                or self._bloomfilter_removed_keys * 4 > self._bloomfilter_keys:
+            order_ids = [bytes(order_id) for order_id in self.get_order_ids()]
+            # Leave room for a quarter more keys, so that the filter is not rebuilt after every new tick
+            capacity = len(order_ids) + len(order_ids) // 4 + 16
+            self._bloomfilter = BloomFilter(self.BLOOMFILTER_ERROR_RATE, capacity, prefix=b' ')
+            self._bloomfilter.add_keys(order_ids)
+            self._bloomfilter_keys = len(order_ids)
+            self._bloomfilter_removed_keys = 0
+        return self._bloomfilter
+
+    def get_bloomfilter_error_rate(self):
+        """
+        Return the expected false positive rate of the Bloom filter of the order ids, given the number of keys in it.
+
+        :rtype: float
+        """
+        if self._bloomfilter is None:
+            return 0.0
+        functions = self._bloomfilter.functions
+        return (1 - exp(-functions * self._bloomfilter_keys / self._bloomfilter.size)) ** functions
+
+    def build_reconciliation_tables(self):
+        """
+        Build the reconciliation tables and strata estimator of the order ids, if they have not been built yet.
+        """
+        if self._reconciliation_tables is None:
+            self._reconciliation_tables = [IBLT(self.RECONCILIATION_TABLE_SIZE)
+                                           for _ in range(self.RECONCILIATION_PARTITIONS)]
+            self._reconciliation_estimator = StrataEstimator()
+            for order_id in self.get_order_ids():
+                key = get_key(bytes(order_id))
+                key_hashes = get_key_hashes(key)
+                self._reconciliation_tables[get_partition(key, self.RECONCILIATION_PARTITIONS)].insert(key, key_hashes)
+                self._reconciliation_estimator.insert(key, key_hashes)
+                self._reconciliation_keys[key] = order_id
+
+    def get_reconciliation_table(self, size, partition=0, partition_count=1):
+        """
+        Return an invertible Bloom lookup table with the ids of the orders in the order book that are in a partition
+        of the key space, which can be modified.
+
+        The tables with the largest size of the smallest partitions are kept up to date while ticks are inserted and
+        removed, and are added together and folded into a table of the requested partition and size.
+
+        :param size: The size of the subtables, a power of two not larger than RECONCILIATION_TABLE_SIZE
+        :param partition: The partition of the key space, smaller than partition_count
+        :param partition_count: The number of partitions, a power of two not larger than RECONCILIATION_PARTITIONS
+        :type size: int
+        :type partition: int
+        :type partition_count: int
+        :rtype: IBLT
+        """
+        self.build_reconciliation_tables()
+        table = IBLT(self.RECONCILIATION_TABLE_SIZE)
+        tables_per_partition = self.RECONCILIATION_PARTITIONS // partition_count
+        for index in range(partition * tables_per_partition, (partition + 1) * tables_per_partition):
+            table.add(self._reconciliation_tables[index])
+        return table.fold(size)
+
+    def get_reconciliation_estimator(self):
+        """
+        Return the strata estimator of the ids of the orders in the order book, which should not be modified.
+
+        :rtype: StrataEstimator
+        """
+        self.build_reconciliation_tables()
+        return self._reconciliation_estimator
+
+    def get_reconciliation_layout(self, difference):
+        """
+        Return the number of partitions and the size of the subtables of the reconciliation tables with which a
+        symmetric difference of a given size can be listed. Since estimates of the difference are often too small, the
+        tables have a cell in every subtable for half as many keys again as expected, which is about three times the
+        number of cells that is needed to list the expected difference.
+
+        :param difference: The expected size of the symmetric difference
+        :type difference: int
+        :return: A tuple with the number of partitions and the size of the subtables, or None if the difference is too
+                 large to be listed with the largest tables
+        """
+        max_cells = self.RECONCILIATION_TABLE_SIZE * self.RECONCILIATION_PARTITIONS
+        if difference > max_cells:
+            return None
+        cells = 1
+        while cells < min(difference * 3 // 2, max_cells):
+            cells *= 2
+        partition_count = max(1, cells // self.RECONCILIATION_TABLE_SIZE)
+        return partition_count, cells // partition_count
+
+    def get_order_id_for_key(self, key):
+        """
+        Return the id of the order in the order book with the given reconciliation table key, if any.
+
+        :type key: int
+        :rtype: OrderId
+        """
+        self.build_reconciliation_tables()
+        return self._reconciliation_keys.get(key)
+
     def on_invalid_tick_insert(self):
         self._logger.warning("Invalid tick inserted in order book.")
 
@@ -48,17 +297,18 @@ class OrderBook(TaskManager):
         """
         if not self._asks.tick_exists(ask.order_id) and ask.order_id not in self.completed_orders and ask.is_valid():
             self._asks.insert_tick(ask)
-            delay = int(ask.timestamp) + int(ask.timeout) * 1000 - int(time.time() * 1000)
-            self.register_task("ask_%s_timeout" % ask.order_id, self.timeout_ask, ask.order_id, delay=delay)
-        self.on_invalid_tick_insert()
+            self.schedule_expiration(ask)
+            self.on_tick_inserted(ask)
+        else:
+            self.on_invalid_tick_insert()
 
     def remove_ask(self, order_id):
         """
         :type order_id: OrderId
         """
         if self._asks.tick_exists(order_id):
-            self.cancel_pending_task("ask_%s_timeout" % order_id)
             self._asks.remove_tick(order_id)
+            self.on_tick_removed(order_id)
 
     def insert_bid(self, bid):
         """
@@ -66,17 +316,18 @@ class OrderBook(TaskManager):
         """
         if not self._bids.tick_exists(bid.order_id) and bid.order_id not in self.completed_orders and bid.is_valid():
             self._bids.insert_tick(bid)
-            delay = int(bid.timestamp) + int(bid.timeout) * 1000 - int(time.time() * 1000)
-            self.register_task("bid_%s_timeout" % bid.order_id, self.timeout_bid, bid.order_id, delay=delay)
-        self.on_invalid_tick_insert()
+            self.schedule_expiration(bid)
+            self.on_tick_inserted(bid)
+        else:
+            self.on_invalid_tick_insert()
 
     def remove_bid(self, order_id):
         """
         :type order_id: OrderId
         """
         if self._bids.tick_exists(order_id):
-            self.cancel_pending_task("bid_%s_timeout" % order_id)
             self._bids.remove_tick(order_id)
+            self.on_tick_removed(order_id)
 
     def update_ticks(self, ask_order_dict, bid_order_dict, traded_quantity):
         """
@@ -227,9 +478,10 @@ class OrderBook(TaskManager):
         Return the spread between the bid and the ask price
         :rtype: Price
         """
-        spread = self.get_ask_price(price_wallet_id, quantity_wallet_id).frac - \
-                 self.get_bid_price(price_wallet_id, quantity_wallet_id).frac
-        return Price(spread.numerator, spread.denominator, price_wallet_id, quantity_wallet_id)
+        ask_price = self.get_ask_price(price_wallet_id, quantity_wallet_id)
+        bid_price = self.get_bid_price(price_wallet_id, quantity_wallet_id)
+        return Price(ask_price.num * bid_price.denom - bid_price.num * ask_price.denom,
+                     ask_price.denom * bid_price.denom, price_wallet_id, quantity_wallet_id)
 
     def bid_side_depth(self, price):
         """
@@ -319,6 +571,37 @@ class OrderBook(TaskManager):
 
         return ids
 
+    def get_ticks_by_distance(self):
+        """
+        Iterate over the ticks in the order book in order of the distance of their price from the best price of their
+        side of the order book for their asset pair. The distance of a price is relative to the best price, so ticks of
+        different asset pairs are interleaved, and the ticks that are most likely to be matched come first.
+
+        :return: A generator of (sync key, tick entry) tuples, in ascending order of sync key. The sync key of a tick
+                 is a (distance, timestamp, order id) tuple, which orders all ticks in the order book.
+        """
+        key_func = itemgetter(0)
+        tick_streams = []
+        for side, is_ask in ((self._bids, False), (self._asks, True)):
+            for price_wallet_id, quantity_wallet_id in side.get_price_level_list_wallets():
+                price_levels = side.get_price_level_list(price_wallet_id, quantity_wallet_id).items(reverse=not is_ask)
+                if price_levels:
+                    tick_streams.append(self._get_price_level_ticks_by_distance(price_levels))
+        return merge(*tick_streams, key=key_func)
+
+    @staticmethod
+    def _get_price_level_ticks_by_distance(price_levels):
+        """
+        :param price_levels: The non-empty price levels of one side and asset pair, starting at the best price
+        """
+        best_price = price_levels[0].price.amount
+        for price_level in price_levels:
+            distance = abs(price_level.price.amount - best_price)
+            if best_price:
+                distance /= best_price
+            yield from sorted(((distance, int(tick_entry.tick.timestamp), bytes(tick_entry.order_id)), tick_entry)
+                              for tick_entry in price_level)
+
     def __str__(self):
         res_str = ''
         res_str += "------ Bids -------\n"
@@ -332,12 +615,6 @@ class OrderBook(TaskManager):
         res_str += "\n"
         return res_str
 
-    def cancel_all_pending_tasks(self):
-        tasks = super(OrderBook, self).cancel_all_pending_tasks()
-        for order_id in self.get_order_ids():
-            tasks.extend(self.get_tick(order_id).cancel_all_pending_tasks())
-        return tasks
-
 
 class DatabaseOrderBook(OrderBook):
     """
@@ -350,18 +627,29 @@ class DatabaseOrderBook(OrderBook):
 
     def save_to_database(self):
         """
-        Write all ticks to the database
+        Write all ticks to the database, in a single database transaction.
+        The ticks are written in price-time order, so their order within a price level is kept when restoring them.
         """
-        self.database.delete_all_ticks()
-        for order_id in self.get_order_ids():
-            tick = self.get_tick(order_id)
-            if tick.is_valid():
-                self.database.add_tick(tick.tick)
+        ticks = []
+        for side in (self._bids, self._asks):
+            for price_wallet_id, quantity_wallet_id in side.get_price_level_list_wallets():
+                for price_level in side.get_price_level_list(price_wallet_id, quantity_wallet_id).items():
+                    ticks += [tick_entry.tick for tick_entry in price_level if tick_entry.is_valid()]
+
+        with paused_garbage_collection(), self.database:
+            self.database.delete_all_ticks()
+            self.database.add_ticks(ticks)
 
     def restore_from_database(self):
         """
-        Restore ticks from the database
-        """
-        for tick in self.database.get_ticks():
-            if not self.tick_exists(tick.order_id) and tick.is_valid():
-                self.insert_ask(tick) if tick.is_ask() else self.insert_bid(tick)
+        Restore ticks from the database.
+        The ticks are inserted directly in the sides of the order book, without checking each of them again.
+        """
+        with paused_garbage_collection():
+            for tick in self.database.get_ticks():
+                if tick.is_valid() and tick.order_id not in self.completed_orders and \
+                        not self.tick_exists(tick.order_id):
+                    side = self._asks if tick.is_ask() else self._bids
+                    side.insert_tick(tick)
+                    self.schedule_expiration(tick)
+                    self.on_tick_inserted(tick)
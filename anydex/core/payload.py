@@ -108,6 +108,29 @@ class MatchPayload(OrderPayload):
                             TraderId(match_trader_id), TraderId(matchmaker_trader_id))
 
 
+class MatchBatchPayload(MessagePayload):
+    """
+    Payload for a batch of matches for orders of the same trader in the market community.
+    """
+
+    format_list = MessagePayload.format_list + ['H', 'varlenI']
+
+    def __init__(self, trader_id, timestamp, num_matches, matches):
+        super(MatchBatchPayload, self).__init__(trader_id, timestamp)
+        self.num_matches = num_matches
+        self.matches = matches
+
+    def to_pack_list(self):
+        data = super(MatchBatchPayload, self).to_pack_list()
+        data += [('H', self.num_matches),
+                 ('varlenI', self.matches)]
+        return data
+
+    @classmethod
+    def from_unpack_list(cls, trader_id, timestamp, num_matches, matches):
+        return MatchBatchPayload(TraderId(trader_id), Timestamp(timestamp), num_matches, matches)
+
+
 class DeclineMatchPayload(MessagePayload):
     """
     Payload for a declined match in the market community.
@@ -316,6 +339,120 @@ class OrderbookSyncPayload(MessagePayload):
         return OrderbookSyncPayload(TraderId(trader_id), timestamp, bloomfilter)
 
 
+class OrderbookReconcilePayload(MessagePayload):
+    """
+    Payload for reconciling the orders of two matchmakers in the market community, containing an invertible Bloom
+    lookup table of the orders of the sender in one partition of the key space. The first table of a reconciliation
+    also contains a strata estimator of the orders of the sender, to estimate the difference.
+    """
+
+    format_list = MessagePayload.format_list + ['H', 'H', 'H', 'varlenI', 'varlenI']
+
+    def __init__(self, trader_id, timestamp, table_size, partition, partition_count, table, estimator):
+        super(OrderbookReconcilePayload, self).__init__(trader_id, timestamp)
+        self.table_size = table_size
+        self.partition = partition
+        self.partition_count = partition_count
+        self.table = table
+        self.estimator = estimator
+
+    def to_pack_list(self):
+        data = super(OrderbookReconcilePayload, self).to_pack_list()
+        data += [('H', self.table_size),
+                 ('H', self.partition),
+                 ('H', self.partition_count),
+                 ('varlenI', self.table),
+                 ('varlenI', self.estimator)]
+        return data
+
+    @classmethod
+    def from_unpack_list(cls, trader_id, timestamp, table_size, partition, partition_count, table, estimator):
+        return OrderbookReconcilePayload(TraderId(trader_id), timestamp, table_size, partition, partition_count, table,
+                                         estimator)
+
+
+class OrderbookReconcileResponsePayload(MessagePayload):
+    """
+    Payload for the response to an order book reconciliation message, containing the keys of the orders that the
+    sender of the reconciliation message has and the receiver does not have.
+    """
+
+    format_list = MessagePayload.format_list + ['varlenI']
+
+    def __init__(self, trader_id, timestamp, keys):
+        super(OrderbookReconcileResponsePayload, self).__init__(trader_id, timestamp)
+        self.keys = keys
+
+    def to_pack_list(self):
+        data = super(OrderbookReconcileResponsePayload, self).to_pack_list()
+        data.append(('varlenI', b''.join(key.to_bytes(8, 'big') for key in self.keys)))
+        return data
+
+    @classmethod
+    def from_unpack_list(cls, trader_id, timestamp, keys):
+        keys = [int.from_bytes(keys[index:index + 8], 'big') for index in range(0, len(keys) - 7, 8)]
+        return OrderbookReconcileResponsePayload(TraderId(trader_id), timestamp, keys)
+
+
+class OrderbookSnapshotRequestPayload(MessagePayload):
+    """
+    Payload for requesting the order book snapshot of a matchmaker in the market community, from a given offset.
+    """
+
+    format_list = MessagePayload.format_list + ['I', 'I']
+
+    def __init__(self, trader_id, timestamp, identifier, offset):
+        super(OrderbookSnapshotRequestPayload, self).__init__(trader_id, timestamp)
+        self.identifier = identifier
+        self.offset = offset
+
+    def to_pack_list(self):
+        data = super(OrderbookSnapshotRequestPayload, self).to_pack_list()
+        data += [('I', self.identifier),
+                 ('I', self.offset)]
+        return data
+
+    @classmethod
+    def from_unpack_list(cls, trader_id, timestamp, identifier, offset):
+        return OrderbookSnapshotRequestPayload(TraderId(trader_id), timestamp, identifier, offset)
+
+
+class OrderbookSnapshotPayload(MessagePayload):
+    """
+    Payload for a part of the order book snapshot of a matchmaker in the market community, containing the tick blocks
+    of the snapshot entries from offset up to next_offset.
+    """
+
+    format_list = MessagePayload.format_list + ['I', 'I', 'I', 'I', 'I', 'H', 'varlenI']
+
+    def __init__(self, trader_id, timestamp, identifier, offset, next_offset, window_end, total, num_blocks, blocks):
+        super(OrderbookSnapshotPayload, self).__init__(trader_id, timestamp)
+        self.identifier = identifier
+        self.offset = offset
+        self.next_offset = next_offset
+        self.window_end = window_end
+        self.total = total
+        self.num_blocks = num_blocks
+        self.blocks = blocks
+
+    def to_pack_list(self):
+        data = super(OrderbookSnapshotPayload, self).to_pack_list()
+        data += [('I', self.identifier),
+                 ('I', self.offset),
+                 ('I', self.next_offset),
+                 ('I', self.window_end),
+                 ('I', self.total),
+                 ('H', self.num_blocks),
+                 ('varlenI', self.blocks)]
+        return data
+
+    @classmethod
+    def from_unpack_list(cls, trader_id, timestamp, identifier, offset, next_offset, window_end, total, num_blocks,
+                         blocks):
+        return OrderbookSnapshotPayload(TraderId(trader_id), timestamp, identifier, offset, next_offset, window_end,
+                                        total, num_blocks, blocks)
+
+
 class PingPongPayload(MessagePayload):
     """
     Payload for a ping and pong message in the market community.
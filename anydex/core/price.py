@@ -1,4 +1,5 @@
 from fractions import Fraction
+from math import gcd
 
 
 class Price(object):
@@ -6,28 +7,51 @@ class Price(object):
     This class represents a price in the market.
     The price is simply a fraction that expresses one asset in another asset.
     For instance, 0.5 MB/BTC means that one exchanges 0.5 MB for 1 BTC.
+
+    The fraction is stored in its canonical form: the numerator and denominator are reduced integers and the
+    denominator is positive. This makes equality and hashing exact and cheap, and ordering is done with an exact
+    cross-multiplication of integers, so that two near-identical prices never compare as equal.
     """
+    __slots__ = ('num', 'denom', 'num_type', 'denom_type')
 
     def __init__(self, num, denom, num_type, denom_type):
-        self.num = num
-        self.denom = denom
+        if denom == 0:
+            raise ZeroDivisionError("Price(%s, 0)" % num)
+        if denom < 0:
+            num, denom = -num, -denom
+        divisor = gcd(num, denom)
+        self.num = num // divisor
+        self.denom = denom // divisor
         self.num_type = num_type
         self.denom_type = denom_type
-        self.frac = Fraction(num, denom)
-        self.amount = float(self.frac)
+
+    @property
+    def frac(self):
+        """
+        :rtype: Fraction
+        """
+        return Fraction(self.num, self.denom)
+
+    @property
+    def amount(self):
+        """
+        The (approximate) value of this price as float.
+        :rtype: float
+        """
+        return self.num / self.denom
 
     def __str__(self):
         return "%g %s/%s" % (self.amount, self.num_type, self.denom_type)
 
     def __lt__(self, other):
         if isinstance(other, Price) and self.num_type == other.num_type and self.denom_type == other.denom_type:
-            return self.amount < other.amount
+            return self.num * other.denom < other.num * self.denom
         else:
             return NotImplemented
 
     def __le__(self, other):
         if isinstance(other, Price) and self.num_type == other.num_type and self.denom_type == other.denom_type:
-            return self.amount <= other.amount
+            return self.num * other.denom <= other.num * self.denom
         else:
             return NotImplemented
 
@@ -38,13 +62,13 @@ class Price(object):
 
     def __gt__(self, other):
         if isinstance(other, Price) and self.num_type == other.num_type and self.denom_type == other.denom_type:
-            return self.amount > other.amount
+            return self.num * other.denom > other.num * self.denom
         else:
             return NotImplemented
 
     def __ge__(self, other):
         if isinstance(other, Price) and self.num_type == other.num_type and self.denom_type == other.denom_type:
-            return self.amount >= other.amount
+            return self.num * other.denom >= other.num * self.denom
         else:
             return NotImplemented
 
@@ -52,7 +76,7 @@ class Price(object):
         if not isinstance(other, Price) or self.num_type != other.num_type or self.denom_type != other.denom_type:
             return NotImplemented
         else:
-            return self.frac == other.frac
+            return self.num == other.num and self.denom == other.denom
 
     def __hash__(self):
-        return hash((hash(self.frac), self.num_type, self.denom_type))
+        return hash((self.num, self.denom, self.num_type, self.denom_type))
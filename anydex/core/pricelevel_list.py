@@ -1,33 +1,116 @@
-from typing import Any, Dict, List  # pylint: disable=unused-import
+import random
+from typing import Any, Dict, List, Optional  # pylint: disable=unused-import
 
 from anydex.core.price import Price  # pylint: disable=unused-import
 from anydex.core.pricelevel import PriceLevel
 
 
+class _PriceLevelNode(object):
+    """
+    A node in the skip list of a PriceLevelList.
+    """
+    __slots__ = ('price', 'price_level', 'forward', 'backward')
+
+    def __init__(self, price, price_level, height):
+        self.price = price
+        self.price_level = price_level
+        self.forward = [None] * height  # type: List[Optional[_PriceLevelNode]]
+        self.backward = None  # type: Optional[_PriceLevelNode]
+
+
 class PriceLevelList(object):
     """
     Sorted doubly linked dictionary implementation.
+
+    The price levels are kept in a skip list, ordered on price. Inserting and removing a price level takes expected
+    O(log n) time. Since every price is also indexed in a dictionary that points to its node in the skip list, finding
+    the successor or predecessor of a price, and retrieving the lowest and highest price, takes O(1) time.
     """
+    MAX_HEIGHT = 32
+    BRANCHING_PROBABILITY = 0.25
 
     def __init__(self):
         super(PriceLevelList, self).__init__()
-        self._price_list = []  # type: List[float]
-        self._price_level_dictionary = {}  # type: Dict[float, PriceLevel]
+        self._head = _PriceLevelNode(None, None, self.MAX_HEIGHT)
+        self._tail = None  # type: Optional[_PriceLevelNode]
+        self._height = 1
+        self._price_level_dictionary = {}  # type: Dict[Price, _PriceLevelNode]
+
+    def __len__(self):
+        return len(self._price_level_dictionary)
+
+    def _random_height(self):
+        height = 1
+        while height < self.MAX_HEIGHT and random.random() < self.BRANCHING_PROBABILITY:
+            height += 1
+        return height
+
+    def _find_predecessors(self, price):  # type: (Price) -> List[_PriceLevelNode]
+        """
+        Return, for every level of the skip list, the last node with a price lower than the given price.
+        """
+        predecessors = [self._head] * self.MAX_HEIGHT
+        node = self._head
+        for level in range(self._height - 1, -1, -1):
+            next_node = node.forward[level]
+            while next_node is not None and next_node.price < price:
+                node = next_node
+                next_node = node.forward[level]
+            predecessors[level] = node
+        return predecessors
 
     def insert(self, price_level):  # type: (PriceLevel) -> None
         """
         :type price_level: PriceLevel
         """
-        self._price_list.append(price_level.price)
-        self._price_list.sort()
-        self._price_level_dictionary[price_level.price] = price_level
+        price = price_level.price
+        existing_node = self._price_level_dictionary.get(price)
+        if existing_node is not None:
+            existing_node.price_level = price_level
+            return
+
+        predecessors = self._find_predecessors(price)
+        height = self._random_height()
+        self._height = max(self._height, height)
+
+        node = _PriceLevelNode(price, price_level, height)
+        for level in range(height):
+            node.forward[level] = predecessors[level].forward[level]
+            predecessors[level].forward[level] = node
+
+        node.backward = predecessors[0] if predecessors[0] is not self._head else None
+        if node.forward[0] is not None:
+            node.forward[0].backward = node
+        else:
+            self._tail = node
+
+        self._price_level_dictionary[price] = node
 
     def remove(self, price):  # type: (Price) -> None
         """
         :type price: Price
         """
-        self._price_list.remove(price)
-        del self._price_level_dictionary[price]
+        node = self._price_level_dictionary.pop(price, None)
+        if node is None:
+            raise ValueError("Price %s is not in the price level list" % price)
+
+        predecessors = self._find_predecessors(node.price)
+        for level in range(len(node.forward)):
+            predecessors[level].forward[level] = node.forward[level]
+
+        if node.forward[0] is not None:
+            node.forward[0].backward = node.backward
+        else:
+            self._tail = node.backward
+
+        while self._height > 1 and self._head.forward[self._height - 1] is None:
+            self._height -= 1
+
+    def _get_node(self, price):  # type: (Price) -> _PriceLevelNode
+        node = self._price_level_dictionary.get(price)
+        if node is None:
+            raise ValueError("Price %s is not in the price level list" % price)
+        return node
 
     def succ_item(self, price):  # type: (Price) -> PriceLevel
         """
@@ -36,11 +119,10 @@ class PriceLevelList(object):
         :type price: Price
         :rtype: PriceLevel
         """
-        index = self._price_list.index(price) + 1
-        if index >= len(self._price_list):
+        succ_node = self._get_node(price).forward[0]
+        if succ_node is None:
             raise IndexError
-        succ_price = self._price_list[index]
-        return self._price_level_dictionary[succ_price]
+        return succ_node.price_level
 
     def prev_item(self, price):  # type: (Price) -> PriceLevel
         """
@@ -49,11 +131,10 @@ class PriceLevelList(object):
         :type price: Price
         :rtype: PriceLevel
         """
-        index = self._price_list.index(price) - 1
-        if index < 0:
+        prev_node = self._get_node(price).backward
+        if prev_node is None:
             raise IndexError
-        prev_price = self._price_list[index]
-        return self._price_level_dictionary[prev_price]
+        return prev_node.price_level
 
     def min_key(self):  # type: () -> Price
         """
@@ -61,7 +142,10 @@ class PriceLevelList(object):
 
         :rtype: Price
         """
-        return self._price_list[0]
+        first_node = self._head.forward[0]
+        if first_node is None:
+            raise IndexError
+        return first_node.price
 
     def max_key(self):  # type: () -> Price
         """
@@ -69,22 +153,29 @@ class PriceLevelList(object):
 
         :rtype: Price
         """
-        return self._price_list[-1]
+        if self._tail is None:
+            raise IndexError
+        return self._tail.price
 
-    def items(self, reverse=False):  # type: (bool) -> List[(Price, PriceLevel)]
+    def items(self, reverse=False):  # type: (bool) -> List[PriceLevel]
         """
         Returns a sorted list (on price) of price_levels
 
         :param reverse: When true returns the reversed sorted list of price, price_level tuples
         :type reverse: bool
-        :rtype: List[(Price, PriceLevel)]
+        :rtype: List[PriceLevel]
         """
         items = []
-        for price in self._price_list:
-            if reverse:
-                items.insert(0, self._price_level_dictionary[price])
-            else:
-                items.append(self._price_level_dictionary[price])
+        if reverse:
+            node = self._tail
+            while node is not None:
+                items.append(node.price_level)
+                node = node.backward
+        else:
+            node = self._head.forward[0]
+            while node is not None:
+                items.append(node.price_level)
+                node = node.forward[0]
         return items
 
     def get_ticks_list(self):  # type: () -> List[Any]
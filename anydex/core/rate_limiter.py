@@ -0,0 +1,115 @@
+"""
+This module provides admission control for the messages that the market community receives.
+"""
+import time
+
+from anydex.core.send_scheduler import TokenBucket
+
+
+class InboundRateLimiter(object):
+    """
+    Decides which received messages are handled, so a single peer cannot saturate the event loop.
+
+    Every peer has a token bucket per message type, of which the rate and burst can be configured per message type.
+    Additionally, all messages share an overload bucket. A message of a less urgent priority class is only admitted if
+    a larger share of the overload bucket is still available, so when we receive more messages than we can handle,
+    the least urgent messages are shed first and trade negotiation is shed last.
+    """
+
+    # The share of the overload bucket that must be left after admitting a message of each priority class
+    RESERVES = [0, 0.25, 0.5, 0.75]
+
+    def __init__(self, rate, burst, overload_rate, overload_burst, limits=None, get_time=time.time):
+        """
+        :param rate: The default number of messages of a type that a peer can send per second
+        :param burst: The default number of messages of a type that a peer can send at once
+        :param overload_rate: The number of messages per second that we can handle
+        :param overload_burst: The number of messages that we can handle at once
+        :param limits: A dictionary with the (rate, burst) tuples of message types that have different limits
+        :param get_time: The function that returns the current time
+        :type rate: float
+        :type burst: int
+        :type overload_rate: float
+        :type overload_burst: int
+        :type limits: dict
+        """
+        self.rate = rate
+        self.burst = burst
+        self.limits = limits or {}
+        self.get_time = get_time
+        self.overload_bucket = TokenBucket(overload_rate, overload_burst, get_time)
+        self.buckets = {}  # (Address, message type) -> TokenBucket
+        self.prune_threshold = 1000  # Idle token buckets are removed once there are this many of them
+
+        self.admitted = 0
+        self.rate_limited = {}  # Message type -> number of messages dropped because the peer exceeded its rate
+        self.shed = {}  # Message type -> number of messages dropped because we were overloaded
+
+    def get_bucket(self, address, message_type):
+        key = (address, message_type)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.prune_threshold:
+                self.prune_buckets()
+            rate, burst = self.limits.get(message_type, (self.rate, self.burst))
+            bucket = self.buckets[key] = TokenBucket(rate, burst, self.get_time)
+        return bucket
+
+    def prune_buckets(self):
+        """
+        Remove the token buckets that are full, which are equivalent to new token buckets.
+        """
+        for key, bucket in list(self.buckets.items()):
+            if bucket.is_full():
+                del self.buckets[key]
+        self.prune_threshold = max(1000, 2 * len(self.buckets))
+
+    def admit(self, address, message_type, priority):
+        """
+        Return whether a message that we received should be handled.
+
+        :param address: The address the message was received from
+        :param message_type: The type of the message
+        :param priority: The priority class of the message, one of the PRIORITY_ constants of the send scheduler
+        :rtype: bool
+        """
+        if not self.get_bucket(address, message_type).consume():
+            self.rate_limited[message_type] = self.rate_limited.get(message_type, 0) + 1
+            return False
+        if not self.overload_bucket.consume(self.RESERVES[priority] * self.overload_bucket.burst):
+            self.shed[message_type] = self.shed.get(message_type, 0) + 1
+            return False
+        self.admitted += 1
+        return True
+
+    def wrap(self, handler, priority):
+        """
+        Return a message handler that only calls the given handler for the messages that are admitted.
+
+        :param handler: The handler of a message type, which is called with the source address and the packet
+        :param priority: The priority class of the messages, or a function that returns the priority class of a packet
+        """
+        message_type = handler.__name__
+
+        def rate_limited_handler(source_address, data):
+            message_priority = priority(data) if callable(priority) else priority
+            if self.admit(source_address, message_type, message_priority):
+                return handler(source_address, data)
+            return None
+
+        rate_limited_handler.__name__ = message_type
+        return rate_limited_handler
+
+    def get_stats(self):
+        """
+        Return the number of admitted messages, and the number of dropped messages of every message type.
+
+        :rtype: dict
+        """
+        return {
+            "buckets": len(self.buckets),
+            "admitted": self.admitted,
+            "rate_limited": dict(self.rate_limited),
+            "shed": dict(self.shed),
+            "overload_tokens": self.overload_bucket.tokens
+        }
@@ -0,0 +1,74 @@
+from ipv8.requestcache import RequestCache
+
+
+class MarketRequestCache(RequestCache):
+    """
+    Request cache that additionally indexes the match caches on order number, and the outstanding proposed trades on
+    the pair of order ids they are about. The indices are updated whenever a cache is added, popped, times out or when
+    the request cache is cleared, so looking up the caches of an order does not require a scan of all caches.
+    """
+
+    def __init__(self):
+        super(MarketRequestCache, self).__init__()
+        self._match_caches = {}  # Dict of order number -> MatchCache
+        self._proposals = {}  # Dict of (OrderId, OrderId) -> dict of proposal identifier -> ProposedTradeRequestCache
+
+    def _index(self, identifier, cache):
+        if cache.prefix == u"match":
+            self._match_caches[cache.number] = cache
+        elif cache.prefix == u"proposed-trade":
+            key = (cache.proposed_trade.order_id, cache.proposed_trade.recipient_order_id)
+            self._proposals.setdefault(key, {})[identifier] = cache
+
+    def _unindex(self, identifier, cache):
+        if cache.prefix == u"match":
+            if self._match_caches.get(cache.number) is cache:
+                del self._match_caches[cache.number]
+        elif cache.prefix == u"proposed-trade":
+            key = (cache.proposed_trade.order_id, cache.proposed_trade.recipient_order_id)
+            proposals = self._proposals.get(key)
+            if proposals is not None and proposals.get(identifier) is cache:
+                del proposals[identifier]
+                if not proposals:
+                    del self._proposals[key]
+
+    def add(self, cache):
+        cache = super(MarketRequestCache, self).add(cache)
+        if cache:
+            self._index(self._create_identifier(cache.number, cache.prefix), cache)
+        return cache
+
+    def pop(self, prefix, number):
+        cache = super(MarketRequestCache, self).pop(prefix, number)
+        self._unindex(self._create_identifier(number, prefix), cache)
+        return cache
+
+    def _on_timeout(self, cache):
+        self._unindex(self._create_identifier(cache.number, cache.prefix), cache)
+        super(MarketRequestCache, self)._on_timeout(cache)
+
+    def clear(self):
+        self._match_caches.clear()
+        self._proposals.clear()
+        return super(MarketRequestCache, self).clear()
+
+    async def shutdown(self):
+        self._match_caches.clear()
+        self._proposals.clear()
+        await super(MarketRequestCache, self).shutdown()
+
+    def get_match_caches(self):
+        """
+        Return all match caches.
+
+        :rtype: [MatchCache]
+        """
+        return list(self._match_caches.values())
+
+    def get_proposals(self, order_id, partner_order_id):
+        """
+        Return the outstanding proposed trades between the given order and partner order.
+
+        :return: A list of (proposal identifier, ProposedTradeRequestCache) tuples
+        """
+        return list(self._proposals.get((order_id, partner_order_id), {}).items())
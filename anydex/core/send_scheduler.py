@@ -0,0 +1,187 @@
+"""
+This module provides a scheduler for the packets that the market community sends, which paces the packets to every
+destination and lets urgent packets overtake bulk traffic.
+"""
+import time
+from asyncio import sleep
+from collections import deque
+
+from ipv8.taskmanager import TaskManager
+
+# The priority classes of packets, from most to least urgent
+PRIORITY_TRADE = 0  # Trade negotiation, which is never delayed
+PRIORITY_MATCH = 1  # Matches and other messages between traders and matchmakers
+PRIORITY_BROADCAST = 2  # Broadcasts of market blocks
+PRIORITY_SYNC = 3  # Order book synchronization between matchmakers
+PRIORITY_NAMES = ["trade", "match", "broadcast", "sync"]
+
+
+class TokenBucket(object):
+    """
+    A token bucket that allows sending rate packets per second, with bursts of at most burst packets.
+    """
+
+    def __init__(self, rate, burst, get_time=time.time):
+        self.rate = rate
+        self.burst = burst
+        self.get_time = get_time
+        self.tokens = burst
+        self.last_update = get_time()
+
+    def refill(self):
+        now = self.get_time()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_update) * self.rate)
+        self.last_update = now
+
+    def consume(self, reserve=0):
+        """
+        Take a token from the bucket, if there is one.
+
+        :param reserve: The number of tokens that should be left in the bucket after taking one
+        :return: Whether a token was taken
+        :rtype: bool
+        """
+        self.refill()
+        if self.tokens < 1 + reserve:
+            return False
+        self.tokens -= 1
+        return True
+
+    def get_wait_time(self):
+        """
+        Return how long (in seconds) it takes until a token is available.
+        """
+        self.refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def is_full(self):
+        self.refill()
+        return self.tokens >= self.burst
+
+
+class SendScheduler(TaskManager):
+    """
+    Sends packets to the endpoint, pacing the packets to every destination with a token bucket.
+
+    A packet is sent right away if its destination has a token available and no packets are queued for it. Otherwise,
+    it is queued until a token becomes available, and queued packets are sent in order of priority class. Packets of
+    the trade class are sent right away regardless, so trade negotiation is not slowed down by bulk traffic to the same
+    destination. When the queue of a destination is full, the least urgent packet is dropped.
+    """
+
+    def __init__(self, endpoint, rate, burst, max_queue_size, get_time=time.time):
+        """
+        :param endpoint: The endpoint to send the packets with
+        :param rate: The number of packets per second that can be sent to a destination
+        :param burst: The number of packets that can be sent to a destination at once
+        :param max_queue_size: The maximum number of packets queued for a destination
+        :param get_time: The function that returns the current time
+        :type rate: float
+        :type burst: int
+        :type max_queue_size: int
+        """
+        super(SendScheduler, self).__init__()
+        self.endpoint = endpoint
+        self.rate = rate
+        self.burst = burst
+        self.max_queue_size = max_queue_size
+        self.get_time = get_time
+        self.buckets = {}  # Address -> TokenBucket
+        self.queues = {}  # Address -> list of the queued packets of every priority class
+        self.prune_threshold = 1000  # Idle token buckets are removed once there are this many of them
+
+        self.queued = [0] * len(PRIORITY_NAMES)
+        self.sent = [0] * len(PRIORITY_NAMES)
+        self.delayed = [0] * len(PRIORITY_NAMES)
+        self.dropped = [0] * len(PRIORITY_NAMES)
+        self.max_queue_depth = 0
+
+    def get_bucket(self, address):
+        bucket = self.buckets.get(address)
+        if bucket is None:
+            if len(self.buckets) >= self.prune_threshold:
+                self.prune_buckets()
+            bucket = self.buckets[address] = TokenBucket(self.rate, self.burst, self.get_time)
+        return bucket
+
+    def prune_buckets(self):
+        """
+        Remove the token buckets of destinations without queued packets that are full, which are equivalent to new
+        token buckets.
+        """
+        for address, bucket in list(self.buckets.items()):
+            if address not in self.queues and bucket.is_full():
+                del self.buckets[address]
+        self.prune_threshold = max(1000, 2 * len(self.buckets))
+
+    def send(self, address, packet, priority):
+        """
+        Send a packet to an address, or queue it if the address cannot receive more packets right now.
+
+        :param address: The address to send the packet to
+        :param packet: The packet to send
+        :param priority: The priority class of the packet, one of the PRIORITY_ constants
+        """
+        bucket = self.get_bucket(address)
+        if priority == PRIORITY_TRADE:
+            bucket.consume()
+        elif address in self.queues or not bucket.consume():
+            self.enqueue(address, packet, priority)
+            return
+        self.send_packet(address, packet, priority)
+
+    def send_packet(self, address, packet, priority):
+        self.endpoint.send(address, packet)
+        self.sent[priority] += 1
+
+    def enqueue(self, address, packet, priority):
+        queues = self.queues.get(address)
+        if queues is None:
+            queues = self.queues[address] = [deque() for _ in PRIORITY_NAMES]
+            self.register_task("send_queued_packets_%s" % str(address), self.send_queued_packets, address)
+
+        if sum(len(queue) for queue in queues) >= self.max_queue_size:
+            least_urgent = max(index for index, queue in enumerate(queues) if queue)
+            if least_urgent <= priority:
+                self.dropped[priority] += 1
+                return
+            queues[least_urgent].pop()
+            self.queued[least_urgent] -= 1
+            self.dropped[least_urgent] += 1
+
+        queues[priority].append(packet)
+        self.queued[priority] += 1
+        self.delayed[priority] += 1
+        self.max_queue_depth = max(self.max_queue_depth, sum(len(queue) for queue in queues))
+
+    async def send_queued_packets(self, address):
+        """
+        Send the packets queued for an address as tokens become available, the most urgent packets first.
+        """
+        queues = self.queues[address]
+        bucket = self.buckets[address]
+        while any(queues):
+            await sleep(bucket.get_wait_time())
+            while any(queues) and bucket.consume():
+                priority = next(index for index, queue in enumerate(queues) if queue)
+                self.queued[priority] -= 1
+                self.send_packet(address, queues[priority].popleft(), priority)
+        del self.queues[address]
+
+    def get_stats(self):
+        """
+        Return the number of destinations, the queue depths and the numbers of sent, delayed and dropped packets of
+        every priority class.
+
+        :rtype: dict
+        """
+        return {
+            "destinations": len(self.buckets),
+            "queued_destinations": len(self.queues),
+            "max_queue_depth": self.max_queue_depth,
+            "priorities": {name: {"queued": self.queued[index],
+                                  "sent": self.sent[index],
+                                  "delayed": self.delayed[index],
+                                  "dropped": self.dropped[index]}
+                           for index, name in enumerate(PRIORITY_NAMES)}
+        }
@@ -9,3 +9,15 @@ class MarketSettings(object):
         self.match_send_interval = 0  # How long we should wait with sending a match message (to avoid overloading a peer)
         self.num_order_sync = 10      # How many orders to sync at most
         self.single_trade = True      # Whether we can only trade with a single counterparty at once
+        self.reconcile_orderbook = False  # Whether matchmakers sync their order books by set reconciliation
+        self.bootstrap_from_snapshot = False  # Whether matchmakers download and serve order book snapshots
+        self.send_rate = 100          # How many packets per second we send to a peer, apart from trade negotiation
+        self.send_burst = 50          # How many packets we can send to a peer at once
+        self.send_queue_size = 1000   # How many packets are queued for a peer at most, before packets are dropped
+        self.receive_rate = 50        # How many messages of a type a peer can send us per second
+        self.receive_burst = 100      # How many messages of a type a peer can send us at once
+        self.receive_limits = {       # The (rate, burst) of the message types with different limits, by handler name
+            'received_orderbook_sync': (5, 10)
+        }
+        self.overload_rate = 2000     # How many messages per second we can handle from all peers together
+        self.overload_burst = 2000    # How many messages we can handle at once
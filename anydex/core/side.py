@@ -81,14 +81,16 @@ class Side(object):
         :param tick: The tick to insert
         :type tick: Tick
         """
-        if (tick.assets.second.asset_id, tick.assets.first.asset_id) not in self._price_level_list_map:
-            self._price_level_list_map[(tick.assets.second.asset_id, tick.assets.first.asset_id)] = PriceLevelList()
-            self._depth[(tick.assets.second.asset_id, tick.assets.first.asset_id)] = 0
-
-        if not self._price_level_exists(tick.price):  # First tick for that price
-            self._create_price_level(tick.price)
-        tick_entry = TickEntry(tick, self._price_map[tick.price])
-        self.get_price_level(tick.price).append_tick(tick_entry)
+        price = tick.price
+        if (price.num_type, price.denom_type) not in self._price_level_list_map:
+            self._price_level_list_map[(price.num_type, price.denom_type)] = PriceLevelList()
+            self._depth[(price.num_type, price.denom_type)] = 0
+
+        if not self._price_level_exists(price):  # First tick for that price
+            self._create_price_level(price)
+        price_level = self._price_map[price]
+        tick_entry = TickEntry(tick, price_level)
+        price_level.append_tick(tick_entry)
         self._tick_map[tick.order_id] = tick_entry
 
     def remove_tick(self, order_id):
@@ -98,7 +100,6 @@ class Side(object):
         """
         tick = self.get_tick(order_id)
         if tick:
-            tick.cancel_all_pending_tasks()
             tick.price_level().remove_tick(tick)
             if len(tick.price_level()) == 0:  # Last tick for that price
                 self._remove_price_level(tick.price)
@@ -54,8 +54,8 @@ class Tick(object):
 
         tick_cls = Ask if is_ask else Bid
         order_id = OrderId(TraderId(trader_id), OrderNumber(order_number))
-        return tick_cls(order_id, AssetPair(AssetAmount(asset1_amount, str(asset1_type)),
-                                            AssetAmount(asset2_amount, str(asset2_type))),
+        return tick_cls(order_id, AssetPair(AssetAmount(asset1_amount, asset1_type.decode()),
+                                            AssetAmount(asset2_amount, asset2_type.decode())),
                         Timeout(timeout), Timestamp(timestamp), traded=traded, block_hash=bytes(block_hash))
 
     def to_database(self):
@@ -1,10 +1,17 @@
 import logging
 
-from ipv8.taskmanager import TaskManager
+logger = logging.getLogger(__name__)
 
 
-class TickEntry(TaskManager):
-    """Class for representing a tick in the order book"""
+class TickEntry(object):
+    """
+    Class for representing a tick in the order book.
+
+    An order book can contain many tick entries, so this class is kept as lightweight as possible. It does not
+    schedule any timers by itself; the order book that contains the entry takes care of unblocking order ids again.
+    """
+    __slots__ = ('_tick', '_price_level', '_prev_tick', '_next_tick', 'available_for_matching',
+                 '_blocked_for_matching')
 
     def __init__(self, tick, price_level):
         """
@@ -13,17 +20,13 @@ class TickEntry(TaskManager):
         :type tick: Tick
         :type price_level: PriceLevel
         """
-        super(TickEntry, self).__init__()
-
-        self._logger = logging.getLogger(self.__class__.__name__)
-
         self._tick = tick
         self._price_level = price_level
         self._prev_tick = None
         self._next_tick = None
         self.available_for_matching = 0
         self.update_available_for_matching()
-        self._blocked_for_matching = set()
+        self._blocked_for_matching = None  # Only allocated when an order id is blocked for matching
 
     @property
     def tick(self):
@@ -67,25 +70,36 @@ class TickEntry(TaskManager):
 
     def block_for_matching(self, order_id):
         """
-        Temporarily block an order id for matching
-        """
-        if order_id in self._blocked_for_matching:
-            self._logger.debug("Not blocking %s for matching; already blocked", order_id)
-            return
+        Temporarily block an order id for matching. The order book is responsible for unblocking it again.
 
-        def unblock_order_id(unblock_id):
-            self._logger.debug("Unblocking order id %s", unblock_id)
-            self._blocked_for_matching.remove(unblock_id)
+        :return: True if the order id has been blocked, False if it was already blocked
+        :rtype: bool
+        """
+        if self._blocked_for_matching is None:
+            self._blocked_for_matching = set()
+        elif order_id in self._blocked_for_matching:
+            logger.debug("Not blocking %s for matching; already blocked", order_id)
+            return False
 
-        self._logger.debug("Blocking %s for tick %s", order_id, self.order_id)
+        logger.debug("Blocking %s for tick %s", order_id, self.order_id)
         self._blocked_for_matching.add(order_id)
-        self.register_task("unblock_%s" % order_id, unblock_order_id, order_id, delay=10)
+        return True
+
+    def unblock_for_matching(self, order_id):
+        """
+        Allow an order id that has been blocked before to match with this tick again.
+        """
+        if self._blocked_for_matching is not None and order_id in self._blocked_for_matching:
+            logger.debug("Unblocking order id %s", order_id)
+            self._blocked_for_matching.remove(order_id)
+            if not self._blocked_for_matching:
+                self._blocked_for_matching = None
 
     def is_blocked_for_matching(self, order_id):
         """
         Return whether the order_id is blocked for matching
         """
-        return order_id in self._blocked_for_matching
+        return self._blocked_for_matching is not None and order_id in self._blocked_for_matching
 
     def is_valid(self):
         """
@@ -141,8 +141,7 @@ class DatabaseTransactionRepository(TransactionRepository):
         :param transaction: The transaction to update
         :type transaction: Transaction
         """
-        self.delete_by_id(transaction.transaction_id)
-        self.add(transaction)
+        self.persistence.add_transaction(transaction)
 
     def delete_by_id(self, transaction_id):
         """
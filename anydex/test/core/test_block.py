@@ -207,3 +207,49 @@ class TestMarketBlock(BaseTestCase):
                                                           'second': {'amount': "3", 'type': 'DUM2'}}))
         self.assertFalse(MarketBlock.is_valid_asset_pair({'first': {'amount': -4, 'type': 'DUM1'},
                                                           'second': {'amount': 3, 'type': 'DUM2'}}))
+
+    def test_tx_done_block(self):
+        """
+        Test whether a tx_done block can be correctly verified
+        """
+        self.assertTrue(self.tx_done_block.is_valid_tx_init_done_block())
+
+        self.tx_done_block.transaction['bid']['timeout'] = -1
+        self.assertFalse(self.tx_done_block.is_valid_tx_init_done_block())
+        self.tx_done_block.transaction['bid']['timeout'] = 30
+
+        self.tx_done_block.transaction['tx']['transferred']['first']['amount'] = 0
+        self.assertTrue(self.tx_done_block.is_valid_tx_init_done_block())
+
+        self.tx_done_block.transaction['tx']['transferred']['first']['amount'] = 2 ** 64
+        self.assertFalse(self.tx_done_block.is_valid_tx_init_done_block())
+        self.tx_done_block.transaction['tx']['transferred']['first']['amount'] = 0
+
+        self.tx_done_block.transaction.pop('ask')
+        self.assertFalse(self.tx_done_block.is_valid_tx_init_done_block())
+
+    def test_is_valid_trader_id(self):
+        """
+        Test the method to verify whether a trader id is valid
+        """
+        self.assertTrue(MarketBlock.is_valid_trader_id('aB' * 20))
+        self.assertFalse(MarketBlock.is_valid_trader_id('a' * 39))
+        self.assertFalse(MarketBlock.is_valid_trader_id('g' * 40))
+        self.assertFalse(MarketBlock.is_valid_trader_id('0x' + 'a' * 38))
+        self.assertFalse(MarketBlock.is_valid_trader_id(' ' + 'a' * 39))
+        self.assertFalse(MarketBlock.is_valid_trader_id(b'a' * 40))
+
+    def test_malformed_containers(self):
+        """
+        Test whether blocks with containers of the wrong type are invalid
+        """
+        self.tick_block.transaction['tick'] = ['trader_id']
+        self.assertFalse(self.tick_block.is_valid_tick_block())
+
+        self.tx_init_block.transaction['tx']['assets'] = 'first second'
+        self.assertFalse(self.tx_init_block.is_valid_tx_init_done_block())
+
+        self.payment_block.transaction = None
+        self.assertFalse(self.payment_block.is_valid_tx_payment_block())
+
+        self.assertFalse(MarketBlock.is_valid_asset_pair({'first': 3, 'second': 4}))
@@ -0,0 +1,49 @@
+import unittest
+
+from anydex.core.bloomfilter import BloomFilter
+
+
+class TestBloomFilter(unittest.TestCase):
+    """
+    This class contains tests for the BloomFilter object.
+    """
+
+    def setUp(self):
+        self.bloomfilter = BloomFilter(0.01, 10, prefix=b' ')
+        self.keys = [b'%d' % i for i in range(10)]
+
+    def test_add_contains(self):
+        """
+        Test adding keys to the Bloom filter and checking whether they are in it
+        """
+        self.bloomfilter.add(self.keys[0])
+        self.bloomfilter.add_keys(self.keys[1:5])
+        for key in self.keys[:5]:
+            self.assertIn(key, self.bloomfilter)
+        self.assertNotIn(b'not in filter', self.bloomfilter)
+
+        self.bloomfilter.clear()
+        self.assertNotIn(self.keys[0], self.bloomfilter)
+        self.assertEqual(self.bloomfilter.bits_checked, 0)
+
+    def test_not_filter(self):
+        """
+        Test filtering tuples whose first element is not in the Bloom filter
+        """
+        self.bloomfilter.add_keys(self.keys[:5])
+        tuples = [(key, index) for index, key in enumerate(self.keys)]
+        self.assertEqual(list(self.bloomfilter.not_filter(iter(tuples))), tuples[5:])
+
+    def test_serialization(self):
+        """
+        Test whether the serialised Bloom filter has the bit layout that other peers expect
+        """
+        self.bloomfilter.add_keys(self.keys)
+        self.assertEqual(self.bloomfilter.functions, 6)
+        self.assertEqual(self.bloomfilter.bytes, bytes.fromhex("e9eedc9e027880ccab42f79e"))
+        self.assertEqual(self.bloomfilter.bits_checked, 50)
+
+        clone = BloomFilter(self.bloomfilter.bytes, self.bloomfilter.functions, prefix=self.bloomfilter.prefix)
+        self.assertEqual(clone.bytes, self.bloomfilter.bytes)
+        for key in self.keys:
+            self.assertIn(key, clone)
@@ -0,0 +1,105 @@
+from binascii import hexlify
+
+from anydex.core.block import MarketBlock
+from anydex.core.clearing_policy import SingleTradeClearingPolicy
+from anydex.test.base import BaseTestCase
+from anydex.test.util import MockObject
+
+
+class TestSingleTradeClearingPolicy(BaseTestCase):
+    """
+    This class contains tests for the transaction index of the single trade clearing policy.
+    """
+
+    def setUp(self):
+        BaseTestCase.setUp(self)
+        self.blocks = {}
+
+        community = MockObject()
+        community.trustchain = MockObject()
+        community.trustchain.add_listener = lambda *_: None
+        community.trustchain.persistence = MockObject()
+        community.trustchain.persistence.get_linked = \
+            lambda block: self.blocks.get((block.link_public_key, block.link_sequence_number))
+        self.policy = SingleTradeClearingPolicy(community)
+
+    def create_block(self, block_type, public_key, sequence_number, txid=None, link=None):
+        block = MarketBlock()
+        block.type = block_type
+        block.public_key = public_key
+        block.sequence_number = sequence_number
+        if link:
+            block.link_public_key, block.link_sequence_number = link
+        if txid:
+            key = "payment" if block_type == b'tx_payment' else "tx"
+            block.transaction = {key: {"transaction_id": hexlify(txid).decode()}}
+        return block
+
+    def test_index_in_order(self):
+        """
+        Test whether a trader holds the token of a transaction until it has paid
+        """
+        tx_init = self.create_block(b'tx_init', b'a', 1)
+        self.blocks[(b'a', 1)] = tx_init
+        self.policy.received_block(tx_init)
+        self.assertEqual(self.policy.open_transactions[b'a'], {tx_init.hash})
+
+        self.policy.received_block(self.create_block(b'tx_init', b'b', 1, link=(b'a', 1)))
+        self.assertFalse(self.policy.open_transactions[b'b'])
+
+        self.policy.received_block(self.create_block(b'tx_payment', b'a', 2, txid=tx_init.hash))
+        self.assertFalse(self.policy.open_transactions[b'a'])
+
+        self.policy.received_block(self.create_block(b'tx_payment', b'b', 2, txid=tx_init.hash, link=(b'a', 2)))
+        self.assertEqual(self.policy.open_transactions[b'b'], {tx_init.hash})
+
+    def test_index_out_of_order(self):
+        """
+        Test whether receiving blocks out of order results in the same transaction status
+        """
+        tx_init = self.create_block(b'tx_init', b'a', 1)
+        self.policy.received_block(self.create_block(b'tx_done', b'a', 3, txid=tx_init.hash))
+        self.policy.received_block(self.create_block(b'tx_init', b'b', 1, link=(b'a', 1)))
+        self.policy.received_block(self.create_block(b'tx_payment', b'b', 2, txid=tx_init.hash, link=(b'a', 2)))
+        self.assertIn((b'a', 1), self.policy.unlinked_blocks)
+
+        self.blocks[(b'a', 1)] = tx_init
+        self.policy.received_block(tx_init)
+        self.assertFalse(self.policy.open_transactions[b'a'])
+        self.assertEqual(self.policy.open_transactions[b'b'], {tx_init.hash})
+        self.assertFalse(self.policy.unlinked_blocks)
+
+    def test_index_without_tx_init(self):
+        """
+        Test whether a payment of a transaction without tx_init block in the same chain does not open the transaction
+        """
+        tx_init = self.create_block(b'tx_init', b'a', 1)
+        self.policy.received_block(self.create_block(b'tx_payment', b'b', 2, txid=tx_init.hash, link=(b'a', 2)))
+        self.assertFalse(self.policy.open_transactions.get(b'b'))
+        self.assertIn((b'b', tx_init.hash), self.policy.orphan_blocks)
+
+    def test_evict(self):
+        """
+        Test whether the least recently used counterparty is evicted when the index is full
+        """
+        self.policy.MAX_INDEXED_PUBLIC_KEYS = 2
+        self.policy.indexed_public_keys.add(b'a')
+        for public_key in [b'a', b'b', b'c']:
+            tx_init = self.create_block(b'tx_init', public_key, 1)
+            self.policy.received_block(tx_init)
+
+        self.assertEqual(list(self.policy.tx_status), [b'b', b'c'])
+        self.assertNotIn(b'a', self.policy.open_transactions)
+        self.assertNotIn(b'a', self.policy.indexed_public_keys)
+
+    def test_drop_parked_blocks(self):
+        """
+        Test whether the chain of a dropped parked block is evicted from the index
+        """
+        self.policy.MAX_PARKED_BLOCKS = 1
+        self.policy.indexed_public_keys.add(b'b')
+        self.policy.received_block(self.create_block(b'tx_init', b'b', 1, link=(b'a', 1)))
+        self.policy.received_block(self.create_block(b'tx_init', b'c', 1, link=(b'a', 2)))
+
+        self.assertEqual(list(self.policy.unlinked_blocks), [(b'a', 2)])
+        self.assertNotIn(b'b', self.policy.indexed_public_keys)
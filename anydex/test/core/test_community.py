@@ -1,17 +1,25 @@
 import os
-from asyncio import Future, sleep
+import time
+from asyncio import Future, gather, sleep
 
+from ipv8.attestation.trustchain.payload import HalfBlockBroadcastPayload
 from ipv8.dht import DHTError
+from ipv8.messaging.deprecated.encoding import encode
+from ipv8.messaging.payload_headers import GlobalTimeDistributionPayload
 from ipv8.test.base import TestBase
 from ipv8.test.mocking.ipv8 import MockIPv8
+from ipv8.util import succeed
 
+from anydex.core import MAX_ORDER_TIMEOUT
 from anydex.core.assetamount import AssetAmount
 from anydex.core.assetpair import AssetPair
 from anydex.core.block import MarketBlock
 from anydex.core.clearing_policy import SingleTradeClearingPolicy
-from anydex.core.community import MarketCommunity
+from anydex.core.community import MSG_BOOK_RECONCILE, MSG_MATCH_BATCH, MarketCommunity
 from anydex.core.message import TraderId
 from anydex.core.order import Order, OrderId, OrderNumber
+from anydex.core.orderbook import OrderBook
+from anydex.core.send_scheduler import PRIORITY_BROADCAST, PRIORITY_SYNC, PRIORITY_TRADE
 from anydex.core.tick import Ask, Bid
 from anydex.core.timeout import Timeout
 from anydex.core.timestamp import Timestamp
@@ -101,6 +109,21 @@ class TestMarketCommunity(TestMarketCommunityBase):
         self.assertFalse(orders[0].is_ask())
         self.assertEqual(len(self.nodes[2].overlay.order_book.bids), 1)
 
+    @timeout(2)
+    async def test_get_peer_from_mid(self):
+        """
+        Test finding a verified peer by its mid
+        """
+        await self.introduce_nodes()
+
+        mid = self.nodes[1].overlay.my_peer.mid
+        peer = self.nodes[0].overlay.get_peer_from_mid(mid)
+        self.assertEqual(peer.mid, mid)
+        self.assertIs(self.nodes[0].overlay.get_peer_from_mid(mid), peer)
+
+        self.nodes[0].network.remove_peer(peer)
+        self.assertIsNone(self.nodes[0].overlay.get_peer_from_mid(mid))
+
     async def test_create_invalid_ask_bid(self):
         """
         Test creating an invalid ask/bid with invalid asset pairs.
@@ -305,6 +328,37 @@ class TestMarketCommunity(TestMarketCommunityBase):
         await sleep(0.5)
 
         self.assertTrue(self.nodes[0].overlay.order_manager.order_repository.find_by_id(ask_order.order_id).cancelled)
+        self.assertIn(ask_order.order_id, self.nodes[2].overlay.cancelled_orders)
+        self.assertEqual(self.nodes[2].overlay.get_tracking_stats()["cancelled_orders"]["size"], 1)
+
+    @timeout(3)
+    async def test_match_batch(self):
+        """
+        Test whether the matches for the orders of a trader are sent to it in a single message
+        """
+        await self.introduce_nodes()
+
+        for price in range(1, 5):
+            await self.nodes[0].overlay.create_ask(
+                AssetPair(AssetAmount(1, 'DUM1'), AssetAmount(price, 'DUM2')), 3600)
+        await sleep(0.5)
+
+        sent_packets = []
+        send = self.nodes[2].overlay.endpoint.send
+        self.nodes[2].overlay.endpoint.send = \
+            lambda address, packet: sent_packets.append(packet) or send(address, packet)
+        received_matches = []
+        process_match_payload = self.nodes[1].overlay.process_match_payload
+        self.nodes[1].overlay.process_match_payload = \
+            lambda payload: received_matches.append(payload) or process_match_payload(payload)
+
+        await self.nodes[1].overlay.create_bid(AssetPair(AssetAmount(4, 'DUM1'), AssetAmount(16, 'DUM2')), 3600)
+        await sleep(0.5)
+
+        prefix = self.nodes[2].overlay._prefix
+        match_batches = [packet for packet in sent_packets if packet[len(prefix)] == MSG_MATCH_BATCH]
+        self.assertEqual(len(match_batches), 1)
+        self.assertEqual(len(received_matches), 4)
 
     @timeout(3)
     async def test_proposed_trade_timeout(self):
@@ -342,7 +396,7 @@ class TestMarketCommunity(TestMarketCommunityBase):
             raise DHTError()
 
         # Clean the mid register of node 1 and make sure DHT peer connection fails
-        self.nodes[1].overlay.mid_register = {}
+        self.nodes[1].overlay.mid_register.clear()
         self.nodes[1].overlay.dht = MockObject()
         self.nodes[1].overlay.dht.connect_peer = mock_connect_peer
 
@@ -356,6 +410,42 @@ class TestMarketCommunity(TestMarketCommunityBase):
         self.assertEqual(ask_order.reserved_quantity, 0)
         self.assertEqual(bid_order.reserved_quantity, 0)
 
+    async def test_send_to_trader_expired_address(self):
+        """
+        Test whether the address of a trader is looked up again when we send to it after it has expired
+        """
+        await self.introduce_nodes()
+
+        trader_id = TraderId(self.nodes[1].overlay.mid)
+        address = self.nodes[1].overlay.my_peer.address
+        self.nodes[0].overlay.mid_register.clear()
+        self.nodes[0].overlay.dht = MockObject()
+        self.nodes[0].overlay.dht.connect_peer = lambda _: succeed([self.nodes[1].overlay.my_peer])
+
+        sent_packets = []
+        self.nodes[0].overlay.send_scheduler.send = lambda *args: sent_packets.append(args)
+        self.nodes[0].overlay.send_to_trader(trader_id, b'a', PRIORITY_TRADE)
+        await sleep(0.1)
+
+        self.assertEqual(sent_packets, [(address, b'a', PRIORITY_TRADE)])
+        self.assertEqual(self.nodes[0].overlay.lookup_ip(trader_id), address)
+
+    def test_relayed_broadcasts_bounded(self):
+        """
+        Test whether the ids of relayed broadcasts and their order are bounded when the ids expire
+        """
+        trustchain = self.nodes[0].overlay.trustchain
+        self.now = time.time()
+        trustchain.relayed_broadcasts.get_time = lambda: self.now
+        history_size = trustchain.settings.broadcast_history_size
+        for index in range(history_size + 1000):
+            # Every id expires after 1000 more ids have been added
+            self.now += MAX_ORDER_TIMEOUT / 1000
+            trustchain._add_broadcasted_blockid(b'%d' % index)
+
+        self.assertEqual(len(trustchain.relayed_broadcasts_order), history_size)
+        self.assertLess(len(trustchain.relayed_broadcasts), 1100)
+
     @timeout(4)
     async def test_orderbook_sync(self):
         """
@@ -388,6 +478,173 @@ class TestMarketCommunity(TestMarketCommunityBase):
         self.assertTrue(self.nodes[4].overlay.order_book.get_tick(ask_order.order_id))
         self.assertTrue(self.nodes[4].overlay.order_book.get_tick(bid_order.order_id))
 
+    @timeout(4)
+    async def test_orderbook_sync_best_first(self):
+        """
+        Test whether the ticks closest to the best price are synchronized first, and successive syncs continue deeper
+        in the orderbook
+        """
+        await self.introduce_nodes()
+
+        deep_ask_order = await self.nodes[0].overlay.create_ask(
+            AssetPair(AssetAmount(1, 'DUM1'), AssetAmount(4, 'DUM2')), 3600)
+        ask_order = await self.nodes[0].overlay.create_ask(
+            AssetPair(AssetAmount(1, 'DUM1'), AssetAmount(2, 'DUM2')), 3600)
+        bid_order = await self.nodes[1].overlay.create_bid(
+            AssetPair(AssetAmount(1, 'DUM1'), AssetAmount(1, 'DUM2')), 3600)
+
+        await self.deliver_messages(timeout=.5)
+
+        # Sync twice before the first response arrives, so the matchmaker has to remember what it sent
+        self.nodes[2].overlay.settings.num_order_sync = 1
+        self.add_node_to_experiment(self.create_node())
+        self.nodes[3].overlay.send_orderbook_sync(self.nodes[2].overlay.my_peer)
+        self.nodes[3].overlay.send_orderbook_sync(self.nodes[2].overlay.my_peer)
+        await self.deliver_messages(timeout=.5)
+        await sleep(0.2)  # For processing the tick blocks
+
+        self.assertTrue(self.nodes[3].overlay.order_book.get_tick(ask_order.order_id))
+        self.assertTrue(self.nodes[3].overlay.order_book.get_tick(bid_order.order_id))
+        self.assertFalse(self.nodes[3].overlay.order_book.get_tick(deep_ask_order.order_id))
+
+        self.nodes[3].overlay.send_orderbook_sync(self.nodes[2].overlay.my_peer)
+        await self.deliver_messages(timeout=.5)
+        await sleep(0.2)
+
+        self.assertTrue(self.nodes[3].overlay.order_book.get_tick(deep_ask_order.order_id))
+
+    @timeout(4)
+    async def test_orderbook_reconcile(self):
+        """
+        Test whether orderbooks are reconciled with a new node
+        """
+        await self.introduce_nodes()
+
+        ask_order = await self.nodes[0].overlay.create_ask(
+            AssetPair(AssetAmount(1, 'DUM1'), AssetAmount(2, 'DUM2')), 3600)
+        bid_order = await self.nodes[1].overlay.create_bid(
+            AssetPair(AssetAmount(1, 'DUM1'), AssetAmount(1, 'DUM2')), 3600)
+
+        await self.deliver_messages(timeout=.5)
+
+        # Add a matchmaker that reconciles its empty order book with the existing matchmaker, starting with a table
+        # that is too small for the difference.
+        self.add_node_to_experiment(self.create_node())
+        self.nodes[2].overlay.settings.reconcile_orderbook = True
+        self.nodes[3].overlay.settings.reconcile_orderbook = True
+        self.nodes[3].overlay.send_orderbook_reconcile(self.nodes[2].overlay.my_peer, 1)
+        await self.deliver_messages(timeout=.5)
+        await sleep(0.2)  # For processing the tick blocks
+
+        self.assertTrue(self.nodes[3].overlay.order_book.get_tick(ask_order.order_id))
+        self.assertTrue(self.nodes[3].overlay.order_book.get_tick(bid_order.order_id))
+
+    @timeout(4)
+    async def test_orderbook_reconcile_partitions(self):
+        """
+        Test whether orderbooks with a difference that is too large for the first table are reconciled in partitions
+        """
+        await self.introduce_nodes()
+
+        orders = [await self.nodes[0].overlay.create_ask(AssetPair(AssetAmount(1, 'DUM1'),
+                                                                   AssetAmount(index + 1, 'DUM2')), 3600)
+                  for index in range(20)]
+        await self.deliver_messages(timeout=.5)
+
+        self.add_node_to_experiment(self.create_node())
+        self.nodes[2].overlay.settings.reconcile_orderbook = True
+        self.nodes[3].overlay.settings.reconcile_orderbook = True
+        # The estimate of such a small difference varies a lot, so we use the actual difference
+        estimator = MockObject()
+        estimator.estimate_difference = lambda _: len(orders)
+        self.nodes[2].overlay.order_book.get_reconciliation_estimator = lambda: estimator
+        partition_counts = []
+        send_orderbook_reconcile = self.nodes[2].overlay.send_orderbook_reconcile
+        self.nodes[2].overlay.send_orderbook_reconcile = lambda peer, table_size, partition, partition_count: \
+            (partition_counts.append(partition_count),
+             send_orderbook_reconcile(peer, table_size, partition, partition_count))
+        self.nodes[3].overlay.start_orderbook_sync(self.nodes[2].overlay.my_peer)
+        await self.deliver_messages(timeout=.5)
+        await sleep(0.2)  # For processing the tick blocks
+
+        self.assertGreater(max(partition_counts), 1)
+        for order in orders:
+            self.assertTrue(self.nodes[3].overlay.order_book.get_tick(order.order_id))
+
+    def test_orderbook_reconcile_packet_size(self):
+        """
+        Test whether the largest reconciliation table, and the first table with the strata estimator, fit in a packet
+        """
+        packets = []
+        self.nodes[2].overlay.settings.reconcile_orderbook = True
+        self.nodes[2].overlay.send_scheduler.send = lambda address, packet, priority: packets.append(packet)
+        self.nodes[2].overlay.send_orderbook_reconcile(self.nodes[0].overlay.my_peer,
+                                                       OrderBook.RECONCILIATION_TABLE_SIZE)
+        self.nodes[2].overlay.start_orderbook_sync(self.nodes[0].overlay.my_peer)
+        self.assertEqual([packet[22] for packet in packets], [MSG_BOOK_RECONCILE, MSG_BOOK_RECONCILE])
+        for packet in packets:
+            self.assertLessEqual(len(packet), 1500)
+
+    async def test_orderbook_reconcile_disabled(self):
+        """
+        Test whether a matchmaker ignores reconciliation messages if it does not reconcile its orderbook
+        """
+        await self.introduce_nodes()
+
+        ask_order = await self.nodes[0].overlay.create_ask(
+            AssetPair(AssetAmount(1, 'DUM1'), AssetAmount(2, 'DUM2')), 3600)
+        await self.deliver_messages(timeout=.5)
+
+        self.add_node_to_experiment(self.create_node())
+        self.nodes[3].overlay.settings.reconcile_orderbook = True
+        self.nodes[3].overlay.send_orderbook_reconcile(self.nodes[2].overlay.my_peer, 1)
+        await self.deliver_messages(timeout=.5)
+
+        self.assertFalse(self.nodes[3].overlay.order_book.get_tick(ask_order.order_id))
+
+    async def test_orderbook_snapshot(self):
+        """
+        Test whether a new matchmaker downloads the orderbook snapshot of an existing matchmaker
+        """
+        await self.introduce_nodes()
+
+        ask_order = await self.nodes[0].overlay.create_ask(
+            AssetPair(AssetAmount(1, 'DUM1'), AssetAmount(2, 'DUM2')), 3600)
+        bid_order = await self.nodes[1].overlay.create_bid(
+            AssetPair(AssetAmount(1, 'DUM1'), AssetAmount(1, 'DUM2')), 3600)
+
+        await self.deliver_messages(timeout=.5)
+
+        # Send every tick block in a separate window, so the snapshot has to be requested multiple times
+        self.nodes[2].overlay.settings.bootstrap_from_snapshot = True
+        self.nodes[2].overlay.SNAPSHOT_PACKET_SIZE = 1
+        self.nodes[2].overlay.SNAPSHOT_WINDOW = 1
+        self.add_node_to_experiment(self.create_node())
+        num_ticks = await self.nodes[3].overlay.request_orderbook_snapshot(self.nodes[2].overlay.my_peer)
+
+        self.assertEqual(num_ticks, 2)
+        self.assertTrue(self.nodes[3].overlay.order_book.get_tick(ask_order.order_id))
+        self.assertTrue(self.nodes[3].overlay.order_book.get_tick(bid_order.order_id))
+        self.assertFalse(self.nodes[3].overlay.snapshot_downloads)
+
+    async def test_orderbook_snapshot_per_peer(self):
+        """
+        Test whether a matchmaker only keeps the latest snapshot that another matchmaker requested
+        """
+        await self.introduce_nodes()
+
+        await self.nodes[0].overlay.create_ask(AssetPair(AssetAmount(1, 'DUM1'), AssetAmount(2, 'DUM2')), 3600)
+        await self.deliver_messages(timeout=.5)
+
+        self.nodes[2].overlay.settings.bootstrap_from_snapshot = True
+        self.add_node_to_experiment(self.create_node())
+        await self.nodes[3].overlay.request_orderbook_snapshot(self.nodes[2].overlay.my_peer)
+        await self.nodes[3].overlay.request_orderbook_snapshot(self.nodes[2].overlay.my_peer)
+
+        served_snapshots = self.nodes[2].overlay.served_snapshots
+        self.assertEqual(list(served_snapshots.keys()), [self.nodes[3].overlay.mid])
+        self.assertEqual(len(served_snapshots[self.nodes[3].overlay.mid][1]), 1)
+
     @timeout(4)
     async def test_partial_trade(self):
         """
@@ -660,6 +917,24 @@ class TestMarketCommunityFiveNodes(TestMarketCommunityBase):
         await sleep(0.5)
         self.assertTrue(list(self.nodes[2].overlay.transaction_manager.find_all()))
 
+    @timeout(4)
+    async def test_clearing_policy_concurrent_proposals(self):
+        """
+        Test whether concurrent proposals of the same trader share a single crawl instead of being declined
+        """
+        clearing_policy = SingleTradeClearingPolicy(self.nodes[2].overlay)
+        await self.introduce_nodes()
+
+        crawls = []
+        send_crawl_request = self.nodes[2].overlay.trustchain.send_crawl_request
+        self.nodes[2].overlay.trustchain.send_crawl_request = \
+            lambda *args: crawls.append(args) or send_crawl_request(*args)
+
+        trader_id = TraderId(self.nodes[0].overlay.mid)
+        self.assertEqual(await gather(clearing_policy.should_trade(trader_id), clearing_policy.should_trade(trader_id)),
+                         [True, True])
+        self.assertEqual(len(crawls), 1)
+
 
 class TestMarketCommunitySingle(TestMarketCommunityBase):
     __testing__ = True
@@ -674,6 +949,8 @@ class TestMarketCommunitySingle(TestMarketCommunityBase):
         tick_block = MarketBlock()
         tick_block.type = b'ask' if return_ask else b'bid'
         tick_block.transaction = {'tick': ask_tx, 'version': MarketCommunity.PROTOCOL_VERSION}
+        tick_block._transaction = encode(tick_block.transaction)
+        tick_block.hash = tick_block.calculate_hash()
         return tick_block
 
     @staticmethod
@@ -700,6 +977,8 @@ class TestMarketCommunitySingle(TestMarketCommunityBase):
         }
         tx_done_block.transaction['ask']['address'], tx_done_block.transaction['ask']['port'] = "1.1.1.1", 1234
         tx_done_block.transaction['bid']['address'], tx_done_block.transaction['bid']['port'] = "1.1.1.1", 1234
+        tx_done_block._transaction = encode(tx_done_block.transaction)
+        tx_done_block.hash = tx_done_block.calculate_hash()
         return tx_done_block
 
     async def test_insert_ask_bid(self):
@@ -719,6 +998,79 @@ class TestMarketCommunitySingle(TestMarketCommunityBase):
         self.assertEqual(len(self.nodes[0].overlay.order_book.asks), 1)
         self.assertEqual(len(self.nodes[0].overlay.order_book.bids), 1)
 
+    def test_broadcast_priority(self):
+        """
+        Test whether only broadcasts of blocks that we have processed are classified as duplicates
+        """
+        overlay = self.nodes[0].overlay
+        ask = TestMarketCommunitySingle.get_tick_block(True, AssetPair(AssetAmount(30, 'BTC'), AssetAmount(30, 'MB')))
+        dist = GlobalTimeDistributionPayload(1).to_pack_list()
+        payload = HalfBlockBroadcastPayload.from_half_block(ask, 2).to_pack_list()
+        packet = overlay.trustchain._ez_pack(overlay.trustchain._prefix, 5, [dist, payload], False)
+
+        self.assertEqual(overlay.get_broadcast_priority(packet), PRIORITY_BROADCAST)
+        self.assertEqual(overlay.get_broadcast_priority(packet), PRIORITY_BROADCAST)
+        overlay.received_block(ask)
+        self.assertEqual(overlay.get_broadcast_priority(packet), PRIORITY_SYNC)
+
+    async def test_broadcast_handlers(self):
+        """
+        Test whether the TrustChain broadcasts are rate limited, and whether their handlers are restored on unload
+        """
+        trustchain = self.nodes[0].overlay.trustchain
+        handlers = [trustchain.received_half_block_broadcast, trustchain.received_half_block_pair_broadcast]
+        self.assertFalse([handler for handler in trustchain.decode_map.values() if handler in handlers])
+
+        await self.nodes[0].overlay.unload()
+        self.assertEqual(len([handler for handler in trustchain.decode_map.values() if handler in handlers]), 2)
+
+    def test_seen_blocks(self):
+        """
+        Test whether a block that is received again is not processed again
+        """
+        tx_done = TestMarketCommunitySingle.get_tx_done_block(10, 3, 3, 3, 3)
+        self.nodes[0].overlay.received_block(tx_done)
+        self.nodes[0].overlay.order_book.remove_tick(OrderId(TraderId(b'0' * 20), OrderNumber(1)))
+        self.nodes[0].overlay.received_block(tx_done)
+        self.assertEqual(len(self.nodes[0].overlay.order_book.asks), 0)
+
+        stats = self.nodes[0].overlay.get_seen_blocks_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (1, 1, 0.5))
+
+    def test_seen_blocks_processed_once(self):
+        """
+        Test whether copies of a block are only processed once, and that a block is only remembered once processed
+        """
+        overlay = self.nodes[0].overlay
+        processed = []
+        process_tick_block = overlay.process_tick_block
+        overlay.process_tick_block = lambda block: (processed.append(block), process_tick_block(block))
+
+        blocks = [TestMarketCommunitySingle.get_tick_block(True, AssetPair(AssetAmount(amount, 'BTC'),
+                                                                             AssetAmount(30, 'MB')))
+                  for amount in (10, 20)]
+        for block in blocks * 5:
+            overlay.received_block(block)
+        self.assertEqual(processed, blocks)
+        stats = overlay.get_seen_blocks_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (8, 2, 0.8))
+
+    def test_seen_blocks_not_processed(self):
+        """
+        Test whether a block is not remembered as processed when it is rejected or its processing fails
+        """
+        overlay = self.nodes[0].overlay
+        tick_block = TestMarketCommunitySingle.get_tick_block(True, AssetPair(AssetAmount(30, 'BTC'),
+                                                                             AssetAmount(30, 'MB')))
+        tick_block.transaction['version'] = MarketCommunity.PROTOCOL_VERSION + 1
+        overlay.received_block(tick_block)
+        self.assertFalse(overlay.seen_blocks.get(tick_block.hash))
+
+        tx_done = TestMarketCommunitySingle.get_tx_done_block(10, 3, 3, 3, 3)
+        overlay.process_tx_done_block = lambda _: 1 / 0
+        self.assertRaises(ZeroDivisionError, overlay.received_block, tx_done)
+        self.assertFalse(overlay.seen_blocks.get(tx_done.hash))
+
     def test_tx_done_block_new(self):
         """
         Test whether receiving a tx_done block, update the entries in the order book correctly
@@ -1,8 +1,11 @@
 import os
 
+from ipv8.attestation.trustchain.database import TrustChainDB
+from ipv8.test.attestation.trustchain.test_block import TestBlock
+
 from anydex.core.assetamount import AssetAmount
 from anydex.core.assetpair import AssetPair
-from anydex.core.database import LATEST_DB_VERSION, MarketDB
+from anydex.core.database import LATEST_DB_VERSION, MAX_QUERY_PARAMETERS, MarketDB, get_blocks_with_hashes
 from anydex.core.message import TraderId
 from anydex.core.order import Order, OrderId, OrderNumber
 from anydex.core.payment import Payment
@@ -62,6 +65,34 @@ class TestDatabase(AbstractServer):
         self.assertEqual(assets.first.asset_id, "BTC")
         self.assertEqual(assets.second.asset_id, "EUR")
 
+    def test_update_order(self):
+        """
+        Test updating an order that is already in the database
+        """
+        self.database.add_order(self.order2)
+        self.order2.release_quantity_for_tick(self.order_id1, 3)
+        self.order2.cancel()
+        self.database.add_order(self.order2)
+
+        orders = self.database.get_all_orders()
+        self.assertEqual(len(orders), 1)
+        self.assertFalse(orders[0].is_valid())
+        self.assertEqual(orders[0].reserved_quantity, 0)
+        self.assertFalse(self.database.get_reserved_ticks(self.order_id2))
+
+    def test_get_all_orders_reserved_ticks(self):
+        """
+        Test whether all orders are retrieved with their own reserved ticks
+        """
+        self.order1.reserve_quantity_for_tick(self.order_id2, 2)
+        self.database.add_order(self.order1)
+        self.database.add_order(self.order2)
+
+        orders = {order.order_id: order for order in self.database.get_all_orders()}
+        self.assertEqual(orders[self.order_id1].reserved_quantity, 2)
+        self.assertEqual(orders[self.order_id2].reserved_quantity, 3)
+        self.assertEqual(list(orders[self.order_id2].reserved_ticks.keys()), [self.order_id1])
+
     def test_get_specific_order(self):
         """
         Test the retrieval of a specific order
@@ -111,6 +142,68 @@ class TestDatabase(AbstractServer):
         self.assertEqual(assets.first.asset_id, "BTC")
         self.assertEqual(assets.second.asset_id, "MB")
 
+    def test_update_transaction(self):
+        """
+        Test updating a transaction that is already in the database
+        """
+        self.database.add_transaction(self.transaction1)
+        self.transaction1.sent_wallet_info = True
+        self.transaction1.add_payment(Payment(TraderId(b'0' * 20), self.transaction_id1, AssetAmount(3, 'MB'),
+                                              WalletAddress('abc'), WalletAddress('def'), PaymentId("def"),
+                                              Timestamp(20001)))
+        self.database.add_transaction(self.transaction1)
+
+        transactions = self.database.get_all_transactions()
+        self.assertEqual(len(transactions), 1)
+        self.assertTrue(transactions[0].sent_wallet_info)
+        self.assertEqual(len(self.database.get_payments(self.transaction_id1)), 2)
+
+    def test_grouped_writes(self):
+        """
+        Test whether writes in a database block are committed once, at the end of the block
+        """
+        with self.database:
+            self.database.add_order(self.order1)
+            self.database.add_transaction(self.transaction1)
+            self.assertTrue(self.database._connection.in_transaction)
+        self.assertFalse(self.database._connection.in_transaction)
+        self.assertEqual(len(self.database.get_all_orders()), 1)
+
+    def test_get_all_transactions_payments(self):
+        """
+        Test whether all transactions are retrieved with their own payments, ordered on timestamp
+        """
+        transaction_id2 = TransactionId(b'b' * 32)
+        transaction2 = Transaction(transaction_id2, AssetPair(AssetAmount(100, 'BTC'), AssetAmount(30, 'MB')),
+                                   OrderId(TraderId(b'0' * 20), OrderNumber(3)),
+                                   OrderId(TraderId(b'1' * 20), OrderNumber(4)), Timestamp(20000))
+        self.transaction1.add_payment(Payment(TraderId(b'0' * 20), self.transaction_id1, AssetAmount(3, 'MB'),
+                                              WalletAddress('abc'), WalletAddress('def'), PaymentId("ghi"),
+                                              Timestamp(10000)))
+        self.database.add_transaction(self.transaction1)
+        self.database.add_transaction(transaction2)
+
+        transactions = {transaction.transaction_id: transaction
+                        for transaction in self.database.get_all_transactions()}
+        self.assertEqual(len(transactions), 2)
+        self.assertFalse(transactions[transaction_id2].payments)
+        payments = transactions[self.transaction_id1].payments
+        self.assertEqual([payment.timestamp for payment in payments], [Timestamp(10000), Timestamp(20000)])
+
+    def test_indices(self):
+        """
+        Test whether the payments can be looked up by transaction id using an index
+        """
+        plan = list(self.database.execute(u"EXPLAIN QUERY PLAN SELECT * FROM payments WHERE transaction_id = ?",
+                                          (b'a' * 32,)))
+        self.assertIn(b"payments_transaction_id", b" ".join(row[-1] for row in plan))
+
+    def test_journal_mode(self):
+        """
+        Test whether the database uses write-ahead logging
+        """
+        self.assertEqual(next(self.database.execute(u"PRAGMA journal_mode"))[0], b"wal")
+
     def test_insert_or_update_transaction(self):
         """
         Test the conditional insertion or update of a transaction in the database
@@ -196,4 +289,20 @@ class TestDatabase(AbstractServer):
         self.database.execute(u"DROP TABLE ticks;")
         self.database.execute(u"CREATE TABLE orders(x INTEGER PRIMARY KEY ASC);")
         self.database.execute(u"CREATE TABLE ticks(x INTEGER PRIMARY KEY ASC);")
-        self.assertEqual(self.database.check_database(b"1"), 5)
+        self.assertEqual(self.database.check_database(b"1"), 6)
+
+    def test_get_blocks_with_hashes(self):
+        """
+        Test fetching blocks with their hashes, in multiple queries if there are many hashes
+        """
+        trustchain_database = TrustChainDB(self.getStateDir(), 'trustchain')
+        blocks = [TestBlock() for _ in range(3)]
+        for block in blocks[:2]:
+            trustchain_database.add_block(block)
+
+        hashes = [block.hash for block in blocks] + [b'a' * 32] * MAX_QUERY_PARAMETERS
+        found = get_blocks_with_hashes(trustchain_database, hashes)
+        self.assertEqual(set(found.keys()), {blocks[0].hash, blocks[1].hash})
+        self.assertEqual(found[blocks[0].hash].transaction, blocks[0].transaction)
+        self.assertEqual(get_blocks_with_hashes(trustchain_database, []), {})
+        trustchain_database.close()
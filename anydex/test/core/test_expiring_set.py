@@ -0,0 +1,66 @@
+import unittest
+
+from anydex.core.expiring_set import ExpiringSet
+
+
+class TestExpiringSet(unittest.TestCase):
+    """
+    This class contains tests for the ExpiringSet object.
+    """
+
+    def setUp(self):
+        self.time = 0
+        self.expiring_set = ExpiringSet(100, num_generations=10, get_time=lambda: self.time)
+
+    def test_add_contains(self):
+        """
+        Test adding items to the set
+        """
+        self.expiring_set.add(1)
+        self.expiring_set.add(2)
+        self.expiring_set.add(2)
+        self.assertIn(1, self.expiring_set)
+        self.assertNotIn(3, self.expiring_set)
+        self.assertEqual(len(self.expiring_set), 2)
+        self.assertEqual(set(self.expiring_set), {1, 2})
+
+    def test_expire(self):
+        """
+        Test whether items are kept for at least the lifetime and at most one generation longer
+        """
+        self.expiring_set.add(1)
+        self.time = 5
+        self.expiring_set.add(2)
+        self.time = 99
+        self.assertIn(1, self.expiring_set)
+        self.time = 105
+        self.assertIn(2, self.expiring_set)
+        self.time = 110
+        self.assertNotIn(1, self.expiring_set)
+        self.assertNotIn(2, self.expiring_set)
+        self.assertEqual(self.expiring_set.get_stats(), {"size": 0, "generations": 0, "added": 2, "expired": 2})
+
+    def test_add_again(self):
+        """
+        Test whether adding an item again extends its lifetime
+        """
+        self.expiring_set.add(1)
+        self.time = 50
+        self.expiring_set.add(1)
+        self.time = 120
+        self.assertIn(1, self.expiring_set)
+        self.time = 160
+        self.assertNotIn(1, self.expiring_set)
+        self.assertEqual(self.expiring_set.get_stats()["added"], 1)
+
+    def test_remove(self):
+        """
+        Test removing items from the set, also when they have already expired
+        """
+        self.expiring_set.add(1)
+        self.expiring_set.remove(1)
+        self.assertNotIn(1, self.expiring_set)
+        self.expiring_set.add(2)
+        self.time = 200
+        self.expiring_set.remove(2)
+        self.assertFalse(self.expiring_set)
@@ -0,0 +1,137 @@
+import unittest
+
+from anydex.core.iblt import IBLT, NUM_STRATA, STRATUM_SIZE, StrataEstimator, get_key, get_partition
+
+
+class TestIBLT(unittest.TestCase):
+    """
+    This class contains tests for the IBLT object.
+    """
+
+    def setUp(self):
+        self.keys = [get_key(b'%d' % i) for i in range(1000)]
+
+    def create_table(self, size, keys):
+        table = IBLT(size)
+        for key in keys:
+            table.insert(key)
+        return table
+
+    def create_estimator(self, keys):
+        estimator = StrataEstimator()
+        for key in keys:
+            estimator.insert(key)
+        return estimator
+
+    def test_decode_difference(self):
+        """
+        Test listing the symmetric difference of two large sets with a small table
+        """
+        table1 = self.create_table(16, self.keys[:990])
+        table2 = self.create_table(16, self.keys[5:])
+        self.assertEqual(table1.subtract(table2).decode(), (set(self.keys[:5]), set(self.keys[990:])))
+
+    def test_decode_too_large(self):
+        """
+        Test whether decoding fails when the difference is too large for the table
+        """
+        table1 = self.create_table(4, self.keys[:500])
+        table2 = self.create_table(4, self.keys[500:])
+        self.assertIsNone(table1.subtract(table2).decode())
+
+    def test_remove(self):
+        """
+        Test removing keys from a table
+        """
+        table1 = self.create_table(16, self.keys)
+        for key in self.keys[10:]:
+            table1.remove(key)
+        self.assertEqual(table1.decode(), (set(self.keys[:10]), set()))
+
+    def test_fold(self):
+        """
+        Test whether a folded table equals a table that is built with the smaller size
+        """
+        folded = self.create_table(64, self.keys).fold(8)
+        table = self.create_table(8, self.keys)
+        self.assertEqual(folded.to_bytes(), table.to_bytes())
+
+    def test_serialization(self):
+        """
+        Test serialising and restoring a table
+        """
+        table = self.create_table(16, self.keys[:10])
+        restored = IBLT.from_bytes(16, table.to_bytes())
+        self.assertEqual(restored.decode(), (set(self.keys[:10]), set()))
+        self.assertRaises(ValueError, IBLT.from_bytes, 16, table.to_bytes()[:-1])
+        self.assertRaises(ValueError, IBLT.from_bytes, 15, table.to_bytes())
+
+    def test_decode_crafted_table(self):
+        """
+        Test whether decoding a table in which a key is only hashed to some of its cells terminates
+        """
+        key = self.keys[0]
+        table = self.create_table(4, [key])
+        for cell in range(4, 12):
+            table.counts[cell], table.key_sums[cell], table.check_sums[cell] = 0, 0, 0
+        restored = IBLT.from_bytes(4, table.to_bytes())
+        self.assertIsNone(restored.decode())
+
+    def test_deserialize_invalid_counts(self):
+        """
+        Test whether tables with counts that a set of keys cannot have are rejected
+        """
+        table = self.create_table(4, self.keys[:10])
+        table.counts[0] = -1
+        self.assertRaises(ValueError, IBLT.from_bytes, 4, table.to_bytes())
+        table.counts[0] = 11
+        self.assertRaises(ValueError, IBLT.from_bytes, 4, table.to_bytes(), 10)
+        table.counts[0] = 0
+        table.key_sums[0] = 1
+        self.assertRaises(ValueError, IBLT.from_bytes, 4, table.to_bytes())
+
+    def test_add(self):
+        """
+        Test whether adding two tables equals a table that is built with the keys of both
+        """
+        table = self.create_table(16, self.keys[:500])
+        table.add(self.create_table(16, self.keys[500:]))
+        self.assertEqual(table.to_bytes(), self.create_table(16, self.keys).to_bytes())
+
+    def test_get_partition(self):
+        """
+        Test whether the partitions of the key space are equal and nested
+        """
+        self.assertEqual(get_partition(0, 4), 0)
+        self.assertEqual(get_partition(2 ** 62, 4), 1)
+        self.assertEqual(get_partition(2 ** 64 - 1, 4), 3)
+        for key in self.keys[:100]:
+            self.assertEqual(get_partition(key, 2), get_partition(key, 8) // 4)
+
+    def test_estimate_difference(self):
+        """
+        Test estimating the size of the symmetric difference of two sets
+        """
+        estimator = self.create_estimator(self.keys[:900])
+        self.assertEqual(estimator.estimate_difference(self.create_estimator(self.keys[:900])), 0)
+        estimate = estimator.estimate_difference(self.create_estimator(self.keys[100:]))
+        self.assertLessEqual(50, estimate)
+        self.assertLessEqual(estimate, 400)
+
+    def test_estimate_difference_too_large(self):
+        """
+        Test whether the estimate fails if even the smallest stratum of the difference cannot be decoded
+        """
+        many_keys = [get_key(b'many %d' % i) for i in range(20000)]
+        self.assertIsNone(self.create_estimator(many_keys).estimate_difference(StrataEstimator()))
+
+    def test_estimator_serialization(self):
+        """
+        Test serialising and restoring a strata estimator
+        """
+        data = self.create_estimator(self.keys[:100]).to_bytes()
+        self.assertEqual(len(data), NUM_STRATA * len(IBLT(STRATUM_SIZE).to_bytes()))
+        restored = StrataEstimator.from_bytes(data)
+        self.assertEqual(restored.estimate_difference(self.create_estimator(self.keys[:100])), 0)
+        self.assertRaises(ValueError, StrataEstimator.from_bytes, data[:-1])
+        self.assertRaises(ValueError, StrataEstimator.from_bytes, b'')
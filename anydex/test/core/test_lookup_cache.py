@@ -0,0 +1,93 @@
+from asyncio import Future, gather, sleep
+
+from anydex.core.lookup_cache import LookupCache
+from anydex.test.base import AbstractServer
+
+
+class TestLookupCache(AbstractServer):
+    """
+    This class contains tests for the LookupCache object.
+    """
+
+    async def setUp(self):
+        super(TestLookupCache, self).setUp()
+        self.time = 0
+        self.cache = LookupCache(2, 100, 10, get_time=lambda: self.time)
+        self.lookups = []
+
+    def lookup_func(self, value):
+        async def lookup():
+            self.lookups.append(value)
+            await sleep(0.01)
+            return value
+        return lookup
+
+    def test_get_put(self):
+        """
+        Test caching values until their time to live has passed
+        """
+        self.cache['a'] = 1
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIn('a', self.cache)
+        self.time = 100
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+        self.assertEqual(self.cache.get_stats()["misses"], 1)
+
+    def test_get_refresh(self):
+        """
+        Test whether getting a value can restart its time to live
+        """
+        self.cache['a'] = 1
+        self.time = 90
+        self.assertEqual(self.cache.get('a', refresh=True), 1)
+        self.time = 150
+        self.assertEqual(self.cache.get('a'), 1)
+        self.time = 190
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_evict(self):
+        """
+        Test whether the least recently used entry is evicted when the cache is full
+        """
+        self.cache['a'] = 1
+        self.cache['b'] = 2
+        self.cache.get('a')
+        self.cache['c'] = 3
+        self.assertIn('a', self.cache)
+        self.assertNotIn('b', self.cache)
+        self.assertEqual(self.cache.get_stats()["evictions"], 1)
+
+    async def test_lookup_coalesce(self):
+        """
+        Test whether concurrent lookups of the same key result in a single lookup
+        """
+        results = await gather(self.cache.lookup('a', self.lookup_func(1)), self.cache.lookup('a', self.lookup_func(2)))
+        self.assertEqual(results, [1, 1])
+        self.assertEqual(self.lookups, [1])
+        self.assertEqual(await self.cache.lookup('a', self.lookup_func(3)), 1)
+        self.assertEqual(self.lookups, [1])
+        stats = self.cache.get_stats()
+        self.assertEqual((stats["misses"], stats["coalesced"], stats["hits"]), (1, 1, 1))
+
+    async def test_lookup_negative(self):
+        """
+        Test whether failed lookups are cached for a shorter time
+        """
+        self.assertIsNone(await self.cache.lookup('a', self.lookup_func(None)))
+        self.assertIsNone(await self.cache.lookup('a', self.lookup_func(1)))
+        self.assertEqual(self.cache.get_stats()["negative_hits"], 1)
+        self.time = 10
+        self.assertEqual(await self.cache.lookup('a', self.lookup_func(1)), 1)
+        self.assertEqual(self.lookups, [None, 1])
+
+    async def test_lookup_cancel(self):
+        """
+        Test whether cancelling one of the callers does not cancel the shared lookup
+        """
+        future = Future()
+        first = self.cache.lookup('a', lambda: future)
+        second = self.cache.lookup('a', lambda: future)
+        first.cancel()
+        future.set_result(1)
+        self.assertEqual(await second, 1)
@@ -62,4 +62,43 @@ class TestMatchQueue(unittest.TestCase):
         item3 = self.queue.delete()
         self.assertEqual(item1[1], Price(1, 3, 'DUM1', 'DUM2'))
         self.assertEqual(item2[1], Price(1, 2, 'DUM1', 'DUM2'))
-        self.assertEqual(item3[1], Price(1, 1, 'DUM1', 'DUM2'))
\ No newline at end of file
+        self.assertEqual(item3[1], Price(1, 1, 'DUM1', 'DUM2'))
+
+    def test_contains_remove(self):
+        """
+        Test checking for and removing the entries of an order in the queue
+        """
+        order_id1 = OrderId(TraderId(b'1' * 20), OrderNumber(1))
+        order_id2 = OrderId(TraderId(b'2' * 20), OrderNumber(1))
+        self.assertTrue(self.queue.is_empty())
+        self.queue.insert(0, Price(1, 1, 'DUM1', 'DUM2'), order_id1)
+        self.queue.insert(1, Price(1, 1, 'DUM1', 'DUM2'), order_id1)
+        self.queue.insert(0, Price(1, 2, 'DUM1', 'DUM2'), order_id2)
+        self.assertTrue(self.queue.contains_order(order_id1))
+        self.assertEqual(len(self.queue), 3)
+
+        self.queue.remove_order(order_id1)
+        self.assertFalse(self.queue.contains_order(order_id1))
+        self.assertEqual(len(self.queue), 1)
+        self.assertEqual(self.queue.delete()[2], order_id2)
+        self.assertFalse(self.queue.contains_order(order_id2))
+        self.assertIsNone(self.queue.delete())
+        self.assertTrue(self.queue.is_empty())
+
+    def test_delete_remove_entries_of_order(self):
+        """
+        Test removing an order after some of its entries have been handed out
+        """
+        order_id1 = OrderId(TraderId(b'1' * 20), OrderNumber(1))
+        order_id2 = OrderId(TraderId(b'2' * 20), OrderNumber(1))
+        self.queue.insert(0, Price(3, 2, 'DUM1', 'DUM2'), order_id1)
+        self.queue.insert(0, Price(1, 1, 'DUM1', 'DUM2'), order_id1)
+        self.queue.insert(0, Price(2, 2, 'DUM1', 'DUM2'), order_id2)
+
+        self.assertEqual(self.queue.delete(), (0, Price(3, 2, 'DUM1', 'DUM2'), order_id1))
+        self.assertTrue(self.queue.contains_order(order_id1))
+        self.queue.remove_order(order_id1)
+        self.assertEqual(len(self.queue), 1)
+        self.assertEqual(self.queue.items(), [(0, Price(1, 1, 'DUM1', 'DUM2'), order_id2)])
+        self.assertEqual(self.queue.delete(), (0, Price(1, 1, 'DUM1', 'DUM2'), order_id2))
+        self.assertTrue(self.queue.is_empty())
@@ -289,3 +289,52 @@ class MatchingEngineTestSuite(AbstractServer):
         self.order_book.insert_ask(my_ask)
         matching_ticks = self.matching_engine.match(self.order_book.get_ask(my_ask.order_id))
         self.assertEqual(len(matching_ticks), 1)
+
+    def test_match_batch(self):
+        """
+        Test matching a batch of tick entries
+        """
+        self.order_book.insert_bid(self.create_bid(10, 60))
+        self.order_book.insert_bid(self.create_bid(10, 50))
+        my_ask = self.create_ask(30, 180)
+        self.order_book.insert_ask(my_ask)
+        my_ask_entry = self.order_book.get_ask(my_ask.order_id)
+        matches = self.matching_engine.match_batch([my_ask_entry, my_ask_entry])
+        self.assertEqual(len(matches), 1)
+        self.assertEqual(matches[0][0], my_ask_entry)
+        self.assertEqual(len(matches[0][1]), 1)
+
+    def test_match_batch_order(self):
+        """
+        Test whether a tick entry in a batch is not matched with the tick entries that come after it
+        """
+        ask = self.create_ask(10, 50)
+        self.order_book.insert_ask(ask)
+        bid = self.create_bid(10, 50)
+        self.order_book.insert_bid(bid)
+        ask_entry = self.order_book.get_ask(ask.order_id)
+        bid_entry = self.order_book.get_bid(bid.order_id)
+
+        matches = self.matching_engine.match_batch([ask_entry, bid_entry])
+        self.assertEqual(matches, [(bid_entry, [ask_entry])])
+
+        low_bid = self.create_bid(10, 40)  # Does not cross the ask
+        self.order_book.insert_bid(low_bid)
+        self.assertEqual(self.matching_engine.match_batch([self.order_book.get_bid(low_bid.order_id)]), [])
+
+    def test_match_batch_later_tick(self):
+        """
+        Test whether a tick entry later in a batch does not use up the quantity of a tick entry before it
+        """
+        old_bid = self.create_bid(10, 50)
+        self.order_book.insert_bid(old_bid)
+        ask = self.create_ask(10, 50)
+        self.order_book.insert_ask(ask)
+        new_bid = self.create_bid(10, 60)  # Has a better price than the old bid
+        self.order_book.insert_bid(new_bid)
+        old_bid_entry = self.order_book.get_bid(old_bid.order_id)
+        ask_entry = self.order_book.get_ask(ask.order_id)
+        new_bid_entry = self.order_book.get_bid(new_bid.order_id)
+
+        matches = self.matching_engine.match_batch([ask_entry, new_bid_entry])
+        self.assertEqual(matches, [(ask_entry, [old_bid_entry]), (new_bid_entry, [ask_entry])])
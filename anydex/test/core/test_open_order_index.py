@@ -0,0 +1,67 @@
+import unittest
+
+from anydex.core.assetamount import AssetAmount
+from anydex.core.assetpair import AssetPair
+from anydex.core.message import TraderId
+from anydex.core.open_order_index import OpenOrderIndex
+from anydex.core.order import Order, OrderId, OrderNumber
+from anydex.core.price import Price
+from anydex.core.timeout import Timeout
+from anydex.core.timestamp import Timestamp
+
+
+class OpenOrderIndexTestSuite(unittest.TestCase):
+    """OpenOrderIndex test cases."""
+
+    def setUp(self):
+        # Object creation
+        self.open_order_index = OpenOrderIndex()
+        self.ask = self.create_order(1, 100, 200, True)
+        self.ask2 = self.create_order(2, 100, 300, True)
+        self.bid = self.create_order(3, 100, 200, False)
+        self.bid2 = self.create_order(4, 100, 300, False)
+        self.other_bid = self.create_order(5, 100, 300, False, 'DUM1')
+        for order in [self.ask, self.ask2, self.bid, self.bid2, self.other_bid]:
+            self.open_order_index.update(order)
+
+    def create_order(self, order_number, first_amount, second_amount, is_ask, first_type='BTC', timeout=3600):
+        return Order(OrderId(TraderId(b'0' * 20), OrderNumber(order_number)),
+                     AssetPair(AssetAmount(first_amount, first_type), AssetAmount(second_amount, 'MB')),
+                     Timeout(timeout), Timestamp.now(), is_ask)
+
+    def test_update(self):
+        """
+        Test adding and updating orders in the index
+        """
+        self.assertEqual(len(self.open_order_index), 5)
+        self.assertIn(self.ask.order_id, self.open_order_index)
+
+        self.ask.cancel()
+        self.open_order_index.update(self.ask)
+        self.assertEqual(len(self.open_order_index), 4)
+        self.assertNotIn(self.ask.order_id, self.open_order_index)
+
+        self.open_order_index.update(self.create_order(6, 100, 200, False, timeout=0))
+        self.assertEqual(len(self.open_order_index), 4)
+
+    def test_remove(self):
+        """
+        Test removing orders from the index
+        """
+        self.open_order_index.remove(self.bid.order_id)
+        self.open_order_index.remove(self.bid.order_id)
+        self.assertEqual(len(self.open_order_index), 4)
+        self.assertEqual(self.open_order_index.find_crossing(Price(1, 1, 'MB', 'BTC'), True), [self.bid2])
+
+    def test_find_crossing(self):
+        """
+        Test finding the orders that can be crossed by a tick
+        """
+        self.assertEqual(self.open_order_index.find_crossing(Price(1, 1, 'MB', 'BTC'), True), [self.bid, self.bid2])
+        self.assertEqual(self.open_order_index.find_crossing(Price(2, 1, 'MB', 'BTC'), True), [self.bid, self.bid2])
+        self.assertEqual(self.open_order_index.find_crossing(Price(3, 1, 'MB', 'BTC'), True), [self.bid2])
+        self.assertEqual(self.open_order_index.find_crossing(Price(4, 1, 'MB', 'BTC'), True), [])
+        self.assertEqual(self.open_order_index.find_crossing(Price(1, 1, 'MB', 'BTC'), False), [])
+        self.assertEqual(self.open_order_index.find_crossing(Price(3, 1, 'MB', 'BTC'), False), [self.ask, self.ask2])
+        self.assertEqual(self.open_order_index.find_crossing(Price(3, 1, 'MB', 'DUM1'), True), [self.other_bid])
+        self.assertEqual(self.open_order_index.find_crossing(Price(3, 1, 'MB', 'DUM2'), True), [])
@@ -1,12 +1,15 @@
+import os
 import unittest
 
 from anydex.core.assetamount import AssetAmount
 from anydex.core.assetpair import AssetPair
+from anydex.core.database import MarketDB
 from anydex.core.message import TraderId
 from anydex.core.order import Order, OrderId, OrderNumber
-from anydex.core.order_repository import MemoryOrderRepository
+from anydex.core.order_repository import DatabaseOrderRepository, MemoryOrderRepository
 from anydex.core.timeout import Timeout
 from anydex.core.timestamp import Timestamp
+from anydex.test.base import AbstractServer
 
 
 class MemoryOrderRepositoryTestSuite(unittest.TestCase):
@@ -57,3 +60,71 @@ class MemoryOrderRepositoryTestSuite(unittest.TestCase):
         self.memory_order_repository.update(self.order2)
         self.assertNotEqual(self.order, self.memory_order_repository.find_by_id(self.order_id))
         self.assertEqual(self.order2, self.memory_order_repository.find_by_id(self.order_id))
+
+    def test_open_orders(self):
+        # Test whether the index of open orders is kept up to date
+        order = Order(OrderId(TraderId(b'0' * 20), OrderNumber(2)),
+                      AssetPair(AssetAmount(100, 'BTC'), AssetAmount(30, 'MC')), Timeout(3600), Timestamp.now(), False)
+        self.memory_order_repository.add(self.order)
+        self.memory_order_repository.add(order)
+        self.assertNotIn(self.order.order_id, self.memory_order_repository.open_orders)
+        self.assertIn(order.order_id, self.memory_order_repository.open_orders)
+
+        order.cancel()
+        self.memory_order_repository.update(order)
+        self.assertNotIn(order.order_id, self.memory_order_repository.open_orders)
+
+
+class DatabaseOrderRepositoryTestSuite(AbstractServer):
+    """Database order repository test cases."""
+
+    async def setUp(self):
+        super(DatabaseOrderRepositoryTestSuite, self).setUp()
+
+        path = os.path.join(self.getStateDir(), 'sqlite')
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        self.database = MarketDB(self.getStateDir(), 'market')
+        self.database_order_repository = DatabaseOrderRepository(b'0' * 20, self.database)
+        self.order = Order(self.database_order_repository.next_identity(),
+                           AssetPair(AssetAmount(100, 'BTC'), AssetAmount(30, 'MC')),
+                           Timeout(3600), Timestamp.now(), False)
+
+    async def tearDown(self):
+        self.database_order_repository.flush()
+        self.database.close()
+        await super(DatabaseOrderRepositoryTestSuite, self).tearDown()
+
+    def test_identity(self):
+        # Test whether the same order object is returned for an order id
+        self.database_order_repository.add(self.order)
+        self.assertIs(self.order, self.database_order_repository.find_by_id(self.order.order_id))
+        self.assertEqual([self.order], list(self.database_order_repository.find_all()))
+
+    def test_write_back(self):
+        # Test whether changes are only written to the database when they are flushed
+        self.database_order_repository.add(self.order)
+        self.assertIsNone(self.database.get_order(self.order.order_id))
+
+        self.database_order_repository.flush()
+        self.assertIsNotNone(self.database.get_order(self.order.order_id))
+
+        self.order.reserve_quantity_for_tick(OrderId(TraderId(b'1' * 20), OrderNumber(1)), 10)
+        self.database_order_repository.update(self.order)
+        self.database_order_repository.flush()
+        self.assertEqual(self.database.get_order(self.order.order_id).reserved_quantity, 10)
+
+        self.database_order_repository.delete_by_id(self.order.order_id)
+        self.assertIsNone(self.database_order_repository.find_by_id(self.order.order_id))
+        self.database_order_repository.flush()
+        self.assertIsNone(self.database.get_order(self.order.order_id))
+
+    def test_restore(self):
+        # Test whether the orders in the database are loaded when the repository is created
+        self.database_order_repository.add(self.order)
+        self.database_order_repository.flush()
+        database_order_repository = DatabaseOrderRepository(b'0' * 20, self.database)
+        self.assertEqual(self.order.order_id, database_order_repository.find_by_id(self.order.order_id).order_id)
+        self.assertIn(self.order.order_id, database_order_repository.open_orders)
+        self.assertEqual(OrderNumber(2), database_order_repository.next_identity().order_number)
@@ -1,8 +1,14 @@
+import os
+import time
+from unittest.mock import patch
+
 from anydex.core.assetamount import AssetAmount
 from anydex.core.assetpair import AssetPair
+from anydex.core.database import MarketDB
+from anydex.core.iblt import StrataEstimator, get_key, get_partition
 from anydex.core.message import TraderId
 from anydex.core.order import OrderId, OrderNumber
-from anydex.core.orderbook import OrderBook
+from anydex.core.orderbook import DatabaseOrderBook, OrderBook
 from anydex.core.price import Price
 from anydex.core.tick import Ask, Bid
 from anydex.core.timeout import Timeout
@@ -149,6 +155,139 @@ class TestOrderBook(AbstractTestOrderBook):
         self.order_book.insert_bid(self.bid)
         self.assertEqual(len(self.order_book.get_order_ids()), 2)
 
+    def test_block_for_matching(self):
+        """
+        Test whether an order id that is blocked for matching with a tick is unblocked again after some time
+        """
+        self.order_book.insert_ask(self.ask)
+        self.order_book.block_for_matching(self.ask.order_id, self.bid.order_id)
+        self.order_book.block_for_matching(self.bid.order_id, self.ask.order_id)  # Tick not in the order book
+        tick_entry = self.order_book.get_ask(self.ask.order_id)
+        self.assertTrue(tick_entry.is_blocked_for_matching(self.bid.order_id))
+
+        self.order_book.process_timeouts()
+        self.assertTrue(tick_entry.is_blocked_for_matching(self.bid.order_id))
+
+        self.order_book.BLOCK_FOR_MATCHING_DURATION = 0
+        self.order_book.block_for_matching(self.ask.order_id, self.bid2.order_id)
+        self.order_book.process_timeouts()
+        self.assertTrue(tick_entry.is_blocked_for_matching(self.bid.order_id))
+        self.assertFalse(tick_entry.is_blocked_for_matching(self.bid2.order_id))
+
+    def test_process_timeouts(self):
+        """
+        Test whether ticks are removed from the order book once they time out
+        """
+        self.order_book.insert_ask(self.ask)
+        self.order_book.insert_bid(self.bid)
+        self.order_book.process_timeouts()
+        self.assertTrue(self.order_book.tick_exists(self.ask.order_id))
+        self.assertTrue(self.order_book.tick_exists(self.bid.order_id))
+
+        # Re-insert the ask with a later timeout, the expiration of the old ask should not remove the new one
+        self.order_book.remove_tick(self.ask.order_id)
+        new_ask = Ask(self.ask.order_id, self.ask.assets, Timeout(1000), Timestamp.now())
+        self.order_book.insert_ask(new_ask)
+
+        now = time.time()
+        with patch('time.time', lambda: now + 200):
+            self.order_book.process_timeouts()
+        self.assertTrue(self.order_book.tick_exists(self.ask.order_id))
+        self.assertFalse(self.order_book.tick_exists(self.bid.order_id))
+
+        with patch('time.time', lambda: now + 2000):
+            self.order_book.process_timeouts()
+        self.assertFalse(self.order_book.tick_exists(self.ask.order_id))
+
+    def test_bloomfilter(self):
+        """
+        Test whether the Bloom filter of the order ids is updated as ticks are inserted, and rebuilt after removals
+        """
+        self.order_book.insert_ask(self.ask)
+        bloomfilter = self.order_book.get_bloomfilter()
+        self.assertIn(bytes(self.ask.order_id), bloomfilter)
+        self.assertNotIn(bytes(self.bid.order_id), bloomfilter)
+
+        self.order_book.insert_bid(self.bid)
+        self.assertIs(self.order_book.get_bloomfilter(), bloomfilter)
+        self.assertIn(bytes(self.bid.order_id), bloomfilter)
+
+        self.order_book.remove_tick(self.ask.order_id)
+        bloomfilter = self.order_book.get_bloomfilter()
+        self.assertNotIn(bytes(self.ask.order_id), bloomfilter)
+        self.assertIn(bytes(self.bid.order_id), bloomfilter)
+
+    def test_bloomfilter_error_rate(self):
+        """
+        Test whether the Bloom filter of the order ids is rebuilt when its false positive rate becomes too high
+        """
+        bloomfilter = self.order_book.get_bloomfilter()
+        for order_number in range(1, 100):
+            self.order_book.insert_ask(Ask(OrderId(TraderId(b'3' * 20), OrderNumber(order_number)), self.ask.assets,
+                                           Timeout(100), Timestamp.now()))
+            if self.order_book.get_bloomfilter_error_rate() > OrderBook.BLOOMFILTER_MAX_ERROR_RATE:
+                break
+        else:
+            self.fail("The false positive rate of the Bloom filter should have been exceeded")
+
+        self.assertIsNot(self.order_book.get_bloomfilter(), bloomfilter)
+        self.assertLessEqual(self.order_book.get_bloomfilter_error_rate(), OrderBook.BLOOMFILTER_ERROR_RATE)
+
+    def test_reconciliation_table(self):
+        """
+        Test whether the reconciliation table of the order ids is updated as ticks are inserted and removed
+        """
+        self.order_book.insert_ask(self.ask)
+        self.order_book.get_reconciliation_table(OrderBook.RECONCILIATION_TABLE_SIZE)
+        self.order_book.insert_bid(self.bid)
+        self.order_book.remove_tick(self.ask.order_id)
+
+        ask_key = get_key(bytes(self.ask.order_id))
+        bid_key = get_key(bytes(self.bid.order_id))
+        self.assertEqual(self.order_book.get_reconciliation_table(4).decode(), ({bid_key}, set()))
+        self.assertEqual(self.order_book.get_order_id_for_key(bid_key), self.bid.order_id)
+        self.assertIsNone(self.order_book.get_order_id_for_key(ask_key))
+        self.assertEqual(self.order_book.get_reconciliation_estimator().estimate_difference(StrataEstimator()), 1)
+
+    def test_reconciliation_partitions(self):
+        """
+        Test whether the reconciliation tables of the partitions of the key space hold the keys of these partitions
+        """
+        for tick in (self.ask, self.ask2, self.bid, self.bid2):
+            (self.order_book.insert_ask if tick.is_ask() else self.order_book.insert_bid)(tick)
+        keys = {get_key(bytes(tick.order_id)) for tick in (self.ask, self.ask2, self.bid, self.bid2)}
+
+        for partition in range(4):
+            added, _ = self.order_book.get_reconciliation_table(4, partition, 4).decode()
+            self.assertEqual(added, {key for key in keys if get_partition(key, 4) == partition})
+
+    def test_reconciliation_layout(self):
+        """
+        Test the number of partitions and the size of the reconciliation tables for a difference
+        """
+        self.assertEqual(self.order_book.get_reconciliation_layout(1), (1, 1))
+        self.assertEqual(self.order_book.get_reconciliation_layout(8), (1, 16))
+        self.assertEqual(self.order_book.get_reconciliation_layout(100), (16, 16))
+        max_difference = OrderBook.RECONCILIATION_TABLE_SIZE * OrderBook.RECONCILIATION_PARTITIONS
+        self.assertEqual(self.order_book.get_reconciliation_layout(max_difference),
+                         (OrderBook.RECONCILIATION_PARTITIONS, OrderBook.RECONCILIATION_TABLE_SIZE))
+        self.assertIsNone(self.order_book.get_reconciliation_layout(max_difference + 1))
+
+    def test_get_ticks_by_distance(self):
+        """
+        Test whether the ticks are ordered on the distance of their price from the best price of their side
+        """
+        for ask in (self.ask, self.ask2):
+            self.order_book.insert_ask(ask)
+        for bid in (self.bid, self.bid2):
+            self.order_book.insert_bid(bid)
+
+        ticks = [(sync_key[0], entry.tick) for sync_key, entry in self.order_book.get_ticks_by_distance()]
+        self.assertEqual({tick for _, tick in ticks[:2]}, {self.ask2, self.bid})
+        self.assertEqual([tick for _, tick in ticks[2:]], [self.bid2, self.ask])
+        self.assertAlmostEqual(ticks[2][0], 1 / 3)
+        self.assertAlmostEqual(ticks[3][0], 3)
+
     def test_update_ticks(self):
         """
         Test updating ticks in an order book
@@ -189,3 +328,42 @@ class TestOrderBook(AbstractTestOrderBook):
                           '200 BTC\t@\t0.15 MB\n\n'
                           '------ Asks -------\n'
                           '100 BTC\t@\t0.3 MB\n\n', str(self.order_book))
+
+
+class TestDatabaseOrderBook(AbstractTestOrderBook):
+    """DatabaseOrderBook test cases."""
+
+    async def setUp(self):
+        await super(TestDatabaseOrderBook, self).setUp()
+
+        path = os.path.join(self.getStateDir(), 'sqlite')
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        self.database = MarketDB(self.getStateDir(), 'market')
+        await self.order_book.shutdown_task_manager()
+        self.order_book = DatabaseOrderBook(self.database)
+
+    async def tearDown(self):
+        self.database.close()
+        await super(TestDatabaseOrderBook, self).tearDown()
+
+    async def test_save_restore(self):
+        """
+        Test saving the order book to the database and restoring it again
+        """
+        self.order_book.insert_ask(self.ask)
+        self.order_book.insert_ask(self.ask2)
+        self.order_book.insert_bid(self.bid)
+        self.order_book.save_to_database()
+        self.order_book.save_to_database()
+
+        restored_order_book = DatabaseOrderBook(self.database)
+        restored_order_book.restore_from_database()
+        await restored_order_book.shutdown_task_manager()
+
+        self.assertEqual(len(restored_order_book.asks), 2)
+        self.assertEqual(len(restored_order_book.bids), 1)
+        self.assertEqual(restored_order_book.get_ask(self.ask.order_id).tick.assets, self.ask.assets)
+        self.assertEqual(restored_order_book.get_bid_price('MB', 'BTC'), self.bid.price)
+        self.assertEqual(len(restored_order_book._expiration_queue), 3)
@@ -34,3 +34,25 @@ class TestPrice(unittest.TestCase):
         """
         self.assertTrue(self.price1 < self.price2)
         self.assertFalse(self.price1 > self.price2)
+
+    def test_canonical(self):
+        """
+        Test whether a Price object is stored as a reduced fraction
+        """
+        self.assertEqual((self.price1.num, self.price1.denom), (2, 1))
+        self.assertEqual(hash(self.price1), hash(self.price3))
+        self.assertEqual(Price(-1, -2, 'MB', 'BTC'), Price(1, 2, 'MB', 'BTC'))
+        self.assertEqual(Price(1, -2, 'MB', 'BTC').denom, 2)
+        self.assertEqual(self.price1.amount, 2.0)
+
+    def test_cmp_exact(self):
+        """
+        Test whether prices that are equal when represented as float, are still ordered correctly
+        """
+        price1 = Price(10 ** 18, 10 ** 18 + 1, 'MB', 'BTC')
+        price2 = Price(10 ** 18 + 1, 10 ** 18 + 2, 'MB', 'BTC')
+        self.assertEqual(price1.amount, price2.amount)
+        self.assertNotEqual(price1, price2)
+        self.assertTrue(price1 < price2)
+        self.assertTrue(price2 >= price1)
+        self.assertFalse(price1 >= price2)
@@ -1,3 +1,4 @@
+import random
 import unittest
 
 from anydex.core.price import Price
@@ -100,3 +101,40 @@ class PriceLevelListTestSuite(unittest.TestCase):
     def test_items_reverse_empty(self):
         # Test for items when empty with reverse attribute
         self.assertEqual([], self.price_level_list2.items(reverse=True))
+
+    def test_len(self):
+        # Test for the number of price levels
+        self.assertEqual(4, len(self.price_level_list))
+        self.assertEqual(0, len(self.price_level_list2))
+        self.price_level_list.remove(self.price2)
+        self.assertEqual(3, len(self.price_level_list))
+
+    def test_insert_unordered(self):
+        # Test whether many price levels inserted in random order are kept sorted
+        prices = [Price(i, 1, 'BTC', 'MB') for i in range(1, 501)]
+        for price in random.sample(prices, len(prices)):
+            self.price_level_list2.insert(PriceLevel(price))
+
+        self.assertEqual(prices, [price_level.price for price_level in self.price_level_list2.items()])
+        self.assertEqual(prices[0], self.price_level_list2.min_key())
+        self.assertEqual(prices[-1], self.price_level_list2.max_key())
+        self.assertEqual(prices[251], self.price_level_list2.succ_item(prices[250]).price)
+        self.assertEqual(prices[249], self.price_level_list2.prev_item(prices[250]).price)
+
+        for price in random.sample(prices[1:-1], len(prices) - 2):
+            self.price_level_list2.remove(price)
+        self.assertEqual([prices[0], prices[-1]],
+                         [price_level.price for price_level in self.price_level_list2.items()])
+        self.assertEqual(prices[-1], self.price_level_list2.succ_item(prices[0]).price)
+        self.assertEqual(prices[0], self.price_level_list2.prev_item(prices[-1]).price)
+
+    def test_remove_min_max(self):
+        # Test whether the min and max keys are updated when removing the outer price levels
+        self.price_level_list.remove(self.price)
+        self.price_level_list.remove(self.price4)
+        self.assertEqual(self.price2, self.price_level_list.min_key())
+        self.assertEqual(self.price3, self.price_level_list.max_key())
+        with self.assertRaises(IndexError):
+            self.price_level_list.prev_item(self.price2)
+        with self.assertRaises(IndexError):
+            self.price_level_list.succ_item(self.price3)
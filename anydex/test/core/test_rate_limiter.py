@@ -0,0 +1,61 @@
+import unittest
+
+from anydex.core.rate_limiter import InboundRateLimiter
+from anydex.core.send_scheduler import PRIORITY_BROADCAST, PRIORITY_MATCH, PRIORITY_SYNC, PRIORITY_TRADE
+
+
+class TestInboundRateLimiter(unittest.TestCase):
+    """
+    This class contains tests for the InboundRateLimiter object.
+    """
+
+    def setUp(self):
+        self.time = 0
+        self.rate_limiter = InboundRateLimiter(1, 2, 1, 8, limits={"sync": (1, 1)}, get_time=lambda: self.time)
+
+    def test_rate_limit(self):
+        """
+        Test whether every peer can send a limited number of messages of every type
+        """
+        self.assertTrue(self.rate_limiter.admit("a", "match", PRIORITY_TRADE))
+        self.assertTrue(self.rate_limiter.admit("a", "match", PRIORITY_TRADE))
+        self.assertFalse(self.rate_limiter.admit("a", "match", PRIORITY_TRADE))
+        self.assertTrue(self.rate_limiter.admit("b", "match", PRIORITY_TRADE))
+        self.assertTrue(self.rate_limiter.admit("a", "sync", PRIORITY_TRADE))
+        self.assertFalse(self.rate_limiter.admit("a", "sync", PRIORITY_TRADE))
+
+        self.time = 1
+        self.assertTrue(self.rate_limiter.admit("a", "match", PRIORITY_TRADE))
+        self.assertEqual(self.rate_limiter.get_stats()["rate_limited"], {"match": 1, "sync": 1})
+
+    def test_shed(self):
+        """
+        Test whether the least urgent messages are shed first when we are overloaded
+        """
+        for peer in range(4):
+            self.assertTrue(self.rate_limiter.admit(peer, "match", PRIORITY_TRADE))
+        self.assertFalse(self.rate_limiter.admit(4, "sync", PRIORITY_SYNC))
+        self.assertFalse(self.rate_limiter.admit(4, "broadcast", PRIORITY_BROADCAST))
+        self.assertTrue(self.rate_limiter.admit(4, "match", PRIORITY_MATCH))
+        for peer in range(5, 8):
+            self.assertTrue(self.rate_limiter.admit(peer, "match", PRIORITY_TRADE))
+        self.assertFalse(self.rate_limiter.admit(8, "match", PRIORITY_TRADE))
+
+        stats = self.rate_limiter.get_stats()
+        self.assertEqual(stats["admitted"], 8)
+        self.assertEqual(stats["shed"], {"sync": 1, "broadcast": 1, "match": 1})
+
+    def test_wrap(self):
+        """
+        Test whether a wrapped handler is only called for admitted messages
+        """
+        received = []
+
+        def received_match(source_address, data):
+            received.append(data)
+
+        handler = self.rate_limiter.wrap(received_match, lambda data: PRIORITY_MATCH)
+        for data in [b'a', b'b', b'c']:
+            handler("a", data)
+        self.assertEqual(received, [b'a', b'b'])
+        self.assertEqual(self.rate_limiter.get_stats()["rate_limited"], {"received_match": 1})
@@ -0,0 +1,90 @@
+from asyncio import sleep
+
+from ipv8.requestcache import NumberCache
+
+from anydex.core.message import TraderId
+from anydex.core.order import OrderId, OrderNumber
+from anydex.core.request_cache import MarketRequestCache
+from anydex.test.base import AbstractServer
+
+
+class MockProposedTrade(object):
+
+    def __init__(self, order_id, recipient_order_id):
+        self.order_id = order_id
+        self.recipient_order_id = recipient_order_id
+
+
+class MockCache(NumberCache):
+
+    def __init__(self, request_cache, prefix, number, proposed_trade=None, timeout_delay=10.0):
+        super(MockCache, self).__init__(request_cache, prefix, number)
+        self.proposed_trade = proposed_trade
+        self._timeout_delay = timeout_delay
+        self.timed_out = False
+
+    @property
+    def timeout_delay(self):
+        return self._timeout_delay
+
+    def on_timeout(self):
+        self.timed_out = True
+
+
+class TestMarketRequestCache(AbstractServer):
+    """
+    This class contains tests for the MarketRequestCache object.
+    """
+
+    async def setUp(self):
+        super(TestMarketRequestCache, self).setUp()
+        self.request_cache = MarketRequestCache()
+        self.order_id1 = OrderId(TraderId(b'0' * 20), OrderNumber(1))
+        self.order_id2 = OrderId(TraderId(b'1' * 20), OrderNumber(1))
+        self.order_id3 = OrderId(TraderId(b'2' * 20), OrderNumber(1))
+
+    async def tearDown(self):
+        await self.request_cache.shutdown()
+        await super(TestMarketRequestCache, self).tearDown()
+
+    def test_match_caches(self):
+        """
+        Test indexing the match caches
+        """
+        match_cache = self.request_cache.add(MockCache(self.request_cache, u"match", 1))
+        self.request_cache.add(MockCache(self.request_cache, u"ping", 1))
+        self.assertEqual(self.request_cache.get_match_caches(), [match_cache])
+
+        self.request_cache.pop(u"match", 1)
+        self.assertFalse(self.request_cache.get_match_caches())
+
+    def test_proposals(self):
+        """
+        Test indexing the proposed trades on the order ids they are about
+        """
+        cache1 = self.request_cache.add(MockCache(self.request_cache, u"proposed-trade", 1,
+                                                  MockProposedTrade(self.order_id1, self.order_id2)))
+        self.request_cache.add(MockCache(self.request_cache, u"proposed-trade", 2,
+                                         MockProposedTrade(self.order_id1, self.order_id3)))
+        self.assertEqual(self.request_cache.get_proposals(self.order_id1, self.order_id2),
+                         [(u"proposed-trade:1", cache1)])
+        self.assertFalse(self.request_cache.get_proposals(self.order_id2, self.order_id1))
+
+        self.request_cache.pop(u"proposed-trade", 1)
+        self.assertFalse(self.request_cache.get_proposals(self.order_id1, self.order_id2))
+        self.assertTrue(self.request_cache.get_proposals(self.order_id1, self.order_id3))
+
+        self.request_cache.clear()
+        self.assertFalse(self.request_cache.get_proposals(self.order_id1, self.order_id3))
+
+    async def test_timeout(self):
+        """
+        Test whether a cache that times out is removed from the indices
+        """
+        cache = self.request_cache.add(MockCache(self.request_cache, u"proposed-trade", 1,
+                                                 MockProposedTrade(self.order_id1, self.order_id2), 0.01))
+        self.request_cache.add(MockCache(self.request_cache, u"match", 1, timeout_delay=0.01))
+        await sleep(0.05)
+        self.assertTrue(cache.timed_out)
+        self.assertFalse(self.request_cache.get_proposals(self.order_id1, self.order_id2))
+        self.assertFalse(self.request_cache.get_match_caches())
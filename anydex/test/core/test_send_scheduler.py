@@ -0,0 +1,84 @@
+from asyncio import sleep
+
+from anydex.core.send_scheduler import PRIORITY_BROADCAST, PRIORITY_MATCH, PRIORITY_SYNC, PRIORITY_TRADE,\
+    SendScheduler, TokenBucket
+from anydex.test.base import AbstractServer
+from anydex.test.util import MockObject
+
+
+class TestSendScheduler(AbstractServer):
+    """
+    This class contains tests for the SendScheduler object.
+    """
+
+    async def setUp(self):
+        super(TestSendScheduler, self).setUp()
+        self.sent_packets = []
+        endpoint = MockObject()
+        endpoint.send = lambda address, packet: self.sent_packets.append((address, packet))
+        self.scheduler = SendScheduler(endpoint, 100, 2, 3)
+
+    async def tearDown(self):
+        await self.scheduler.shutdown_task_manager()
+        await super(TestSendScheduler, self).tearDown()
+
+    def test_token_bucket(self):
+        """
+        Test whether a token bucket allows bursts and refills at its rate
+        """
+        self.time = 0
+        bucket = TokenBucket(10, 2, get_time=lambda: self.time)
+        self.assertTrue(bucket.consume())
+        self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+        self.assertAlmostEqual(bucket.get_wait_time(), 0.1)
+        self.time = 0.1
+        self.assertTrue(bucket.consume())
+        self.time = 10
+        self.assertTrue(bucket.is_full())
+
+    async def test_send_priorities(self):
+        """
+        Test whether packets exceeding the burst are queued, and sent in order of priority
+        """
+        address = ("1.2.3.4", 5)
+        self.scheduler.send(address, b'a', PRIORITY_SYNC)
+        self.scheduler.send(address, b'b', PRIORITY_SYNC)
+        self.scheduler.send(address, b'c', PRIORITY_SYNC)
+        self.scheduler.send(address, b'd', PRIORITY_BROADCAST)
+        self.scheduler.send(address, b'e', PRIORITY_MATCH)
+        self.assertEqual([packet for _, packet in self.sent_packets], [b'a', b'b'])
+        self.assertEqual(self.scheduler.get_stats()["priorities"]["sync"]["queued"], 1)
+
+        # Trade negotiation is never delayed
+        self.scheduler.send(address, b'f', PRIORITY_TRADE)
+        self.assertEqual(self.sent_packets[-1], (address, b'f'))
+
+        await sleep(0.1)
+        self.assertEqual([packet for _, packet in self.sent_packets], [b'a', b'b', b'f', b'e', b'd', b'c'])
+        stats = self.scheduler.get_stats()
+        self.assertEqual(stats["queued_destinations"], 0)
+        self.assertEqual(stats["max_queue_depth"], 3)
+        self.assertEqual(stats["priorities"]["sync"], {"queued": 0, "sent": 3, "delayed": 1, "dropped": 0})
+
+    async def test_send_queue_full(self):
+        """
+        Test whether the least urgent packet is dropped when the queue of a destination is full
+        """
+        address = ("1.2.3.4", 5)
+        for packet in [b'a', b'b', b'c', b'd', b'e']:
+            self.scheduler.send(address, packet, PRIORITY_SYNC)
+        self.scheduler.send(address, b'f', PRIORITY_MATCH)
+        self.scheduler.send(address, b'g', PRIORITY_SYNC)
+
+        await sleep(0.1)
+        self.assertEqual([packet for _, packet in self.sent_packets], [b'a', b'b', b'f', b'c', b'd'])
+        self.assertEqual(self.scheduler.get_stats()["priorities"]["sync"]["dropped"], 2)
+
+    def test_send_destinations(self):
+        """
+        Test whether every destination is paced separately
+        """
+        for port in range(3):
+            self.scheduler.send(("1.2.3.4", port), b'a', PRIORITY_SYNC)
+        self.assertEqual(len(self.sent_packets), 3)
@@ -28,11 +28,6 @@ class TickEntryTestSuite(AbstractServer):
         self.tick_entry = TickEntry(tick, self.price_level)
         self.tick_entry2 = TickEntry(tick2, self.price_level)
 
-    async def tearDown(self):
-        await self.tick_entry.shutdown_task_manager()
-        await self.tick_entry2.shutdown_task_manager()
-        await super(TickEntryTestSuite, self).tearDown()
-
     def test_price_level(self):
         self.assertEqual(self.price_level, self.tick_entry.price_level())
 
@@ -69,3 +64,19 @@ class TickEntryTestSuite(AbstractServer):
         # Try to add it again - should be ignored
         self.tick_entry.block_for_matching(OrderId(TraderId(b'a' * 20), OrderNumber(3)))
         self.assertEqual(len(self.tick_entry._blocked_for_matching), 1)
+
+    def test_unblock_for_matching(self):
+        """
+        Test unblocking of a match
+        """
+        order_id = OrderId(TraderId(b'a' * 20), OrderNumber(3))
+        self.assertTrue(self.tick_entry.block_for_matching(order_id))
+        self.assertTrue(self.tick_entry.is_blocked_for_matching(order_id))
+        self.assertFalse(self.tick_entry.block_for_matching(order_id))
+
+        self.tick_entry.unblock_for_matching(order_id)
+        self.assertFalse(self.tick_entry.is_blocked_for_matching(order_id))
+
+        # Unblocking an order id that is not blocked should be ignored
+        self.tick_entry.unblock_for_matching(order_id)
+        self.assertFalse(self.tick_entry.is_blocked_for_matching(order_id))
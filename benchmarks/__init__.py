@@ -0,0 +1,7 @@
+"""
+This package contains micro-benchmarks for the performance-critical parts of the market.
+
+Benchmarks are plain scripts and are not collected by the test runner. Run one with, e.g.:
+
+    python -m benchmarks.bench_pricelevel_list
+"""
@@ -0,0 +1,334 @@
+"""
+Benchmark of the validation of the transactions of market blocks.
+
+This compares the schema validators of MarketBlock with the chains of has_fields, has_required_types and
+is_valid_asset_pair calls it used before, which are reproduced below as a reference. It builds a corpus of valid tick,
+cancel, tx_init, tx_done and tx_payment blocks and of invalid variants of them, each with a single field that is
+missing, of the wrong type or out of range. It first checks that both implementations accept the same blocks, and then
+measures how long it takes to validate the corpus of every block type.
+
+Usage: python -m benchmarks.bench_block_validation [rounds]
+"""
+import copy
+import sys
+
+from anydex.core import MAX_ORDER_TIMEOUT
+from anydex.core.assetamount import AssetAmount
+from anydex.core.assetpair import AssetPair
+from anydex.core.block import MarketBlock
+from anydex.core.order import OrderId, OrderNumber
+from anydex.core.timestamp import Timestamp
+from anydex.core.trade import AcceptedTrade
+from anydex.core.transaction import Transaction, TransactionId
+from benchmarks.util import Timer, make_tick, make_trader_id, report
+
+DEFAULT_ROUNDS = 10000
+
+
+class LegacyMarketBlock(MarketBlock):
+    """
+    MarketBlock that validates its transaction with the methods MarketBlock had before.
+    """
+
+    @staticmethod
+    def is_valid_asset_pair(assets_dict, amount_positive=True):
+        if 'first' not in assets_dict or 'second' not in assets_dict:
+            return False
+        if 'amount' not in assets_dict['first'] or 'type' not in assets_dict['first']:
+            return False
+        if 'amount' not in assets_dict['second'] or 'type' not in assets_dict['second']:
+            return False
+
+        if not MarketBlock.has_required_types([('amount', int), ('type', str)], assets_dict['first']):
+            return False
+        if not MarketBlock.has_required_types([('amount', int), ('type', str)], assets_dict['second']):
+            return False
+
+        if assets_dict['first']['amount'].bit_length() > 63 or assets_dict['second']['amount'].bit_length() > 63:
+            return False
+
+        if amount_positive and (assets_dict['first']['amount'] <= 0 or assets_dict['second']['amount'] <= 0):
+            return False
+
+        return True
+
+    @staticmethod
+    def is_valid_trader_id(trader_id):
+        if len(trader_id) != 40:
+            return False
+
+        try:
+            int(trader_id, 16)
+        except ValueError:  # Not a hexadecimal
+            return False
+        return True
+
+    @staticmethod
+    def is_valid_tick(tick):
+        required_fields = ['trader_id', 'order_number', 'assets', 'timeout', 'timestamp', 'traded']
+        if not MarketBlock.has_fields(required_fields, tick):
+            return False
+
+        required_types = [('trader_id', str), ('order_number', int), ('assets', dict), ('timestamp', int),
+                          ('timeout', int)]
+
+        if not LegacyMarketBlock.is_valid_trader_id(tick['trader_id']):
+            return False
+        if not LegacyMarketBlock.is_valid_asset_pair(tick['assets']):
+            return False
+        if not MarketBlock.has_required_types(required_types, tick):
+            return False
+        if tick['timeout'] < 0 or tick['timeout'] > MAX_ORDER_TIMEOUT:
+            return False
+
+        return True
+
+    @staticmethod
+    def is_valid_tx_init(tx):
+        required_fields = ['trader_id', 'order_number', 'partner_trader_id', 'partner_order_number',
+                           'assets', 'timestamp']
+        if not MarketBlock.has_fields(required_fields, tx):
+            return False
+        if len(tx) != len(required_fields):
+            return False
+
+        required_types = [('trader_id', str), ('order_number', int), ('partner_trader_id', str),
+                          ('partner_order_number', int), ('assets', dict), ('timestamp', int)]
+
+        if not LegacyMarketBlock.is_valid_trader_id(tx['trader_id']) or not \
+                LegacyMarketBlock.is_valid_trader_id(tx['partner_trader_id']):
+            return False
+        if not LegacyMarketBlock.is_valid_asset_pair(tx['assets']):
+            return False
+        if not MarketBlock.has_required_types(required_types, tx):
+            return False
+
+        return True
+
+    @staticmethod
+    def is_valid_tx(tx):
+        required_fields = ['trader_id', 'order_number', 'partner_trader_id', 'partner_order_number', 'transaction_id',
+                           'assets', 'transferred', 'timestamp']
+        if not MarketBlock.has_fields(required_fields, tx):
+            return False
+        if len(tx) != len(required_fields):
+            return False
+
+        required_types = [('trader_id', str), ('order_number', int), ('partner_trader_id', str),
+                          ('partner_order_number', int), ('transaction_id', str), ('assets', dict),
+                          ('transferred', dict), ('timestamp', int)]
+
+        if not LegacyMarketBlock.is_valid_trader_id(tx['trader_id']) or not \
+                LegacyMarketBlock.is_valid_trader_id(tx['partner_trader_id']):
+            return False
+        if not LegacyMarketBlock.is_valid_asset_pair(tx['assets']):
+            return False
+        if not LegacyMarketBlock.is_valid_asset_pair(tx['transferred'], amount_positive=False):
+            return False
+        if not MarketBlock.has_required_types(required_types, tx):
+            return False
+
+        return True
+
+    @staticmethod
+    def is_valid_payment(payment):
+        required_fields = ['trader_id', 'transaction_id', 'transferred', 'payment_id', 'address_from',
+                           'address_to', 'timestamp']
+        if not MarketBlock.has_fields(required_fields, payment):
+            return False
+        if len(payment) != len(required_fields):
+            return False
+
+        required_types = [('trader_id', str), ('transaction_id', str), ('transferred', dict),
+                          ('payment_id', str), ('address_from', str), ('address_to', str), ('timestamp', int)]
+        if not LegacyMarketBlock.is_valid_trader_id(payment['trader_id']):
+            return False
+        if not MarketBlock.has_required_types(required_types, payment):
+            return False
+
+        return True
+
+    def is_valid_tick_block(self):
+        if self.type != b"ask" and self.type != b"bid":
+            return False
+        if not MarketBlock.has_fields(['tick'], self.transaction):
+            return False
+        if not LegacyMarketBlock.is_valid_tick(self.transaction['tick']):
+            return False
+
+        return True
+
+    def is_valid_cancel_block(self):
+        if self.type != b"cancel_order":
+            return False
+
+        if not MarketBlock.has_fields(['trader_id', 'order_number'], self.transaction):
+            return False
+
+        required_types = [('trader_id', str), ('order_number', int)]
+        if not MarketBlock.has_required_types(required_types, self.transaction):
+            return False
+
+        return True
+
+    def is_valid_tx_init_done_block(self):
+        if self.type != b"tx_init" and self.type != b"tx_done":
+            return False
+
+        if not MarketBlock.has_fields(['tx'], self.transaction):
+            return False
+
+        if self.type == b"tx_done" and not MarketBlock.has_fields(['ask', 'bid'], self.transaction):
+            return False
+
+        if self.type == b"tx_done" and not LegacyMarketBlock.is_valid_tick(self.transaction['ask']):
+            return False
+        if self.type == b"tx_done" and not LegacyMarketBlock.is_valid_tick(self.transaction['bid']):
+            return False
+
+        if self.type == b"tx_init" and not LegacyMarketBlock.is_valid_tx_init(self.transaction['tx']):
+            return False
+        elif self.type == b"tx_done" and not LegacyMarketBlock.is_valid_tx(self.transaction['tx']):
+            return False
+
+        return True
+
+    def is_valid_tx_payment_block(self):
+        if self.type != b"tx_payment":
+            return False
+
+        if not MarketBlock.has_fields(['payment'], self.transaction):
+            return False
+        if not LegacyMarketBlock.is_valid_payment(self.transaction['payment']):
+            return False
+
+        return True
+
+
+def create_transactions():
+    """
+    Return the valid transaction of every block type, with the name of the validation method of that block type.
+    """
+    ask = make_tick(1, 30, 30, True)
+    bid = make_tick(2, 30, 30, False)
+    accepted_trade = AcceptedTrade(make_trader_id(1), OrderId(make_trader_id(1), OrderNumber(1)),
+                                   OrderId(make_trader_id(2), OrderNumber(1)), 1234,
+                                   AssetPair(AssetAmount(30, 'BTC'), AssetAmount(30, 'MB')), Timestamp.now())
+    transaction = Transaction.from_accepted_trade(accepted_trade, TransactionId(b'a' * 32))
+    payment = {
+        'trader_id': 'a' * 40,
+        'transaction_id': 'a' * 64,
+        'transferred': {'amount': 3, 'type': 'BTC'},
+        'payment_id': 'a',
+        'address_from': 'a',
+        'address_to': 'b',
+        'timestamp': 1234,
+    }
+    return {
+        b'ask': ('is_valid_tick_block', {'tick': ask.to_block_dict()}),
+        b'cancel_order': ('is_valid_cancel_block', {'trader_id': 'a' * 40, 'order_number': 1}),
+        b'tx_init': ('is_valid_tx_init_done_block', {'tx': accepted_trade.to_block_dictionary()}),
+        b'tx_done': ('is_valid_tx_init_done_block', {'ask': ask.to_block_dict(), 'bid': bid.to_block_dict(),
+                                                      'tx': transaction.to_block_dictionary()}),
+        b'tx_payment': ('is_valid_tx_payment_block', {'payment': payment}),
+    }
+
+
+def create_invalid_variants(transaction):
+    """
+    Return copies of a transaction in which every field, and every field of an asset pair, is in turn missing, of the
+    wrong type or out of range.
+    """
+    variants = []
+    containers = [(path, container) for path, container in iter_dicts(transaction, ())]
+    for path, container in containers:
+        for key in container:
+            for mutation in ('pop', 'type', 'range'):
+                variant = copy.deepcopy(transaction)
+                target = variant
+                for step in path:
+                    target = target[step]
+                value = target[key]
+                if mutation == 'pop':
+                    del target[key]
+                elif mutation == 'type':
+                    target[key] = 3.5 if isinstance(value, (int, str)) else 'a'
+                elif isinstance(value, int) and not isinstance(value, bool):
+                    target[key] = -1 if key != 'timestamp' else 2 ** 64
+                elif isinstance(value, str) and len(value) == 40:
+                    target[key] = 'g' * 40
+                else:
+                    continue
+                variants.append(variant)
+    return variants
+
+
+def iter_dicts(container, path):
+    yield path, container
+    for key, value in container.items():
+        if isinstance(value, dict):
+            yield from iter_dicts(value, path + (key,))
+
+
+def create_corpus():
+    """
+    Return the blocks of every type, the valid block followed by its invalid variants.
+    """
+    corpus = {}
+    for block_type, (method, transaction) in create_transactions().items():
+        corpus[block_type] = (method, [transaction] + create_invalid_variants(transaction))
+    return corpus
+
+
+def create_blocks(block_cls, block_type, transactions):
+    blocks = []
+    for transaction in transactions:
+        block = block_cls()
+        block.type = block_type
+        block.transaction = transaction
+        blocks.append(block)
+    return blocks
+
+
+def is_valid(block, method):
+    """
+    Return whether a block is valid. The legacy methods raise on some fields of the wrong type, which makes the block
+    invalid as well.
+    """
+    try:
+        return getattr(block, method)()
+    except (TypeError, AttributeError):
+        return False
+
+
+def validate(blocks, method, rounds):
+    timer = Timer()
+    with timer.measure():
+        for _ in range(rounds):
+            for block in blocks:
+                is_valid(block, method)
+    return timer.elapsed
+
+
+def main(rounds):
+    rows = []
+    for block_type, (method, transactions) in create_corpus().items():
+        legacy_blocks = create_blocks(LegacyMarketBlock, block_type, transactions)
+        blocks = create_blocks(MarketBlock, block_type, transactions)
+        legacy_results = [is_valid(block, method) for block in legacy_blocks]
+        results = [is_valid(block, method) for block in blocks]
+        assert results == legacy_results, "Validators disagree on %s blocks" % block_type.decode()
+        assert results[0], "The valid %s block is rejected" % block_type.decode()
+
+        legacy_time = validate(legacy_blocks, method, rounds)
+        schema_time = validate(blocks, method, rounds)
+        num_blocks = len(blocks) * rounds
+        rows.append([block_type.decode(), len(blocks), results.count(True),
+                     "%.2f" % (legacy_time / num_blocks * 1e6), "%.2f" % (schema_time / num_blocks * 1e6),
+                     "%.1fx" % (legacy_time / schema_time)])
+    report("Market block validation benchmark (%d rounds, us per block)" % rounds,
+           ["type", "blocks", "valid", "legacy", "schema", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROUNDS)
@@ -0,0 +1,103 @@
+"""
+Benchmark of the Bloom filter that is sent in order book sync messages.
+
+For a number of order ids, this compares the bytearray-backed BloomFilter with the big integer representation it used
+before, which is reproduced below as a reference. It first checks that both produce the same serialised filter and
+the same membership results, and then measures:
+- building a filter from all order ids and serialising it (done by the sender of a sync message);
+- deserialising a filter and filtering the order ids that are not in it (done by the receiver).
+
+Usage: python -m benchmarks.bench_bloomfilter [num_keys ...]
+"""
+import sys
+from binascii import hexlify, unhexlify
+
+from anydex.core.bloomfilter import BloomFilter
+from benchmarks.util import Timer, make_trader_id, report
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+ERROR_RATE = 0.005
+PREFIX = b' '
+
+
+class LegacyBloomFilter(BloomFilter):
+    """
+    BloomFilter that stores its bits in one Python integer, as BloomFilter did before.
+    """
+
+    def __init__(self, *args, **kargs):
+        super(LegacyBloomFilter, self).__init__(*args, **kargs)
+        self._filter = int(hexlify(args[0][::-1]), 16) if isinstance(args[0], bytes) else 0
+
+    def add_keys(self, keys):
+        filter_ = self._filter
+        salt_copy = self._salt.copy
+        m_size = self._m_size
+        fmt_unpack = self._fmt_unpack
+        for key in keys:
+            hash_ = salt_copy()
+            hash_.update(key)
+            for pos in fmt_unpack(hash_.digest()):
+                filter_ |= 1 << (pos % m_size)
+        self._filter = filter_
+
+    def not_filter(self, iterator):
+        filter_ = self._filter
+        salt_copy = self._salt.copy
+        m_size = self._m_size
+        fmt_unpack = self._fmt_unpack
+        for tup in iterator:
+            hash_ = salt_copy()
+            hash_.update(tup[0])
+            for pos in fmt_unpack(hash_.digest()):
+                if not filter_ & (1 << (pos % m_size)):
+                    yield tup
+                    break
+
+    @property
+    def bytes(self):
+        hex_ = '%x' % self._filter
+        padding = '0' * (self._m_size // 4 - len(hex_))
+        return unhexlify(padding + hex_)[::-1]
+
+
+def make_keys(first_index, num_keys):
+    return [bytes(make_trader_id(index)) + b'\x00\x00\x00\x01' for index in range(first_index, first_index + num_keys)]
+
+
+def run(bloomfilter_cls, keys, other_keys):
+    build_timer = Timer()
+    with build_timer.measure():
+        bloomfilter = bloomfilter_cls(ERROR_RATE, len(keys), prefix=PREFIX)
+        bloomfilter.add_keys(keys)
+        serialised = bloomfilter.bytes
+
+    filter_timer = Timer()
+    with filter_timer.measure():
+        received = bloomfilter_cls(serialised, bloomfilter.functions, prefix=PREFIX)
+        missing = list(received.not_filter((key,) for key in other_keys))
+
+    return serialised, missing, build_timer.elapsed, filter_timer.elapsed
+
+
+def main(sizes):
+    rows = []
+    for size in sizes:
+        keys = make_keys(0, size)
+        # The receiver knows half of the keys of the sender, and as many other keys
+        other_keys = keys[::2] + make_keys(size, size // 2)
+
+        legacy_bytes, legacy_missing, legacy_build, legacy_filter = run(LegacyBloomFilter, keys, other_keys)
+        new_bytes, new_missing, new_build, new_filter = run(BloomFilter, keys, other_keys)
+        assert new_bytes == legacy_bytes, "The serialised Bloom filters differ"
+        assert new_missing == legacy_missing, "The Bloom filters do not filter the same keys"
+
+        rows.append([size, "%.2f" % (legacy_build * 1000), "%.2f" % (new_build * 1000),
+                     "%.2f" % (legacy_filter * 1000), "%.2f" % (new_filter * 1000)])
+
+    report("Bloom filter benchmark (ms, equal output verified)",
+           ["keys", "build (int)", "build (bytearray)", "filter (int)", "filter (bytearray)"], rows)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,111 @@
+"""
+Benchmark of persisting orders and transactions in the market database.
+
+For a number of orders and transactions, this measures how many orders and transactions per second are written to
+the database. Every order and transaction is written twice: once when it is created and once when it is updated. The
+writes are either committed one by one, or grouped in a single database transaction per batch of writes. Finally, it
+measures how long it takes to load all orders and transactions back from the database.
+
+Usage: python -m benchmarks.bench_market_db [num_rows ...]
+"""
+import os
+import sys
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from anydex.core.assetamount import AssetAmount
+from anydex.core.assetpair import AssetPair
+from anydex.core.database import MarketDB
+from anydex.core.order import Order, OrderId, OrderNumber
+from anydex.core.payment import Payment
+from anydex.core.payment_id import PaymentId
+from anydex.core.timeout import Timeout
+from anydex.core.timestamp import Timestamp
+from anydex.core.transaction import Transaction, TransactionId
+from anydex.core.wallet_address import WalletAddress
+from benchmarks.util import Timer, make_trader_id, report
+
+DEFAULT_SIZES = [1000, 10000]
+BATCH_SIZE = 100
+
+
+def make_orders(num_orders):
+    orders = []
+    for index in range(num_orders):
+        order = Order(OrderId(make_trader_id(0), OrderNumber(index + 1)),
+                      AssetPair(AssetAmount(100, 'BTC'), AssetAmount(30, 'MB')), Timeout(3600), Timestamp.now(),
+                      index % 2 == 0)
+        order.reserve_quantity_for_tick(OrderId(make_trader_id(1), OrderNumber(index + 1)), 10)
+        orders.append(order)
+    return orders
+
+
+def make_transactions(num_transactions):
+    return [Transaction(TransactionId(index.to_bytes(32, 'big')),
+                        AssetPair(AssetAmount(100, 'BTC'), AssetAmount(30, 'MB')),
+                        OrderId(make_trader_id(0), OrderNumber(index + 1)),
+                        OrderId(make_trader_id(1), OrderNumber(index + 1)), Timestamp.now())
+            for index in range(num_transactions)]
+
+
+def write(database, rows, write_row, grouped):
+    """
+    Write all rows to the database, either one by one or in batches of BATCH_SIZE rows per database transaction.
+    """
+    if not grouped:
+        for row in rows:
+            write_row(row)
+        return
+
+    for start in range(0, len(rows), BATCH_SIZE):
+        with database:
+            for row in rows[start:start + BATCH_SIZE]:
+                write_row(row)
+
+
+def run(num_rows, grouped):
+    state_dir = mkdtemp()
+    os.makedirs(os.path.join(state_dir, 'sqlite'))
+    database = MarketDB(state_dir, 'market')
+
+    orders = make_orders(num_rows)
+    order_timer = Timer()
+    with order_timer.measure():
+        write(database, orders, database.add_order, grouped)
+        for order in orders:
+            order.release_quantity_for_tick(OrderId(make_trader_id(1), order.order_id.order_number), 10)
+        write(database, orders, database.add_order, grouped)
+
+    transactions = make_transactions(num_rows)
+    transaction_timer = Timer()
+    with transaction_timer.measure():
+        write(database, transactions, database.add_transaction, grouped)
+        for index, transaction in enumerate(transactions):
+            transaction.add_payment(Payment(make_trader_id(0), transaction.transaction_id, AssetAmount(100, 'BTC'),
+                                            WalletAddress('a'), WalletAddress('b'), PaymentId("%d" % index),
+                                            Timestamp.now()))
+        write(database, transactions, database.add_transaction, grouped)
+
+    load_timer = Timer()
+    with load_timer.measure():
+        database.get_all_orders()
+        database.get_all_transactions()
+
+    database.close()
+    rmtree(state_dir)
+    return ["%d" % (2 * num_rows / order_timer.elapsed), "%d" % (2 * num_rows / transaction_timer.elapsed),
+            "%.1f" % (load_timer.elapsed * 1000)]
+
+
+def main(sizes):
+    rows = []
+    for size in sizes:
+        ungrouped, grouped = run(size, False), run(size, True)
+        rows.append([size] + ungrouped[:2] + grouped[:2] + [grouped[2]])
+    report("Market database benchmark (writes per second, grouped per %d writes)" % BATCH_SIZE,
+           ["rows", "orders/s", "transactions/s", "orders/s (grouped)", "transactions/s (grouped)", "load (ms)"],
+           rows)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,97 @@
+"""
+Benchmark of matching a burst of incoming ticks against the order book.
+
+A matchmaker with a number of own orders receives a burst of asks. This compares the per-burst matching latency of
+matching the own orders and the new tick after every incoming tick (as MarketCommunity.on_tick used to do) with
+matching the whole burst at once, using MatchingEngine.match_batch. The batch returns fewer matches, since the own
+orders are only matched against the order book after the burst, instead of against every intermediate state of the
+order book.
+
+Usage: python -m benchmarks.bench_match_batch [burst_size ...]
+"""
+import random
+import sys
+from asyncio import get_event_loop
+
+from anydex.core.matching_engine import MatchingEngine, PriceTimeStrategy
+from anydex.core.orderbook import OrderBook
+from benchmarks.util import Timer, make_tick, report
+
+DEFAULT_SIZES = [10, 100, 1000]
+NUM_OWN_ORDERS = 100
+NUM_RESTING_TICKS = 1000
+
+
+def make_order_book():
+    """
+    Create an order book with resting asks and bids that do not cross, and own bids just below the lowest ask.
+    """
+    order_book = OrderBook()
+    for index in range(NUM_RESTING_TICKS):
+        order_book.insert_ask(make_tick(index, 100, 200 + index % 100, True))
+        order_book.insert_bid(make_tick(NUM_RESTING_TICKS + index, 100, 1 + index % 100, False))
+    own_ticks = [make_tick(10 ** 6 + index, 100, 101 + index, False) for index in range(NUM_OWN_ORDERS)]
+    for tick in own_ticks:
+        order_book.insert_bid(tick)
+    return order_book, own_ticks
+
+
+def make_burst(burst_size):
+    rand = random.Random(burst_size)
+    return [make_tick(2 * 10 ** 6 + index, 100, rand.randint(50, 250), True) for index in range(burst_size)]
+
+
+def match_sequentially(order_book, own_ticks, burst):
+    matching_engine = MatchingEngine(PriceTimeStrategy(order_book))
+    own_entries = [order_book.get_tick(tick.order_id) for tick in own_ticks]
+    sent_matches = set()
+    timer = Timer()
+    for tick in burst:
+        order_book.insert_ask(tick)
+        with timer.measure():
+            for tick_entry in own_entries + [order_book.get_tick(tick.order_id)]:
+                for matched_tick in matching_engine.match(tick_entry):
+                    sent_matches.add((tick_entry.order_id, matched_tick.order_id))
+    return timer.elapsed, sent_matches
+
+
+def match_batch(order_book, own_ticks, burst):
+    matching_engine = MatchingEngine(PriceTimeStrategy(order_book))
+    for tick in burst:
+        order_book.insert_ask(tick)
+    sent_matches = set()
+    timer = Timer()
+    with timer.measure():
+        own_entries = [order_book.get_tick(tick.order_id) for tick in own_ticks]
+        burst_entries = [order_book.get_tick(tick.order_id) for tick in burst]
+        for tick_entry, matched_ticks in matching_engine.match_batch(own_entries) + \
+                matching_engine.match_batch(burst_entries):
+            for matched_tick in matched_ticks:
+                sent_matches.add((tick_entry.order_id, matched_tick.order_id))
+    return timer.elapsed, sent_matches
+
+
+async def run(burst_size):
+    burst = make_burst(burst_size)
+
+    order_book, own_ticks = make_order_book()
+    sequential_time, sequential_matches = match_sequentially(order_book, own_ticks, burst)
+    await order_book.shutdown_task_manager()
+
+    order_book, own_ticks = make_order_book()
+    batch_time, batch_matches = match_batch(order_book, own_ticks, burst)
+    await order_book.shutdown_task_manager()
+
+    return [burst_size,
+            "%.2f" % (sequential_time * 1e3), len(sequential_matches),
+            "%.2f" % (batch_time * 1e3), len(batch_matches)]
+
+
+def main(sizes):
+    rows = [get_event_loop().run_until_complete(run(size)) for size in sizes]
+    report("Burst matching benchmark (%d own orders)" % NUM_OWN_ORDERS,
+           ["burst", "sequential (ms)", "matches", "batch (ms)", "matches"], rows)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,67 @@
+"""
+Benchmark of the queue of incoming matches that a trader keeps for each of its orders.
+
+For a number of matched counter orders, this measures how many operations per second the queue of one ask order
+handles when:
+- inserting a match for every counter order, after checking that it is not queued yet (as MatchCache.add_match does);
+- deleting the entry with the highest priority until the queue is empty;
+- removing all entries of a counter order, e.g., after it has been completed, until the queue is empty.
+
+Usage: python -m benchmarks.bench_match_queue [num_entries ...]
+"""
+import random
+import sys
+
+from anydex.core.assetamount import AssetAmount
+from anydex.core.assetpair import AssetPair
+from anydex.core.match_queue import MatchPriorityQueue
+from anydex.core.order import Order, OrderId, OrderNumber
+from anydex.core.price import Price
+from anydex.core.timeout import Timeout
+from anydex.core.timestamp import Timestamp
+from benchmarks.util import Timer, make_trader_id, report
+
+DEFAULT_SIZES = [1000, 10000]
+
+
+def fill(queue, entries):
+    for retries, price, order_id in entries:
+        if not queue.contains_order(order_id):
+            queue.insert(retries, price, order_id)
+
+
+def run(num_entries):
+    order = Order(OrderId(make_trader_id(0), OrderNumber(1)), AssetPair(AssetAmount(100, 'BTC'), AssetAmount(30, 'MB')),
+                  Timeout(3600), Timestamp.now(), True)
+    rand = random.Random(num_entries)
+    entries = [(rand.randint(0, 3), Price(rand.randint(1, 1000), 100, 'MB', 'BTC'),
+                OrderId(make_trader_id(index + 1), OrderNumber(1))) for index in range(num_entries)]
+
+    queue = MatchPriorityQueue(order)
+    insert_timer = Timer()
+    with insert_timer.measure():
+        fill(queue, entries)
+
+    delete_timer = Timer()
+    with delete_timer.measure():
+        while queue.delete():
+            pass
+
+    fill(queue, entries)
+    order_ids = [order_id for _, _, order_id in entries]
+    rand.shuffle(order_ids)
+    remove_timer = Timer()
+    with remove_timer.measure():
+        for order_id in order_ids:
+            queue.remove_order(order_id)
+
+    return ["%d" % (num_entries / timer.elapsed) for timer in (insert_timer, delete_timer, remove_timer)]
+
+
+def main(sizes):
+    rows = [[size] + run(size) for size in sizes]
+    report("Match queue benchmark (operations per second)", ["entries", "insert/s", "delete/s", "remove/s"], rows)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
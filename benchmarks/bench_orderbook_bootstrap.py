@@ -0,0 +1,102 @@
+"""
+Benchmark of the time it takes a new matchmaker to obtain the full order book of an existing matchmaker.
+
+Two in-memory matchmakers are connected through the mock endpoint of IPv8. The existing matchmaker has an order book
+with a number of ticks, of which it created the blocks. The new matchmaker obtains the order book:
+- with the order book sync of the walker, which sends a Bloom filter of the known orders with every introduction, to
+  which the other matchmaker responds with at most num_order_sync tick blocks. We count the sync rounds and add one
+  walker interval per round to the processing time, since only one round is done per walk step;
+- by downloading an order book snapshot, which is limited only by the processing time and the message latency.
+
+Usage: python -m benchmarks.bench_orderbook_bootstrap [num_ticks ...]
+"""
+import sys
+import time
+from asyncio import get_event_loop, sleep
+
+from ipv8.test.mocking.ipv8 import MockIPv8
+
+from anydex.core.community import MarketCommunity
+from benchmarks.util import make_tick, report
+
+DEFAULT_SIZES = [100, 1000, 5000]
+WALKER_INTERVAL = 0.5  # The walker_interval of the default AnyDex configuration
+MAX_ROUNDS = 10000
+
+
+def create_node():
+    return MockIPv8(u"curve25519", MarketCommunity, create_trustchain=True, is_matchmaker=True,
+                    use_database=False, working_directory=":memory:")
+
+
+async def create_order_book(node, num_ticks):
+    """
+    Fill the order book of a matchmaker with ticks, and persist the blocks that created them.
+    """
+    overlay = node.overlay
+    for index in range(num_ticks):
+        is_ask = index % 2 == 0
+        tick = make_tick(index, 100, 100 + (index % 50) * (1 if is_ask else -1), is_ask)
+        block, _ = await overlay.create_new_tick_block(tick)
+        tick.block_hash = block.hash
+        (overlay.order_book.insert_ask if is_ask else overlay.order_book.insert_bid)(tick)
+
+
+async def settle(node, num_ticks=None):
+    """
+    Wait until the order book of a node has stopped growing, or has reached a given size.
+    """
+    book_size, unchanged = -1, 0
+    while unchanged < 20:
+        await sleep(0)
+        new_book_size = len(node.overlay.order_book.get_order_ids())
+        if new_book_size == num_ticks:
+            return
+        unchanged = unchanged + 1 if new_book_size == book_size else 0
+        book_size = new_book_size
+
+
+async def bootstrap_with_walker(source, num_ticks):
+    node = create_node()
+    start_time = time.perf_counter()
+    rounds = 0
+    while len(node.overlay.order_book.get_order_ids()) < num_ticks and rounds < MAX_ROUNDS:
+        node.overlay.send_orderbook_sync(source.overlay.my_peer)
+        await settle(node, num_ticks)
+        rounds += 1
+    elapsed = time.perf_counter() - start_time
+    num_received = len(node.overlay.order_book.get_order_ids())
+    await node.unload()
+    return num_received, rounds, elapsed
+
+
+async def bootstrap_with_snapshot(source, num_ticks):
+    node = create_node()
+    start_time = time.perf_counter()
+    num_received = await node.overlay.request_orderbook_snapshot(source.overlay.my_peer)
+    elapsed = time.perf_counter() - start_time
+    await node.unload()
+    return num_received, elapsed
+
+
+async def run(num_ticks):
+    source = create_node()
+    await create_order_book(source, num_ticks)
+
+    walker_ticks, rounds, walker_time = await bootstrap_with_walker(source, num_ticks)
+    snapshot_ticks, snapshot_time = await bootstrap_with_snapshot(source, num_ticks)
+    assert walker_ticks == snapshot_ticks == num_ticks, (walker_ticks, snapshot_ticks, num_ticks)
+    await source.unload()
+
+    return [num_ticks, rounds, "%.2f" % walker_time, "%.1f" % (walker_time + rounds * WALKER_INTERVAL),
+            "%.2f" % snapshot_time]
+
+
+async def main(sizes):
+    rows = [await run(num_ticks) for num_ticks in sizes]
+    report("Order book bootstrap benchmark (s, walker interval of %.1fs)" % WALKER_INTERVAL,
+           ["ticks", "walker rounds", "walker processing", "walker total", "snapshot total"], rows)
+
+
+if __name__ == "__main__":
+    get_event_loop().run_until_complete(main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES))
@@ -0,0 +1,76 @@
+"""
+Benchmark of the creation, cancellation, expiry and shutdown costs of ticks in the order book.
+
+For a growing number of ticks, this measures:
+- the insert throughput of asks into the order book (including scheduling of their expiry);
+- the removal throughput of these asks (i.e., cancelling orders);
+- the time to shut down an order book that holds all these asks;
+- the time to remove all these asks from the order book once they have expired.
+
+Usage: python -m benchmarks.bench_orderbook_expiry [num_ticks ...]
+"""
+import sys
+import time
+from asyncio import get_event_loop
+from unittest.mock import patch
+
+from anydex.core.orderbook import OrderBook
+from benchmarks.util import Timer, make_tick, report
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def make_ticks(num_ticks, timeout=3600):
+    return [make_tick(index, 1000, 1 + index % 500, True, timeout=timeout) for index in range(num_ticks)]
+
+
+async def run(num_ticks):
+    ticks = make_ticks(num_ticks)
+
+    # Insert and cancel
+    order_book = OrderBook()
+    insert_timer = Timer()
+    with insert_timer.measure():
+        for tick in ticks:
+            order_book.insert_ask(tick)
+    remove_timer = Timer()
+    with remove_timer.measure():
+        for tick in ticks:
+            order_book.remove_tick(tick.order_id)
+    await order_book.shutdown_task_manager()
+
+    # Shutdown with a full order book
+    order_book = OrderBook()
+    for tick in ticks:
+        order_book.insert_ask(tick)
+    shutdown_timer = Timer()
+    with shutdown_timer.measure():
+        await order_book.shutdown_task_manager()
+
+    # Expire all ticks at once
+    order_book = OrderBook()
+    ticks = make_ticks(num_ticks, timeout=60)
+    for tick in ticks:
+        order_book.insert_ask(tick)
+    expire_timer = Timer()
+    with patch('time.time', lambda: 10 ** 10):
+        with expire_timer.measure():
+            order_book.process_timeouts()
+    assert len(order_book.asks) == 0, len(order_book.asks)
+    await order_book.shutdown_task_manager()
+
+    return [num_ticks,
+            "%d" % (num_ticks / insert_timer.elapsed),
+            "%d" % (num_ticks / remove_timer.elapsed),
+            "%.1f" % (shutdown_timer.elapsed * 1e3),
+            "%.1f" % (expire_timer.elapsed * 1e3)]
+
+
+def main(sizes):
+    rows = [get_event_loop().run_until_complete(run(size)) for size in sizes]
+    report("Order book expiry benchmark",
+           ["ticks", "inserts/s", "removes/s", "shutdown (ms)", "expire all (ms)"], rows)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,90 @@
+"""
+Benchmark of order book reconciliation between two matchmakers.
+
+Two in-memory matchmakers share a number of ticks, and each has a number of ticks that the other does not have. One
+matchmaker starts a reconciliation with the other, and the messages between them are delivered in waves, where a wave
+delivers all messages that were sent while processing the previous wave. We report the number of waves with
+reconciliation messages (two waves make a round trip), the number and size of these messages, whether the whole
+difference was found, and the number of times the matchmakers fell back to the Bloom filter sync.
+
+Usage: python -m benchmarks.bench_orderbook_reconcile [num_ticks [difference ...]]
+"""
+import sys
+from asyncio import get_event_loop
+
+from ipv8.test.mocking.ipv8 import MockIPv8
+
+from anydex.core.community import MSG_BOOK_RECONCILE, MSG_BOOK_RECONCILE_RESPONSE, MSG_BOOK_SYNC, MarketCommunity
+from anydex.core.iblt import get_key
+from benchmarks.util import make_tick, report
+
+DEFAULT_NUM_TICKS = 10000
+DEFAULT_DIFFERENCES = [4, 20, 100, 400, 1000, 10000]
+MAX_WAVES = 100
+
+
+def create_node():
+    node = MockIPv8(u"curve25519", MarketCommunity, create_trustchain=True, is_matchmaker=True,
+                    use_database=False, working_directory=":memory:")
+    node.overlay.settings.reconcile_orderbook = True
+    return node
+
+
+def insert_ticks(node, indices):
+    for index in indices:
+        is_ask = index % 2 == 0
+        tick = make_tick(index, 100, 100 + (index % 50) * (1 if is_ask else -1), is_ask)
+        (node.overlay.order_book.insert_ask if is_ask else node.overlay.order_book.insert_bid)(tick)
+
+
+async def reconcile(num_ticks, difference, first_index=0):
+    nodes = [create_node(), create_node()]
+    shared = range(first_index + difference, first_index + num_ticks)
+    insert_ticks(nodes[0], list(shared) + list(range(first_index, first_index + difference, 2)))
+    insert_ticks(nodes[1], list(shared) + list(range(first_index + 1, first_index + difference, 2)))
+    expected = {get_key(bytes(make_tick(index, 1, 1, True).order_id))
+                for index in range(first_index, first_index + difference)}
+
+    sent = []
+    found = set()
+    for node, other in (nodes, nodes[::-1]):
+        overlay = node.overlay
+        overlay.send_scheduler.send = lambda address, packet, priority, other=other, overlay=overlay: \
+            sent.append((other.overlay, overlay.my_estimated_wan, packet))
+        get_tick_entries_for_keys = overlay.get_tick_entries_for_keys
+        overlay.get_tick_entries_for_keys = lambda keys, method=get_tick_entries_for_keys: \
+            (found.update(keys), method(keys))[1]
+
+    nodes[0].overlay.start_orderbook_sync(nodes[1].overlay.my_peer)
+    waves, messages, size, fallbacks = 0, 0, 0, 0
+    while sent and waves < MAX_WAVES:
+        wave, sent[:] = list(sent), []
+        reconcile_packets = [packet for _, _, packet in wave
+                             if packet[22] in (MSG_BOOK_RECONCILE, MSG_BOOK_RECONCILE_RESPONSE)]
+        fallbacks += sum(1 for _, _, packet in wave if packet[22] == MSG_BOOK_SYNC)
+        if reconcile_packets:
+            waves += 1
+            messages += len(reconcile_packets)
+            size += sum(len(packet) for packet in reconcile_packets)
+        for overlay, address, packet in wave:
+            if packet[22] != MSG_BOOK_SYNC:
+                overlay.on_packet((address, packet))
+
+    for node in nodes:
+        await node.unload()
+    return waves, messages, size, found == expected, fallbacks
+
+
+async def main(num_ticks, differences):
+    rows = []
+    for difference in differences:
+        waves, messages, size, complete, fallbacks = await reconcile(num_ticks, difference)
+        rows.append([difference, waves, messages, "%.1f" % (size / 1024), complete, fallbacks])
+    report("Orderbook reconciliation benchmark (%d ticks)" % num_ticks,
+           ["difference", "waves", "messages", "size (KB)", "complete", "fallbacks"], rows)
+
+
+if __name__ == "__main__":
+    arguments = [int(arg) for arg in sys.argv[1:]]
+    get_event_loop().run_until_complete(main(arguments[0] if arguments else DEFAULT_NUM_TICKS,
+                                             arguments[1:] or DEFAULT_DIFFERENCES))
@@ -0,0 +1,53 @@
+"""
+Benchmark of saving the order book of a matchmaker to the database at shutdown, and restoring it at startup.
+
+Usage: python -m benchmarks.bench_orderbook_restore [num_ticks ...]
+"""
+import os
+import sys
+from asyncio import get_event_loop
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from anydex.core.database import MarketDB
+from anydex.core.orderbook import DatabaseOrderBook
+from benchmarks.util import Timer, make_tick, report
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+
+async def run(num_ticks):
+    state_dir = mkdtemp()
+    os.makedirs(os.path.join(state_dir, 'sqlite'))
+    database = MarketDB(state_dir, 'market')
+
+    order_book = DatabaseOrderBook(database)
+    for index in range(num_ticks):
+        tick = make_tick(index, 1000, 1 + index % 1000, index % 2 == 0)
+        order_book.insert_ask(tick) if tick.is_ask() else order_book.insert_bid(tick)
+
+    save_timer = Timer()
+    with save_timer.measure():
+        order_book.save_to_database()
+    await order_book.shutdown_task_manager()
+    del order_book
+
+    restored_order_book = DatabaseOrderBook(database)
+    restore_timer = Timer()
+    with restore_timer.measure():
+        restored_order_book.restore_from_database()
+    assert len(restored_order_book.asks) + len(restored_order_book.bids) == num_ticks
+    await restored_order_book.shutdown_task_manager()
+
+    database.close()
+    rmtree(state_dir)
+    return [num_ticks, "%.2f" % save_timer.elapsed, "%.2f" % restore_timer.elapsed]
+
+
+def main(sizes):
+    rows = [get_event_loop().run_until_complete(run(size)) for size in sizes]
+    report("Order book save/restore benchmark", ["ticks", "save (s)", "restore (s)"], rows)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
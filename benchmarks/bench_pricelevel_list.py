@@ -0,0 +1,72 @@
+"""
+Benchmark of the price level structure that backs each side of the order book.
+
+For a growing number of distinct price levels, this measures:
+- the cost of building the book (one tick per price level, inserted in random order);
+- the latency of inserting and removing a tick at a fresh price level;
+- the latency of matching a bid that crosses the 100 cheapest ask price levels.
+
+Usage: python -m benchmarks.bench_pricelevel_list [num_levels ...]
+"""
+import random
+import sys
+
+from anydex.core.matching_engine import PriceTimeStrategy
+from anydex.core.message import TraderId
+from anydex.core.order import OrderId, OrderNumber
+from anydex.core.orderbook import OrderBook
+from anydex.core.price import Price
+from benchmarks.util import Timer, make_tick, report
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+LEVEL_QUANTITY = 1000
+OPS = 1000
+CROSSED_LEVELS = 100
+
+
+def run(num_levels):
+    order_book = OrderBook()
+    prices = list(range(1, num_levels + 1))
+    random.shuffle(prices)
+
+    build_timer = Timer()
+    with build_timer.measure():
+        for index, price in enumerate(prices):
+            order_book.asks.insert_tick(make_tick(index, LEVEL_QUANTITY, price, True))
+
+    # Insert and remove ticks at price levels that do not exist yet
+    insert_timer = Timer()
+    remove_timer = Timer()
+    for op in range(OPS):
+        tick = make_tick(num_levels + op, LEVEL_QUANTITY * 2, 2 * random.randint(1, num_levels) + 1, True)
+        with insert_timer.measure():
+            order_book.asks.insert_tick(tick)
+        with remove_timer.measure():
+            order_book.asks.remove_tick(tick.order_id)
+
+    # Match a bid that crosses the cheapest price levels
+    strategy = PriceTimeStrategy(order_book)
+    bid_order_id = OrderId(TraderId(b'\xff' * 20), OrderNumber(1))
+    bid_price = Price(CROSSED_LEVELS, LEVEL_QUANTITY, 'MB', 'BTC')
+    match_timer = Timer()
+    for _ in range(OPS // 10):
+        with match_timer.measure():
+            matched = strategy.match(bid_order_id, bid_price, CROSSED_LEVELS * LEVEL_QUANTITY, False)
+    assert len(matched) == CROSSED_LEVELS, len(matched)
+
+    return [num_levels,
+            "%.2f" % (build_timer.elapsed * 1e6 / num_levels),
+            "%.2f" % (insert_timer.elapsed * 1e6 / OPS),
+            "%.2f" % (remove_timer.elapsed * 1e6 / OPS),
+            "%.1f" % (match_timer.elapsed * 1e6 / (OPS // 10))]
+
+
+def main(sizes):
+    random.seed(42)
+    rows = [run(size) for size in sizes]
+    report("Price level list benchmark (times in microseconds)",
+           ["levels", "build/tick", "insert", "remove", "match %d levels" % CROSSED_LEVELS], rows)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
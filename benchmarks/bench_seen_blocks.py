@@ -0,0 +1,136 @@
+"""
+Benchmark of the cache of processed blocks of the market community.
+
+With a fanout of 20 and a ttl of 1, a matchmaker receives a tick block from the trader that created it and from other
+matchmakers that relay it. The first table is synthetic: we pass every tick block a number of times to received_block
+of a matchmaker directly, once with the cache of processed blocks and once with a cache that cannot hold any block, so
+every copy is processed, and report the hit rate, the number of copies that are processed and the processing time,
+including the on_tick tasks that are started for the copies. The time saved by the cache comes from the copies that
+are not processed.
+
+The second table delivers every copy as a broadcast message to the TrustChain broadcast handler instead, which only
+notifies the market community of blocks that are not in its database yet. It reports how many copies reach
+received_block on this path, and the hit rate of the cache for those.
+
+Usage: python -m benchmarks.bench_seen_blocks [num_ticks [copies ...]]
+"""
+import sys
+from asyncio import all_tasks, current_task, get_event_loop, sleep
+
+from ipv8.attestation.trustchain.payload import HalfBlockBroadcastPayload
+from ipv8.messaging.payload_headers import GlobalTimeDistributionPayload
+from ipv8.test.mocking.ipv8 import MockIPv8
+
+from anydex.core import MAX_ORDER_TIMEOUT
+from anydex.core.community import MarketCommunity
+from anydex.core.lookup_cache import LookupCache
+from benchmarks.util import Timer, make_tick, report
+
+DEFAULT_NUM_TICKS = 1000
+DEFAULT_COPIES = [1, 2, 5, 10]
+
+
+def create_node():
+    return MockIPv8(u"curve25519", MarketCommunity, create_trustchain=True, is_matchmaker=True,
+                    use_database=False, working_directory=":memory:")
+
+
+async def create_tick_blocks(node, num_ticks):
+    blocks = []
+    for index in range(num_ticks):
+        is_ask = index % 2 == 0
+        tick = make_tick(index, 100, 100 + (index % 50) * (1 if is_ask else -1), is_ask)
+        block, _ = await node.overlay.create_new_tick_block(tick)
+        blocks.append(block)
+    return blocks
+
+
+async def wait_for_ticks():
+    """
+    Wait until the on_tick tasks started by received_block have finished.
+    """
+    this_task = current_task()
+    while any(task is not this_task and task.get_coro().__name__ == 'on_tick' for task in all_tasks()):
+        await sleep(0)
+
+
+async def process_copies(blocks, copies, use_cache):
+    node = create_node()
+    overlay = node.overlay
+    if not use_cache:
+        overlay.seen_blocks = LookupCache(0, MAX_ORDER_TIMEOUT, 0)
+
+    processed = []
+    process_tick_block = overlay.process_tick_block
+    overlay.process_tick_block = lambda block: (processed.append(block), process_tick_block(block))
+
+    timer = Timer()
+    for block in blocks:
+        with timer.measure():
+            for _ in range(copies):
+                overlay.received_block(block)
+            await wait_for_ticks()
+
+    assert len(overlay.order_book.get_order_ids()) == len(blocks)
+    assert len(processed) == len(blocks) * (1 if use_cache else copies)
+    hit_rate = overlay.get_seen_blocks_stats()["hit_rate"]
+    await node.unload()
+    return timer.elapsed, hit_rate, len(processed)
+
+
+async def process_broadcasts(blocks, copies):
+    node = create_node()
+    overlay = node.overlay
+    trustchain = overlay.trustchain
+    message_id, handler = next((message_id, handler) for message_id, handler
+                               in overlay.trustchain_broadcast_handlers.items()
+                               if handler == trustchain.received_half_block_broadcast)
+
+    received = []
+    received_block = overlay.received_block
+    overlay.received_block = lambda block: (received.append(block), received_block(block))
+
+    timer = Timer()
+    for block in blocks:
+        dist = GlobalTimeDistributionPayload(trustchain.claim_global_time()).to_pack_list()
+        payload = HalfBlockBroadcastPayload.from_half_block(block, 1).to_pack_list()
+        packet = trustchain._ez_pack(trustchain._prefix, ord(message_id), [dist, payload], False)
+        with timer.measure():
+            for _ in range(copies):
+                handler(("1.2.3.4", 5), packet)
+            await wait_for_ticks()
+
+    assert len(overlay.order_book.get_order_ids()) == len(blocks)
+    hit_rate = overlay.get_seen_blocks_stats()["hit_rate"]
+    await node.unload()
+    return timer.elapsed, hit_rate, len(received)
+
+
+async def main(num_ticks, copies_list):
+    source = create_node()
+    blocks = await create_tick_blocks(source, num_ticks)
+    await source.unload()
+
+    rows = []
+    for copies in copies_list:
+        uncached_time, _, uncached_processed = await process_copies(blocks, copies, False)
+        cached_time, hit_rate, cached_processed = await process_copies(blocks, copies, True)
+        rows.append([copies, "%.1f%%" % (hit_rate * 100), uncached_processed, cached_processed,
+                     "%.3f" % uncached_time, "%.3f" % cached_time,
+                     "%.1f%%" % ((1 - cached_time / uncached_time) * 100)])
+    report("Processed blocks cache benchmark, synthetic (%d tick blocks, s)" % num_ticks,
+           ["copies", "hit rate", "processed without cache", "processed with cache", "without cache", "with cache",
+            "saved"], rows)
+
+    rows = []
+    for copies in copies_list:
+        elapsed, hit_rate, received = await process_broadcasts(blocks, copies)
+        rows.append([copies, len(blocks) * copies, received, "%.1f%%" % (hit_rate * 100), "%.3f" % elapsed])
+    report("Processed blocks cache benchmark, TrustChain broadcasts (%d tick blocks, s)" % num_ticks,
+           ["copies", "broadcasts", "received_block calls", "hit rate", "time"], rows)
+
+
+if __name__ == "__main__":
+    arguments = [int(arg) for arg in sys.argv[1:]]
+    get_event_loop().run_until_complete(main(arguments[0] if arguments else DEFAULT_NUM_TICKS,
+                                             arguments[1:] or DEFAULT_COPIES))
@@ -0,0 +1,62 @@
+"""
+Benchmark of the memory footprint and insert throughput of resting ticks in the order book.
+
+For a growing number of resting ticks, this measures:
+- the insert throughput of ticks into one side of the order book;
+- the memory that is held per resting tick entry (excluding the tick itself);
+- the cost of blocking every resting tick for matching against one order.
+
+Usage: python -m benchmarks.bench_tickentry [num_ticks ...]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from asyncio import get_event_loop
+
+from anydex.core.message import TraderId
+from anydex.core.order import OrderId, OrderNumber
+from anydex.core.orderbook import OrderBook
+from benchmarks.util import Timer, make_tick, report
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+async def run(num_ticks):
+    ticks = [make_tick(index, 1000, 1 + index % 500, True) for index in range(num_ticks)]
+    order_book = OrderBook()
+    gc.collect()
+
+    insert_timer = Timer()
+    tracemalloc.start()
+    with insert_timer.measure():
+        for tick in ticks:
+            order_book.asks.insert_tick(tick)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    block_timer = Timer()
+    blocked_order_id = OrderId(TraderId(b'\xff' * 20), OrderNumber(1))
+    with block_timer.measure():
+        for tick in ticks:
+            order_book.block_for_matching(tick.order_id, blocked_order_id)
+
+    shutdown_start = time.perf_counter()
+    await order_book.shutdown_task_manager()
+    shutdown_time = time.perf_counter() - shutdown_start
+
+    return [num_ticks,
+            "%d" % (num_ticks / insert_timer.elapsed),
+            "%d" % (memory / num_ticks),
+            "%.2f" % (block_timer.elapsed * 1e6 / num_ticks),
+            "%.1f" % (shutdown_time * 1e3)]
+
+
+def main(sizes):
+    rows = [get_event_loop().run_until_complete(run(size)) for size in sizes]
+    report("Tick entry benchmark",
+           ["ticks", "inserts/s", "bytes/tick", "block (us)", "shutdown (ms)"], rows)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,58 @@
+"""
+Shared helpers for the market benchmarks.
+"""
+import time
+from contextlib import contextmanager
+
+from anydex.core.assetamount import AssetAmount
+from anydex.core.assetpair import AssetPair
+from anydex.core.message import TraderId
+from anydex.core.order import OrderId, OrderNumber
+from anydex.core.tick import Ask, Bid
+from anydex.core.timeout import Timeout
+from anydex.core.timestamp import Timestamp
+
+
+class Timer(object):
+    """
+    Accumulates the wall-clock time of the measured blocks.
+    """
+
+    def __init__(self):
+        self.elapsed = 0.0
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+
+def make_trader_id(index):
+    """
+    Return a deterministic, unique trader id for a given index.
+    """
+    return TraderId(index.to_bytes(20, 'big'))
+
+
+def make_tick(index, first_amount, second_amount, is_ask, first_type='BTC', second_type='MB', timeout=3600):
+    """
+    Create an ask or bid with a unique order id.
+    """
+    tick_cls = Ask if is_ask else Bid
+    return tick_cls(OrderId(make_trader_id(index), OrderNumber(1)),
+                    AssetPair(AssetAmount(first_amount, first_type), AssetAmount(second_amount, second_type)),
+                    Timeout(timeout), Timestamp.now())
+
+
+def report(title, header, rows):
+    """
+    Print a simple aligned table with benchmark results.
+    """
+    print(title)
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print("  ".join(str(cell).rjust(width) for cell, width in zip(row, widths)))
+    print()